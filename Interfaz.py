@@ -1,81 +1,132 @@
+import sys
+import time
+import arranque
+if arranque.OPCION_TIEMPOS in sys.argv:
+    arranque.import_timer.start()  # Antes de las demás importaciones, para medirlas
+
 from PyQt5 import QtWidgets, QtGui, QtCore
 from PyQt5.QtWidgets import QGraphicsDropShadowEffect, QGraphicsOpacityEffect
 from PyQt5.QtCore import QTimer
 from datetime import datetime
-import hashlib
-import pyotp
-import pyodbc
-import sys
-import pyqtgraph as pg
-import time
-import serial
 import csv
-import joblib
-import numpy as np
-import matplotlib.pyplot as plt
-
-# Función para conectar a la base de datos
-def get_connection():
-    return pyodbc.connect(
-        'DRIVER={ODBC Driver 17 for SQL Server};' 
-        'SERVER=DESKTOP-D5VHBMM\\MSSQLSERVER1;'#Cambiar por el servidor que tiene
-        'DATABASE=DataBaseProject;'
-        'Trusted_Connection=yes;'#Si su servidor tiene contraseña agregar la linea 'UID=tu_usuario' y en otra linea 'PWD=tu_contraseña'
-    )
-
-# Función para verificar las credenciales desde SQL Server
+import gzip
+import os
+from arranque import lazy_import
+import sesion
+from basedatos import get_connection
+
+# Módulos pesados: se importan al abrir el panel que los usa (o en la precarga tras iniciar sesión)
+np = lazy_import("numpy")
+pg = lazy_import("pyqtgraph")
+plt = lazy_import("matplotlib.pyplot")
+serial = lazy_import("serial")
+dispositivos = lazy_import("dispositivos")
+pyotp = lazy_import("pyotp")
+almacenamiento = lazy_import("almacenamiento")
+adquisicion = lazy_import("adquisicion")
+series = lazy_import("series")
+modelos = lazy_import("modelos")
+tablas = lazy_import("tablas")
+historial = lazy_import("historial")
+agregados = lazy_import("agregados")
+energia = lazy_import("energia")
+bitacora = lazy_import("bitacora")
+catalogo = lazy_import("catalogo")
+# Se precargan en un hilo de fondo: no tocan Qt al importarse
+PRECARGA = (np, almacenamiento, bitacora, catalogo, tablas, historial, agregados, energia, adquisicion, dispositivos, series, modelos)
+# Crean estado de Qt y del backend de matplotlib al importarse: se cargan en el hilo principal
+PRECARGA_HILO_PRINCIPAL = (pg, plt)
+
+# Límites de la escritura por lotes de lecturas
+LOTE_LECTURAS = 500          # Filas por INSERT
+LATENCIA_MAX_LECTURAS = 1.0  # Segundos que una lectura puede esperar en cola
+RUTA_BITACORA = "bitacora"   # Directorio de la bitácora local de lecturas (ver bitacora.py)
+
+# Gráficas en vivo
+VENTANA_MUESTRAS = 36000  # Muestras guardadas completas por curva (1 h a 10 lecturas/s)
+MAX_FPS_GRAFICAS = 20     # Repintados por segundo como máximo
+MAX_ANOMALIAS_VISIBLES = 5000  # Puntos anómalos resaltados en las gráficas en vivo
+
+# Función para verificar las credenciales en la base de datos (SQL Server o SQLite)
 def verify_credentials(username, password):
-    connection = get_connection()
-
-    if connection:
-        print("Conexión exitosa")
-    else:
-        print("Error en la conexión")
-
-    cursor = connection.cursor()
-    cursor.execute("SELECT role, password_hash, totp_secret FROM users WHERE username = ?", username)
-    user = cursor.fetchone()
-    connection.close()
-
-    if user:
-        role, stored_password, totp_secret = user
-        # Convertir tanto la contraseña ingresada como la almacenada a minúsculas (o mayúsculas)
-        if hashlib.sha256(password.encode()).hexdigest().lower() == stored_password.lower():
-            return role, totp_secret
-
-    return None, None
-
-def guardar_lectura(corriente, potencia, artefacto_id):
-    """Guarda una lectura en la base de datos con el artefacto asociado."""
-    try:
-        # Intentar la conexión a la base de datos
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        # Ejecutar el comando INSERT
-        cursor.execute("""
-            INSERT INTO Lecturas (fecha_hora, corriente, potencia, artefacto_id)
-            VALUES (GETDATE(), ?, ?, ?)
-        """, (corriente, potencia, artefacto_id))
-        conn.commit()  # Confirmar los cambios
-        
-    except Exception as e:
-        print(f"Error al guardar lectura en la base de datos: {e}")
-    finally:
-        # Cerrar la conexión
+    """Devuelve (rol, secreto TOTP), o (None, None) si las credenciales no coinciden."""
+    session = sesion.authenticate(username, password, get_connection, almacenamiento.get_backend())
+    if session is None:
+        return None, None
+    return session.role, session.totp_secret
+
+class LoginWorker(QtCore.QThread):
+    """Valida las credenciales fuera del hilo de la interfaz.
+
+    Emite `finished(sesion, error)`: la `sesion.Session` si las credenciales
+    son correctas (None si no) y el mensaje de error si no se pudo consultar
+    la base.
+    """
+    finished = QtCore.pyqtSignal(object, str)
+
+    def __init__(self, username, password):
+        super().__init__()
+        self.username = username
+        self.password = password
+
+    def run(self):
         try:
-            cursor.close()
-            conn.close()
+            session = sesion.authenticate(self.username, self.password, get_connection,
+                                          almacenamiento.get_backend())
         except Exception as e:
-            print(f"Error al cerrar la conexión: {e}")
+            self.finished.emit(None, str(e))
+            return
+        self.finished.emit(session, "")
+
+_batch_writer = None
+
+def get_batch_writer():
+    """Devuelve el escritor por lotes compartido, iniciándolo la primera vez.
+
+    Las lecturas pasan primero por la bitácora local, así que no se pierden si
+    la base está caída; lo pendiente de sesiones anteriores se carga al iniciar.
+    """
+    global _batch_writer
+    if _batch_writer is None:
+        _batch_writer = bitacora.SpoolWriter(get_connection, bitacora.Spool(RUTA_BITACORA), LOTE_LECTURAS,
+                                             LATENCIA_MAX_LECTURAS, backend=almacenamiento.get_backend())
+        _batch_writer.start()
+    return _batch_writer
+
+def stop_batch_writer():
+    """Intenta escribir las lecturas pendientes y detiene el escritor (al cerrar la aplicación)."""
+    global _batch_writer
+    if _batch_writer is not None:
+        _batch_writer.stop()
+        _batch_writer = None
+
+def guardar_lectura(corriente, potencia, artefacto_id, fecha_hora=None):
+    """Encola una lectura para guardarla en la base de datos con el artefacto asociado."""
+    get_batch_writer().put(corriente, potencia, artefacto_id, fecha_hora)
+
+def guardar_lecturas(tiempos, corrientes, potencias, artefacto_id):
+    """Encola un bloque de lecturas de un artefacto (tiempos en segundos epoch)."""
+    fechas = [datetime.fromtimestamp(t) for t in tiempos]
+    get_batch_writer().put_many(fechas, corrientes, potencias, artefacto_id)
+
+def format_range(valores):
+    """Formatea un valor (mín, máx); si ambos coinciden se muestra uno solo."""
+    minimo, maximo = valores
+    if minimo == maximo:
+        return f"{minimo:.3f}"
+    return f"{minimo:.3f} – {maximo:.3f}"
 
 
 class RealTimeMonitoring(QtWidgets.QWidget):
-    def __init__(self, arduino_reader=None, artefacto_id=None, artefacto_nombre=""):
+    def __init__(self, arduino_reader=None, artefacto_id=None, artefacto_nombre="",
+                 capacidad=VENTANA_MUESTRAS, max_fps=MAX_FPS_GRAFICAS, timer_propio=True):
         super().__init__()
-        self.arduino_reader = arduino_reader
+        self.arduino_reader = arduino_reader  # adquisicion.SerialReader que alimenta el búfer de muestras
         self.artefacto_id = artefacto_id
         self.artefacto_nombre = artefacto_nombre
+        self.capacidad = capacidad
+        self.max_fps = max_fps
+        self.timer_propio = timer_propio  # False si otro temporizador llama a update_plot (ver MultiDeviceMonitoring)
         self.setup_ui()
         self.init_data()
 
@@ -102,6 +153,23 @@ class RealTimeMonitoring(QtWidgets.QWidget):
         self.plot_potencia.setLabel('left', 'Potencia (W)')
         self.plot_potencia.setLabel('bottom', 'Tiempo (s)')
 
+        # Curvas persistentes: se actualizan con setData en lugar de recrearse
+        self.curva_corriente = self.plot_corriente.plot(pen='r')
+        self.curva_potencia = self.plot_potencia.plot(pen='b')
+        for plot in (self.plot_corriente, self.plot_potencia):
+            plot.setClipToView(True)  # Solo se procesan los puntos visibles
+            plot.setDownsampling(auto=True, mode='peak')
+
+        # Puntos anómalos detectados en vivo, resaltados sobre las curvas
+        self.anomalias_corriente = pg.ScatterPlotItem(size=8, pen=None, brush=pg.mkBrush(255, 140, 0))
+        self.anomalias_potencia = pg.ScatterPlotItem(size=8, pen=None, brush=pg.mkBrush(255, 140, 0))
+        self.plot_corriente.addItem(self.anomalias_corriente)
+        self.plot_potencia.addItem(self.anomalias_potencia)
+
+        # Ambas gráficas comparten el eje de tiempo; al hacer zoom se elige otro nivel de detalle
+        self.plot_potencia.setXLink(self.plot_corriente)
+        self.plot_corriente.sigXRangeChanged.connect(self.mark_plot_dirty)
+
         # Agregar el widget de gráficos al diseño
         self.layout.addWidget(self.plot_widget)
 
@@ -112,65 +180,142 @@ class RealTimeMonitoring(QtWidgets.QWidget):
         self.data_label.setStyleSheet("background-color: white; border: 1px solid black; padding: 5px;")
         self.layout.addWidget(self.data_label)
 
+        # Tasa de anomalías y latencia de inferencia del modelo en vivo
+        self.anomaly_label = QtWidgets.QLabel("")
+        self.anomaly_label.setAlignment(QtCore.Qt.AlignRight)
+        self.anomaly_label.setStyleSheet("color: #b35900; font-size: 11px;")
+        self.layout.addWidget(self.anomaly_label)
+
+        # Contadores del lector para detectar si la interfaz se queda atrás
+        self.stats_label = QtWidgets.QLabel("")
+        self.stats_label.setAlignment(QtCore.Qt.AlignRight)
+        self.stats_label.setStyleSheet("color: #555; font-size: 11px;")
+        self.layout.addWidget(self.stats_label)
+
         # Conectar el evento de clic
         self.plot_corriente.scene().sigMouseClicked.connect(self.display_clicked_data)
         self.plot_potencia.scene().sigMouseClicked.connect(self.display_clicked_data)
 
     def init_data(self):
         """Inicializa los datos del monitoreo."""
-        self.times = []
-        self.corrientes = []
-        self.potencias = []
+        # Tiempos relativos al inicio del monitoreo; la sesión completa queda decimada
+        self.series = series.DecimationPyramid(self.capacidad)
+        self.anomalias = series.RingSeries(MAX_ANOMALIAS_VISIBLES)
+        self.scorer = None
         self.start_time = time.time()
+        self.plot_dirty = False
 
     def start_monitoring(self):
         """Inicia el monitoreo en tiempo real después de seleccionar un artefacto."""
         if self.arduino_reader:
             # Comienza el monitoreo
+            if not self.arduino_reader.is_alive():
+                self.arduino_reader.start()
+            # Puntuar las lecturas con el modelo de anomalías en un hilo aparte
+            registry = modelos.get_model_registry()
+            registry.preload()
+            self.scorer = modelos.StreamingScorer(registry, self.artefacto_id)
+            self.scorer.start()
             print("Monitoreo en tiempo real iniciado.")
-            self.timer.start(100)  # Leer datos cada 100 ms
+            if self.timer_propio:
+                self.timer.start(int(1000 / self.max_fps))  # Un repintado por cuadro como máximo
         else:
             QtWidgets.QMessageBox.critical(self, "Error", "No se ha conectado al Arduino.")
 
-    def stop_monitoring(self):
-        """Detiene el monitoreo."""
+    def stop_monitoring(self, cerrar_lector=True):
+        """Detiene el monitoreo; el lector queda abierto si `cerrar_lector` es False."""
         self.timer.stop()
+        if self.scorer:
+            self.scorer.stop()
+            self.scorer = None
         if self.arduino_reader:
-            try:
-                self.arduino_reader.close()
-                self.arduino_reader = None
-            except Exception as e:
-                print(f"Error al cerrar la conexión con el Arduino: {e}")
+            if cerrar_lector:
+                self.arduino_reader.stop()  # Detiene el hilo lector y cierra el puerto
+            self.arduino_reader = None
 
     def update_plot(self):
-        """Actualiza las gráficas con los datos del Arduino y guarda las lecturas en la base de datos."""
+        """Vacía el búfer del lector, actualiza las gráficas y guarda las lecturas en la base de datos."""
         if not self.arduino_reader:
             return
 
-        while self.arduino_reader.in_waiting > 0:
-            try:
-                line = self.arduino_reader.readline().decode('utf-8').strip()
-                if "Irms" in line and "Potencia" in line:
-                    parts = line.split(",")
-                    corriente = float(parts[0].split(":")[1].strip().replace("A", ""))
-                    potencia = float(parts[1].split(":")[1].strip().replace("W", ""))
-
-                    # Eliminar o comentar los prints
-                    # print(f"Lectura recibida: Corriente={corriente}, Potencia={potencia}, Artefacto={self.artefacto_id}")
-
-                    elapsed_time = time.time() - self.start_time
-                    self.times.append(elapsed_time)
-                    self.corrientes.append(corriente)
-                    self.potencias.append(potencia)
-                    self.plot_corriente.plot(self.times, self.corrientes, clear=True, pen='r')
-                    self.plot_potencia.plot(self.times, self.potencias, clear=True, pen='b')
-
-                    # Guardar la lectura en la base de datos
-                    if self.artefacto_id:
-                        guardar_lectura(corriente, potencia, self.artefacto_id)
+        tiempos, corrientes, potencias = self.arduino_reader.buffer.drain()
+        self.update_stats_label()
+        self.update_anomalies()
+        if len(tiempos) == 0:
+            if self.plot_dirty:
+                self.refresh_curves()
+            return
 
-            except Exception as e:
-                print(f"Error al procesar datos del Arduino: {e}")
+        try:
+            # Encolar las lecturas con la hora en que llegaron del Arduino
+            if self.artefacto_id:
+                guardar_lecturas(tiempos, corrientes, potencias, self.artefacto_id)
+
+            # Todas las muestras del cuadro se agregan de una vez y se repinta una sola vez
+            self.series.extend(tiempos - self.start_time, corrientes, potencias)
+            self.refresh_curves()
+            if self.scorer:
+                self.scorer.submit(tiempos - self.start_time, corrientes, potencias)
+        except Exception as e:
+            print(f"Error al procesar datos del Arduino: {e}")
+
+    def update_anomalies(self):
+        """Resalta los puntos que el modelo marcó como anómalos y actualiza la tasa."""
+        if not self.scorer:
+            return
+        nuevas = False
+        for tiempos, corrientes, potencias, anomalas in self.scorer.drain_results():
+            if anomalas.any():
+                self.anomalias.extend(tiempos[anomalas], corrientes[anomalas], potencias[anomalas])
+                nuevas = True
+        if nuevas:
+            times, corrientes, potencias = self.anomalias.view()
+            self.anomalias_corriente.setData(times, corrientes)
+            self.anomalias_potencia.setData(times, potencias)
+
+        stats = self.scorer.estadisticas()
+        if self.scorer.error is not None and stats["puntuadas"] == 0:
+            self.anomaly_label.setText(f"Detección en vivo no disponible: {self.scorer.error}")
+        elif stats["lotes"]:
+            self.anomaly_label.setText(
+                f"Anomalías: {stats['anomalias']} de {stats['puntuadas']} "
+                f"({100 * stats['tasa_anomalias']:.1f}%) | "
+                f"Inferencia: {stats['ultimo_lote_ms']:.1f} ms/lote (prom. {stats['promedio_lote_ms']:.1f})"
+            )
+
+    def mark_plot_dirty(self, *args):
+        """El rango visible cambió: las curvas se recalculan en el próximo cuadro."""
+        self.plot_dirty = True
+
+    def refresh_curves(self):
+        """Grafica el nivel de detalle de la pirámide que corresponde al rango visible."""
+        self.plot_dirty = False
+        limites = self.series.bounds()
+        if limites is None:
+            return
+        vb = self.plot_corriente.getViewBox()
+        if vb.autoRangeEnabled()[0]:
+            x0, x1 = limites
+        else:
+            x0, x1 = vb.viewRange()[0]
+        max_puntos = max(1000, 2 * int(vb.width()))  # Unos dos puntos por píxel
+        times, corrientes, potencias = self.series.view(x0, x1, max_puntos)
+        self.curva_corriente.setData(times, corrientes)
+        self.curva_potencia.setData(times, potencias)
+
+    def update_stats_label(self):
+        """Muestra los contadores de lectura, pendientes y descartes del hilo lector."""
+        stats = self.arduino_reader.estadisticas()
+        texto = (
+            f"Lecturas: {stats['lineas']} | Inválidas: {stats['invalidas']} | "
+            f"Pendientes: {stats['pendientes']} | Descartadas: {stats['descartadas']}"
+        )
+        if "perdidas" in stats:  # Protocolo binario: huecos de secuencia y bytes de tramas corruptas
+            texto += f" | Perdidas: {stats['perdidas']} | Bytes descartados: {stats['bytes_descartados']}"
+        if _batch_writer is not None:
+            bd = _batch_writer.estadisticas()
+            texto += f" | BD: {bd['filas']} filas ({bd['filas_por_segundo']:.1f}/s), en bitácora: {bd['pendientes']}"
+        self.stats_label.setText(texto)
 
     def display_clicked_data(self, event):
         """Muestra los valores del punto más cercano en ambas gráficas al hacer clic."""
@@ -182,37 +327,65 @@ class RealTimeMonitoring(QtWidgets.QWidget):
             mouse_point = self.plot_corriente.vb.mapSceneToView(pos)  # Obtener posición en términos de la gráfica
             x = mouse_point.x()  # Tiempo en el eje X
 
-            # Buscar el punto más cercano
-            if len(self.times) > 0:
-                closest_index = min(range(len(self.times)), key=lambda i: abs(self.times[i] - x))
-                tiempo = self.times[closest_index]
-                corriente = self.corrientes[closest_index]
-                potencia = self.potencias[closest_index]
+            # Buscar el punto más cercano (bisección sobre los tiempos ordenados)
+            punto = self.series.nearest(x)
+            if punto is not None:
+                tiempo, corriente, potencia = punto
 
                 # Mostrar los valores de tiempo, corriente y potencia
                 self.data_label.setText(
                     f"Tiempo: {tiempo:.3f}s\n"
-                    f"Corriente: {corriente:.3f}A\n"
-                    f"Potencia: {potencia:.3f}W"
+                    f"Corriente: {format_range(corriente)}A\n"
+                    f"Potencia: {format_range(potencia)}W"
                 )
 
-        # Detectar clic en la gráfica de potencia
-        elif self.plot_potencia.sceneBoundingRect().contains(pos):
-            mouse_point = self.plot_potencia.vb.mapSceneToView(pos)
-            x = mouse_point.x()
+class MultiDeviceMonitoring(QtWidgets.QWidget):
+    """Gráficas en vivo de varios artefactos en una grilla.
+
+    Un solo temporizador vacía en cada cuadro el búfer de todos los lectores,
+    así el costo crece con la cantidad de artefactos y no hay un temporizador
+    por gráfica. Los lectores son del DeviceManager: al detener el monitoreo
+    no se cierran los puertos.
+    """
+
+    def __init__(self, dispositivos, max_fps=MAX_FPS_GRAFICAS):
+        super().__init__()
+        self.max_fps = max_fps
+        self.panels = []
+        layout = QtWidgets.QGridLayout(self)
+        columnas = max(1, int(np.ceil(np.sqrt(len(dispositivos)))))
+        for i, (artefacto_id, nombre, lector) in enumerate(dispositivos):
+            panel = RealTimeMonitoring(lector, artefacto_id, nombre, max_fps=max_fps, timer_propio=False)
+            caja = QtWidgets.QGroupBox(nombre)
+            QtWidgets.QVBoxLayout(caja).addWidget(panel)
+            layout.addWidget(caja, i // columnas, i % columnas)
+            self.panels.append(panel)
+
+        self.timer = QtCore.QTimer()
+        self.timer.timeout.connect(self.update_plots)
+
+    def start_monitoring(self):
+        for panel in self.panels:
+            panel.start_monitoring()
+        self.timer.start(int(1000 / self.max_fps))
+
+    def update_plots(self):
+        for panel in self.panels:
+            panel.update_plot()
+
+    def stop_monitoring(self):
+        self.timer.stop()
+        for panel in self.panels:
+            panel.stop_monitoring(cerrar_lector=False)
 
-            # Buscar el punto más cercano
-            if len(self.times) > 0:
-                closest_index = min(range(len(self.times)), key=lambda i: abs(self.times[i] - x))
-                tiempo = self.times[closest_index]
-                potencia = self.potencias[closest_index]
-                self.data_label.setText(f"Tiempo: {tiempo:.3f}s\nCorriente: -\nPotencia: {potencia:.3f}W")
 
 class LoginWindow(QtWidgets.QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Inicio de Sesión")
         self.setFixedSize(600, 400)
+        self.login_worker = None  # LoginWorker en curso
+        self.session = None       # sesion.Session tras un inicio de sesión correcto
         self.setWindowIcon(QtGui.QIcon("C:/Users/BENJAMIN/OneDrive/Escritorio/icono.ico"))
 
         # Fondo con imagen o degradado
@@ -353,15 +526,28 @@ class LoginWindow(QtWidgets.QWidget):
             self.show_password_btn.setText("👁")
 
     def attempt_login(self):
-        username = self.user_input.text()
-        password = self.pass_input.text()
-        role, totp_secret = verify_credentials(username, password)
-
-        if not role:
+        """Valida las credenciales en un hilo de fondo; el formulario sigue respondiendo."""
+        if self.login_worker is not None and self.login_worker.isRunning():
+            return
+        self.login_button.setEnabled(False)
+        self.login_button.setText("Verificando...")
+        self.error_label.hide()
+        self.login_worker = LoginWorker(self.user_input.text(), self.pass_input.text())
+        self.login_worker.finished.connect(self.on_login_finished)
+        self.login_worker.start()
+
+    def on_login_finished(self, session, error):
+        self.login_button.setEnabled(True)
+        self.login_button.setText("Iniciar Sesión")
+        if error:
+            self.error_label.setText(f"No se pudo conectar con la base de datos: {error}")
+            self.error_label.show()
+        elif session is None:
             self.error_label.setText("Usuario y/o contraseña incorrecto(s)")
             self.error_label.show()
         else:
-            self.show_welcome_message(username)
+            self.session = session
+            self.show_welcome_message(session.username)
 
     def show_welcome_message(self, username):
         self.user_label.hide()
@@ -376,20 +562,26 @@ class LoginWindow(QtWidgets.QWidget):
         self.welcome_message_label.show()
         self.loading_label.show()
         self.loading_gif.start()
-        QtCore.QTimer.singleShot(2000, lambda: self.open_normal_user_window(username))
-
-    def open_normal_user_window(self, username):
-        self.normal_user_window = NormalUserWindow(username)
+        if arranque.OPCION_SIN_PRECARGA not in sys.argv:
+            # Mientras se muestra la bienvenida, importar los paneles y cargar el modelo en segundo plano
+            arranque.preload(PRECARGA, al_terminar=lambda: modelos.get_model_registry().preload())
+            QtCore.QTimer.singleShot(0, lambda: arranque.load_modules(PRECARGA_HILO_PRINCIPAL))
+        QtCore.QTimer.singleShot(2000, lambda: self.open_normal_user_window(self.session))
+
+    def open_normal_user_window(self, session):
+        self.normal_user_window = NormalUserWindow(session)
         self.normal_user_window.show()
         self.close()
 
 class NormalUserWindow(QtWidgets.QWidget):
-    def __init__(self, username):
+    def __init__(self, session):
         super().__init__()
-        self.username = username
-        self.arduino_reader = None  # Inicializar sin conexión al Arduino
+        self.session = session  # sesion.Session del inicio de sesión: no se vuelve a consultar la base
+        self.username = session.username
+        self.devices = None  # dispositivos.DeviceManager: se crea al abrir el monitoreo
+        self.monitoring_widget = None
         self.analysis_panel = None
-        self.full_name = self.get_user_full_name(username)  # Obtener el nombre completo desde la base de datos
+        self.full_name = session.full_name
         self.current_theme = "Claro"  # Estado inicial del tema
 
         self.setWindowTitle(f"Panel de Monitoreo Energético ({self.username})")
@@ -463,9 +655,10 @@ class NormalUserWindow(QtWidgets.QWidget):
         self.layout.addWidget(self.main_widget)
 
     def closeEvent(self, event):
-        """Se llama al cerrar la ventana para liberar recursos como el Arduino."""
-        if hasattr(self, 'monitoring_widget') and self.monitoring_widget:
-            self.monitoring_widget.stop_monitoring()  # Detener monitoreo y cerrar conexión
+        """Se llama al cerrar la ventana para liberar recursos como los Arduinos."""
+        self.stop_graphs()
+        if self.devices is not None:
+            self.devices.stop_all()  # Cierra todos los puertos
         event.accept()
 
     def add_functionality_buttons(self):
@@ -494,6 +687,11 @@ class NormalUserWindow(QtWidgets.QWidget):
                 self.open_historial_lecturas,
                 "Consulta lecturas históricas"
             ),
+            "Consumo y Costo": (
+                "C:/Users/BENJAMIN/OneDrive/Escritorio/graficotiempo.jpg",
+                self.open_energy_report,
+                "Calcula los kWh consumidos y su costo"
+            ),
         }
 
         for i, (title, (icon_path, function, description)) in enumerate(func_options.items()):
@@ -556,6 +754,16 @@ class NormalUserWindow(QtWidgets.QWidget):
 
     def start_real_time_monitoring(self):
         """Muestra la tabla de artefactos antes de iniciar el monitoreo en tiempo real."""
+        self.stop_graphs()  # Al volver desde las gráficas
+
+        # Los puertos de cada artefacto se leen de dispositivos.json (ver dispositivos.py)
+        if self.devices is None:
+            try:
+                self.devices = dispositivos.DeviceManager()
+            except Exception as e:
+                QtWidgets.QMessageBox.critical(self, "Error", f"No se pudo leer la configuración de dispositivos: {e}")
+                return
+
         # Guardar el widget principal actual para regresar después
         self.previous_widget = self.main_widget
 
@@ -568,7 +776,7 @@ class NormalUserWindow(QtWidgets.QWidget):
         layout = QtWidgets.QVBoxLayout(self.main_widget)
 
         # Título de la sección
-        title = QtWidgets.QLabel("Monitoreo en Tiempo Real - Seleccione un Artefacto")
+        title = QtWidgets.QLabel("Monitoreo en Tiempo Real - Encienda uno o más Artefactos")
         title.setFont(QtGui.QFont("Arial", 16, QtGui.QFont.Bold))
         title.setAlignment(QtCore.Qt.AlignCenter)
         title.setStyleSheet("padding: 10px;")
@@ -576,103 +784,116 @@ class NormalUserWindow(QtWidgets.QWidget):
 
         # Crear la tabla de artefactos
         self.artifact_table = QtWidgets.QTableWidget()
-        self.artifact_table.setColumnCount(3)
-        self.artifact_table.setHorizontalHeaderLabels(["Artefacto", "Estado", "Ver"])
+        self.artifact_table.setColumnCount(4)
+        self.artifact_table.setHorizontalHeaderLabels(["Artefacto", "Puerto", "Estado", "Ver"])
         self.artifact_table.horizontalHeader().setStretchLastSection(True)
         self.artifact_table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
         self.load_artifacts_to_table()
         layout.addWidget(self.artifact_table)
 
+        buttons = QtWidgets.QHBoxLayout()
+        # Todos los artefactos encendidos en una sola vista
+        self.view_all_button = QtWidgets.QPushButton("Ver todos")
+        self.view_all_button.setFont(QtGui.QFont("Arial", 12))
+        self.view_all_button.clicked.connect(lambda: self.show_graph())
+        buttons.addWidget(self.view_all_button)
+
         # Botón de regresar
         back_button = QtWidgets.QPushButton("Regresar")
         back_button.setFont(QtGui.QFont("Arial", 12))
         back_button.setStyleSheet("""QPushButton {background-color: #f7f7f7; border-radius: 10px; padding: 10px; font-size: 14px;}""")
         back_button.clicked.connect(self.return_to_main)
-        layout.addWidget(back_button, alignment=QtCore.Qt.AlignRight)
+        buttons.addWidget(back_button, alignment=QtCore.Qt.AlignRight)
+        layout.addLayout(buttons)
 
         self.layout.addWidget(self.main_widget)
-
-        # Verifica si el Arduino está conectado y procede a iniciar el monitoreo
-        if not self.arduino_reader:
-            try:
-                # Intentar conectar con el Arduino
-                self.arduino_reader = serial.Serial('COM7', 9600, timeout=1)
-            except serial.SerialException as e:
-                QtWidgets.QMessageBox.critical(self, "Error", f"No se pudo conectar al Arduino: {e}")
-                return  # Detener el flujo si falla la conexión
-
-        # Aquí puedes empezar el monitoreo después de seleccionar un artefacto
-        self.start_monitoring()
-
-    def start_monitoring(self):
-        """Inicia el monitoreo en tiempo real después de seleccionar un artefacto."""
-        if self.arduino_reader:
-            # Aquí puedes agregar la lógica de actualización de gráficos o cualquier otro proceso de monitoreo
-            print("Monitoreo en tiempo real iniciado.")
-            self.timer.start(100)  # Leer datos cada 100 ms
-        else:
-            QtWidgets.QMessageBox.critical(self, "Error", "No se ha conectado al Arduino.")
+        self.update_view_all_button()
 
     def load_artifacts_to_table(self):
-        """Carga los artefactos desde la base de datos en la tabla."""
-        conn = get_connection()
-        cursor = conn.cursor()
-
+        """Carga los artefactos del catálogo compartido en la tabla."""
         try:
-            cursor.execute("SELECT id, nombre FROM artefactos")
-            artifacts = cursor.fetchall()
+            self.artifacts = catalogo.get_catalog().all()  # Solo consulta la base la primera vez o si cambió
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "Error", f"No se pudieron cargar los artefactos: {e}")
             return
-        finally:
-            conn.close()
 
-        self.artifact_table.setRowCount(len(artifacts))
-        for row, (artifact_id, artifact_name) in enumerate(artifacts):
+        self.artifact_table.setRowCount(len(self.artifacts))
+        for row, (artifact_id, artifact_name) in enumerate(self.artifacts):
             # Columna 1: Nombre del artefacto
             self.artifact_table.setItem(row, 0, QtWidgets.QTableWidgetItem(artifact_name))
 
-            # Columna 2: Botón de estado ON/OFF
+            # Columna 2: Puerto serie asignado
+            puerto, baudrate = self.devices.config.port_of(artifact_id)
+            protocolo = self.devices.config.protocol_of(artifact_id)
+            self.artifact_table.setItem(row, 1, QtWidgets.QTableWidgetItem(f"{puerto} ({baudrate}, {protocolo})"))
+
+            # Columna 3: Botón de estado ON/OFF
             state_button = QtWidgets.QPushButton("OFF")
             state_button.setCheckable(True)
-            state_button.setStyleSheet("background-color: red; color: white;")
             state_button.clicked.connect(
                 lambda _, r=row: self.toggle_artifact_state(r)
             )
-            self.artifact_table.setCellWidget(row, 1, state_button)
+            self.artifact_table.setCellWidget(row, 2, state_button)
 
-            # Columna 3: Botón "Ver"
+            # Columna 4: Botón "Ver"
             view_button = QtWidgets.QPushButton("Ver")
-            view_button.setEnabled(False)  # Solo habilitado si el artefacto está encendido
             view_button.clicked.connect(
-                lambda _, a_id=artifact_id, a_name=artifact_name: self.show_graph(a_id, a_name)
+                lambda _, a_id=artifact_id: self.show_graph([a_id])
             )
-            self.artifact_table.setCellWidget(row, 2, view_button)
+            self.artifact_table.setCellWidget(row, 3, view_button)
+            self.set_artifact_row_state(row, self.devices.is_active(artifact_id))
+
+    def set_artifact_row_state(self, row, encendido):
+        """Muestra la fila como ON/OFF; Ver solo se habilita si el artefacto está encendido."""
+        state_button = self.artifact_table.cellWidget(row, 2)
+        view_button = self.artifact_table.cellWidget(row, 3)
+        state_button.setChecked(encendido)
+        state_button.setText("ON" if encendido else "OFF")
+        state_button.setStyleSheet(f"background-color: {'green' if encendido else 'red'}; color: white;")
+        view_button.setEnabled(encendido)
 
     def toggle_artifact_state(self, row):
-        """Cambia el estado de un artefacto a ON/OFF y habilita el botón Ver."""
-        for i in range(self.artifact_table.rowCount()):
-            state_button = self.artifact_table.cellWidget(i, 1)
-            view_button = self.artifact_table.cellWidget(i, 2)
-
-            if i == row:
-                if state_button.isChecked():
-                    state_button.setText("ON")
-                    state_button.setStyleSheet("background-color: green; color: white;")
-                    view_button.setEnabled(True)
-                else:
-                    state_button.setText("OFF")
-                    state_button.setStyleSheet("background-color: red; color: white;")
-                    view_button.setEnabled(False)
-            else:
-                # Asegurarse de que solo un artefacto pueda estar encendido
-                state_button.setChecked(False)
-                state_button.setText("OFF")
-                state_button.setStyleSheet("background-color: red; color: white;")
-                view_button.setEnabled(False)
-
-    def show_graph(self, artifact_id, artifact_name):
-        """Muestra la gráfica para el artefacto seleccionado."""
+        """Enciende o apaga un artefacto abriendo o cerrando el puerto de su Arduino.
+
+        Varios artefactos pueden estar encendidos a la vez si están en puertos
+        distintos; encender uno apaga solo al que ocupaba su mismo puerto.
+        """
+        artifact_id, artifact_name = self.artifacts[row]
+        if self.artifact_table.cellWidget(row, 2).isChecked():
+            try:
+                desplazado = self.devices.start(artifact_id)
+            except (serial.SerialException, OSError) as e:
+                QtWidgets.QMessageBox.critical(self, "Error", f"No se pudo conectar al Arduino de {artifact_name}: {e}")
+                self.set_displaced_row_off(getattr(e, "desplazado", None))
+                self.set_artifact_row_state(row, False)
+                self.update_view_all_button()
+                return
+            self.set_displaced_row_off(desplazado)
+            self.set_artifact_row_state(row, True)
+        else:
+            self.devices.stop(artifact_id)
+            self.set_artifact_row_state(row, False)
+        self.update_view_all_button()
+
+    def set_displaced_row_off(self, desplazado):
+        """Apaga la fila del artefacto que se desconectó por compartir el puerto, si lo hubo."""
+        if desplazado is not None:
+            otra = next(i for i, (a_id, _) in enumerate(self.artifacts) if a_id == desplazado)
+            self.set_artifact_row_state(otra, False)
+
+    def update_view_all_button(self):
+        self.view_all_button.setEnabled(bool(self.devices.active()))
+
+    def show_graph(self, artifact_ids=None):
+        """Muestra las gráficas de los artefactos indicados (por defecto, todos los encendidos)."""
+        nombres = dict(self.artifacts)
+        activos = self.devices.active()
+        seleccion = [(a_id, nombres.get(a_id, str(a_id)), lector) for a_id, lector in activos.items()
+                     if artifact_ids is None or a_id in artifact_ids]
+        if not seleccion:
+            QtWidgets.QMessageBox.warning(self, "Advertencia", "No hay artefactos encendidos.")
+            return
+
         # Eliminar el contenido actual
         self.layout.removeWidget(self.main_widget)
         self.main_widget.deleteLater()
@@ -682,13 +903,13 @@ class NormalUserWindow(QtWidgets.QWidget):
         layout = QtWidgets.QVBoxLayout(self.main_widget)
 
         # Título dinámico
-        title = QtWidgets.QLabel(f"Monitoreo en Tiempo Real ({artifact_name})")
+        title = QtWidgets.QLabel(f"Monitoreo en Tiempo Real ({', '.join(nombre for _, nombre, _ in seleccion)})")
         title.setFont(QtGui.QFont("Arial", 16, QtGui.QFont.Bold))
         title.setAlignment(QtCore.Qt.AlignCenter)
         layout.addWidget(title)
 
-        # Agregar el monitoreo
-        self.monitoring_widget = RealTimeMonitoring(self.arduino_reader, artifact_id, artifact_name)
+        # Agregar el monitoreo: una gráfica por artefacto, con un solo temporizador
+        self.monitoring_widget = MultiDeviceMonitoring(seleccion)
         self.monitoring_widget.start_monitoring()
         layout.addWidget(self.monitoring_widget)
 
@@ -700,31 +921,28 @@ class NormalUserWindow(QtWidgets.QWidget):
 
         self.layout.addWidget(self.main_widget)
 
+    def stop_graphs(self):
+        """Detiene las gráficas en vivo; los puertos siguen abiertos mientras el artefacto esté encendido."""
+        if self.monitoring_widget is not None:
+            self.monitoring_widget.stop_monitoring()
+            self.monitoring_widget = None
+
     def start_csv_panel(self):
         """Cambia al panel de Descarga de Datos CSV."""
         try:
-            # Crear la conexión a la base de datos (solo al hacer clic)
-            db_connection = pyodbc.connect(
-            'DRIVER={ODBC Driver 17 for SQL Server};'
-            'SERVER=DESKTOP-D5VHBMM\\MSSQLSERVER1;'
-            'DATABASE=DataBaseProject;'
-            'Trusted_Connection=yes;'
-            )
-
-            # Crear el panel CSV y pasar la conexión
             self.previous_widget = self.main_widget
 
             # Eliminar el contenido actual
             self.layout.removeWidget(self.main_widget)
             self.main_widget.deleteLater()
 
-            # Crear el widget del panel CSV
-            self.main_widget = CSVPanel(db_connection)
+            # Crear el widget del panel CSV (toma conexiones del pool solo mientras consulta o exporta)
+            self.main_widget = CSVPanel()
             self.main_widget.back_button.clicked.connect(self.return_to_main)  # Conectar el botón de "Regresar"
             self.layout.addWidget(self.main_widget)
 
         except Exception as e:
-            QtWidgets.QMessageBox.critical(self, "Error", f"No se pudo conectar a la base de datos: {e}")
+            QtWidgets.QMessageBox.critical(self, "Error", f"No se pudo abrir el panel de descarga: {e}")
 
     def start_analysis_panel(self):
         """Muestra el panel de análisis de anomalías."""
@@ -739,13 +957,7 @@ class NormalUserWindow(QtWidgets.QWidget):
     def get_connection(self):
         """Devuelve una conexión activa a la base de datos."""
         try:
-            conn = pyodbc.connect(
-                'DRIVER={ODBC Driver 17 for SQL Server};'
-                'SERVER=DESKTOP-D5VHBMM\\MSSQLSERVER1;'  # Cambia por tu servidor si es necesario
-                'DATABASE=DataBaseProject;'             # Asegúrate de que este sea tu nombre de base de datos
-                'Trusted_Connection=yes;'
-            )
-            return conn
+            return get_connection()  # Conexión del pool compartido (ver basedatos.py)
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "Error", f"No se pudo conectar a la base de datos: {e}")
             return None
@@ -761,11 +973,14 @@ class NormalUserWindow(QtWidgets.QWidget):
 
     def open_historial_lecturas(self):
         """Abre la ventana de historial de lecturas."""
-        # Asegúrate de que `get_connection` esté bien definido para conectar a tu DB
-        db_connection = get_connection()
-        self.historial_window = HistorialLecturasWindow(db_connection)
+        self.historial_window = HistorialLecturasWindow()
         self.historial_window.show()
 
+    def open_energy_report(self):
+        """Abre la ventana de reportes de consumo y costo."""
+        self.energy_window = EnergyReportWindow()
+        self.energy_window.show()
+
     def return_to_main(self):
         """Regresa al contenido principal de la ventana."""
         # Verificar si existe un widget principal dinámico (Monitoreo o CSVPanel)
@@ -861,21 +1076,6 @@ class NormalUserWindow(QtWidgets.QWidget):
 
             self.user_label.setStyleSheet("color: #333;")
 
-    def get_user_full_name(self, username):
-        """Obtener el nombre completo desde la base de datos."""
-        conn = get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("SELECT nombres, apellidos FROM users WHERE username = ?", username)
-            user = cursor.fetchone()
-            if user and user[0] and user[1]:
-                return f"{user[0]} {user[1]}"
-        except Exception as e:
-            QtWidgets.QMessageBox.critical(self, "Error", f"Error al obtener el nombre: {e}")
-        finally:
-            conn.close()
-        return username
-
     def show_menu(self):
         """Muestra un menú contextual con opciones."""
         menu = QtWidgets.QMenu(self)
@@ -918,9 +1118,10 @@ class NormalUserWindow(QtWidgets.QWidget):
 
 
 class CSVPanel(QtWidgets.QWidget):
-    def __init__(self, db_connection):
+    def __init__(self):
         super().__init__()
-        self.db_connection = db_connection  # Conexión a la base de datos
+        self.worker = None
+        self.progress_dialog = None
         self.setWindowTitle("CSV Panel")
         self.setup_ui()
 
@@ -942,6 +1143,29 @@ class CSVPanel(QtWidgets.QWidget):
         self.table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
         self.layout.addWidget(self.table)
 
+        # Opciones de exportación: rango de fechas y compresión
+        options_layout = QtWidgets.QHBoxLayout()
+        self.date_filter_check = QtWidgets.QCheckBox("Filtrar por fechas")
+        options_layout.addWidget(self.date_filter_check)
+        self.desde_edit = QtWidgets.QDateTimeEdit(QtCore.QDateTime.currentDateTime().addDays(-7))
+        self.desde_edit.setDisplayFormat("yyyy-MM-dd HH:mm")
+        self.desde_edit.setCalendarPopup(True)
+        self.hasta_edit = QtWidgets.QDateTimeEdit(QtCore.QDateTime.currentDateTime())
+        self.hasta_edit.setDisplayFormat("yyyy-MM-dd HH:mm")
+        self.hasta_edit.setCalendarPopup(True)
+        options_layout.addWidget(QtWidgets.QLabel("Desde:"))
+        options_layout.addWidget(self.desde_edit)
+        options_layout.addWidget(QtWidgets.QLabel("Hasta:"))
+        options_layout.addWidget(self.hasta_edit)
+        options_layout.addWidget(QtWidgets.QLabel("Resolución:"))
+        self.resolucion_combo = QtWidgets.QComboBox()
+        for nombre, segundos in agregados.RESOLUCIONES:
+            self.resolucion_combo.addItem(nombre, segundos)
+        options_layout.addWidget(self.resolucion_combo)
+        self.gzip_check = QtWidgets.QCheckBox("Comprimir (gzip)")
+        options_layout.addWidget(self.gzip_check)
+        self.layout.addLayout(options_layout)
+
         # Botón de regresar
         self.back_button = QtWidgets.QPushButton("Regresar")
         self.layout.addWidget(self.back_button, alignment=QtCore.Qt.AlignRight)
@@ -949,11 +1173,9 @@ class CSVPanel(QtWidgets.QWidget):
         self.load_artefacts()
 
     def load_artefacts(self):
-        """Carga los artefactos desde la base de datos."""
+        """Carga los artefactos del catálogo compartido."""
         try:
-            cursor = self.db_connection.cursor()
-            cursor.execute("SELECT id, nombre FROM artefactos")
-            artefacts = cursor.fetchall()
+            artefacts = catalogo.get_catalog().all()
 
             self.table.setRowCount(len(artefacts))
             for row, (artefact_id, artefact_name) in enumerate(artefacts):
@@ -966,53 +1188,188 @@ class CSVPanel(QtWidgets.QWidget):
 
     def download_csv(self, artefact_id):
         """Inicia la exportación de datos del artefacto a CSV."""
-        file_dialog = QtWidgets.QFileDialog.getSaveFileName(self, "Guardar como", "", "CSV Files (*.csv)")
+        comprimir = self.gzip_check.isChecked()
+        filtro = "CSV comprimido (*.csv.gz)" if comprimir else "CSV Files (*.csv)"
+        file_dialog = QtWidgets.QFileDialog.getSaveFileName(self, "Guardar como", "", filtro)
         file_path = file_dialog[0]
 
         if file_path:
-            self.worker = CSVExportWorker(self.db_connection, file_path, artefact_id)
+            if comprimir and not file_path.endswith(".gz"):
+                file_path += ".gz"
+            desde = hasta = None
+            if self.date_filter_check.isChecked():
+                desde = self.desde_edit.dateTime().toPyDateTime()
+                hasta = self.hasta_edit.dateTime().toPyDateTime()
+
+            self.worker = CSVExportWorker(file_path, artefact_id, desde, hasta, comprimir,
+                                          resolucion=self.resolucion_combo.currentData())
             self.worker.finished.connect(self.on_export_finished)
+            self.worker.progress.connect(self.on_export_progress)
+
+            # Diálogo de progreso con opción de cancelar
+            self.progress_dialog = QtWidgets.QProgressDialog("Exportando lecturas...", "Cancelar", 0, 0, self)
+            self.progress_dialog.setWindowTitle("Exportación CSV")
+            self.progress_dialog.setWindowModality(QtCore.Qt.WindowModal)
+            self.progress_dialog.canceled.connect(self.worker.requestInterruption)
+            self.progress_dialog.show()
             self.worker.start()
 
+    def on_export_progress(self, escritas, total):
+        """Actualiza el diálogo con las filas escritas sobre el total estimado."""
+        if self.progress_dialog is None:
+            return
+        if total > 0:
+            # Se escala a 0-1000 para no desbordar el rango entero del diálogo
+            self.progress_dialog.setMaximum(1000)
+            self.progress_dialog.setValue(min(1000, int(1000 * escritas / total)))
+        self.progress_dialog.setLabelText(f"Exportando lecturas... {escritas:,} de {total:,}")
+
     def on_export_finished(self, message):
         """Muestra un mensaje al finalizar la exportación."""
+        if self.progress_dialog is not None:
+            self.progress_dialog.canceled.disconnect()
+            self.progress_dialog.close()
+            self.progress_dialog = None
         QtWidgets.QMessageBox.information(self, "Exportación CSV", message)
 
     def closeEvent(self, event):
-        """Cerrar la conexión a la base de datos al cerrar el panel."""
-        if self.db_connection:
-            self.db_connection.close()
+        """Cancelar la exportación en curso al cerrar el panel."""
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.requestInterruption()
+            self.worker.wait()
         super().closeEvent(event)
 
 class CSVExportWorker(QtCore.QThread):
     finished = QtCore.pyqtSignal(str)  # Señal para indicar que terminó
+    progress = QtCore.pyqtSignal(int, int)  # Filas escritas, total estimado
 
-    def __init__(self, db_connection, file_path, artefact_id):
+    def __init__(self, file_path, artefact_id, desde=None, hasta=None, comprimir=False, chunk_size=5000,
+                 resolucion=0):
         super().__init__()
-        self.db_connection = db_connection
         self.file_path = file_path
         self.artefact_id = artefact_id
+        self.desde = desde
+        self.hasta = hasta
+        self.comprimir = comprimir
+        self.chunk_size = chunk_size
+        self.resolucion = resolucion  # Segundos por fila; 0 exporta las lecturas sin agregar
 
     def run(self):
-        """Realiza la exportación en un hilo separado."""
+        """Realiza la exportación en un hilo separado, por bloques y con su propia conexión."""
+        conn = None
+        cancelada = False
         try:
-            cursor = self.db_connection.cursor()
-            cursor.execute("""
+            conn = get_connection()  # Del pool solo mientras dura la exportación
+            if self.resolucion:
+                self.export_rollup(conn)
+                return
+            cursor = conn.cursor()
+
+            filtro = "artefacto_id = ?"
+            params = [self.artefact_id]
+            if self.desde is not None:
+                filtro += " AND fecha_hora >= ?"
+                params.append(self.desde)
+            if self.hasta is not None:
+                filtro += " AND fecha_hora < ?"
+                params.append(self.hasta)
+
+            cursor.execute(f"SELECT COUNT(*) FROM lecturas WHERE {filtro}", params)
+            total = cursor.fetchone()[0]
+            self.progress.emit(0, total)
+
+            cursor.execute(f"""
                 SELECT fecha_hora, corriente, potencia
                 FROM lecturas
-                WHERE artefacto_id = ?
+                WHERE {filtro}
                 ORDER BY fecha_hora
-            """, (self.artefact_id,))
-            rows = cursor.fetchall()
+            """, params)
 
-            with open(self.file_path, mode='w', newline='', encoding='utf-8') as file:
+            opener = gzip.open if self.comprimir else open
+            with opener(self.file_path, mode='wt', newline='', encoding='utf-8') as file:
                 writer = csv.writer(file)
                 writer.writerow(["Fecha y Hora", "Corriente (A)", "Potencia (W)"])
-                writer.writerows(rows)
+                escritas = 0
+                while True:
+                    if self.isInterruptionRequested():
+                        cancelada = True
+                        break
+                    rows = cursor.fetchmany(self.chunk_size)  # Memoria constante sin importar el historial
+                    if not rows:
+                        break
+                    writer.writerows(rows)
+                    escritas += len(rows)
+                    self.progress.emit(escritas, max(total, escritas))
+            cursor.close()
 
-            self.finished.emit("Exportación completada con éxito.")
+            if cancelada:
+                os.remove(self.file_path)  # No dejar un archivo a medias
+                self.finished.emit("Exportación cancelada.")
+            else:
+                self.finished.emit(f"Exportación completada con éxito ({escritas:,} lecturas).")
         except Exception as e:
             self.finished.emit(f"Error durante la exportación: {e}")
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def export_rollup(self, conn):
+        """Exporta los agregados del nivel más grueso que alcanza para la resolución elegida."""
+        desde = self.desde or datetime(1900, 1, 1)
+        hasta = self.hasta or datetime.now()
+        nivel, (_, periodos, lecturas, pmin, pmax, pmedia, energia_wh) = agregados.query_resolution(
+            conn, [self.artefact_id], desde, hasta, self.resolucion)
+        total = len(periodos)
+        self.progress.emit(0, total)
+
+        opener = gzip.open if self.comprimir else open
+        with opener(self.file_path, mode='wt', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(["Periodo", "Lecturas", "Potencia mínima (W)", "Potencia media (W)",
+                             "Potencia máxima (W)", "Energía (Wh)"])
+            for inicio in range(0, total, self.chunk_size):
+                if self.isInterruptionRequested():
+                    break
+                fin = inicio + self.chunk_size
+                writer.writerows(zip(np.char.replace(periodos[inicio:fin].astype(str), 'T', ' '), lecturas[inicio:fin].tolist(),
+                                     pmin[inicio:fin].tolist(), pmedia[inicio:fin].tolist(),
+                                     pmax[inicio:fin].tolist(), energia_wh[inicio:fin].tolist()))
+                self.progress.emit(min(fin, total), total)
+
+        if self.isInterruptionRequested():
+            os.remove(self.file_path)  # No dejar un archivo a medias
+            self.finished.emit("Exportación cancelada.")
+        else:
+            self.finished.emit(f"Exportación completada con éxito ({total:,} periodos, de los agregados por {nivel.nombre}).")
+
+
+class AnomalyAnalysisWorker(QtCore.QThread):
+    finished = QtCore.pyqtSignal(object, str)  # Resultado (o None) y mensaje
+    progress = QtCore.pyqtSignal(int, int)  # Lecturas analizadas, total estimado
+
+    def __init__(self, model_registry, chunk_size=20000):
+        super().__init__()
+        self.model_registry = model_registry
+        self.chunk_size = chunk_size
+
+    def run(self):
+        """Trae, puntúa y prepara el análisis en un hilo separado, con su propia conexión."""
+        conn = None
+        try:
+            model = self.model_registry.get()  # Si aún no terminó de cargarse, se espera aquí
+            conn = get_connection()
+            resultado = modelos.score_history(conn, model, self.chunk_size,
+                                              progress=self.progress.emit,
+                                              cancelled=self.isInterruptionRequested)
+            if resultado is None:
+                self.finished.emit(None, "Análisis cancelado.")
+            else:
+                self.finished.emit(resultado + (self.model_registry.hash,), "")
+        except Exception as e:
+            self.finished.emit(None, f"No se pudo analizar los datos: {e}")
+        finally:
+            if conn is not None:
+                conn.close()
 
 
 class AnomalyAnalysisPanel(QtWidgets.QWidget):
@@ -1020,8 +1377,16 @@ class AnomalyAnalysisPanel(QtWidgets.QWidget):
         super().__init__()
         self.parent = parent  # Referencia al panel principal
         self.setWindowTitle('Análisis de Anomalías')
+        self.worker = None
+        self.progress_dialog = None
+        self.resultado = None  # (artefacto_ids, datos, anómalas, hash del modelo) del último análisis
+        self.al_terminar = None  # Qué mostrar cuando termine el análisis en curso
         self.setup_ui()
 
+        # Cargar el modelo en segundo plano mientras el usuario ve el panel
+        self.model_registry = modelos.get_model_registry()
+        self.model_registry.preload()
+
     def setup_ui(self):
         """Configura la interfaz gráfica del panel."""
         layout = QtWidgets.QVBoxLayout(self)
@@ -1046,12 +1411,31 @@ class AnomalyAnalysisPanel(QtWidgets.QWidget):
         self.view_table_button.clicked.connect(self.view_anomalies_table)
         layout.addWidget(self.view_table_button)
 
-        # Tabla para mostrar resultados
-        self.resultados_tabla = QtWidgets.QTableWidget(self)
-        self.resultados_tabla.setColumnCount(3)
-        self.resultados_tabla.setHorizontalHeaderLabels(["Corriente (A)", "Potencia (W)", "Estado"])
+        # Filtro de la tabla de resultados
+        filtro_layout = QtWidgets.QHBoxLayout()
+        filtro_layout.addWidget(QtWidgets.QLabel("Mostrar:"))
+        self.filtro_combo = QtWidgets.QComboBox(self)
+        self.filtro_combo.addItems(["Todas", "Solo anomalías", "Solo normales"])
+        self.filtro_combo.currentIndexChanged.connect(self.apply_filter)
+        filtro_layout.addWidget(self.filtro_combo)
+        self.filas_label = QtWidgets.QLabel("")
+        filtro_layout.addWidget(self.filas_label)
+        filtro_layout.addStretch()
+        layout.addLayout(filtro_layout)
+
+        # Tabla para mostrar resultados (virtualizada: solo se formatean las celdas visibles)
+        self.resultados_modelo = tablas.ColumnTableModel(parent=self)
+        self.resultados_tabla = QtWidgets.QTableView(self)
+        self.resultados_tabla.setModel(self.resultados_modelo)
+        self.resultados_tabla.setSortingEnabled(True)
+        self.resultados_tabla.horizontalHeader().setStretchLastSection(True)
         layout.addWidget(self.resultados_tabla)
 
+        # Estado del modelo (tiempo de carga)
+        self.model_label = QtWidgets.QLabel("")
+        self.model_label.setStyleSheet("color: #555; font-size: 11px;")
+        layout.addWidget(self.model_label)
+
         self.setLayout(layout)
 
     def return_to_main(self):
@@ -1060,70 +1444,116 @@ class AnomalyAnalysisPanel(QtWidgets.QWidget):
             self.parent.switch_to_main_panel()
 
     def analyze_data(self):
-        """Lógica para analizar datos históricos."""
+        """Vuelve a analizar los datos históricos y muestra la tabla al terminar."""
         print("Analizando datos históricos...")
-        # Aquí conectas tu modelo y tus datos históricos
-        try:
-            model = joblib.load("modelo.pkl")  # Cargar el modelo entrenado
-            data = self.obtener_datos_historicos()  # Obtener datos históricos
-            if not data:
-                QtWidgets.QMessageBox.warning(self, "Advertencia", "No hay datos históricos disponibles.")
-                return
-            predictions = model.predict(data)
-            resultados = [
-                {
-                    "corriente": data[i][0],
-                    "potencia": data[i][1],
-                    "estado": "Anomalía" if pred == -1 else "Normal"
-                }
-                for i, pred in enumerate(predictions)
-            ]
-            self.mostrar_resultados(resultados)
-        except Exception as e:
-            QtWidgets.QMessageBox.critical(self, "Error", f"No se pudo analizar los datos: {e}")
-
-    def obtener_datos_historicos(self):
-        """Obtiene los datos históricos de la base de datos."""
-        try:
-            conn = self.parent.get_connection()  # Usa el método get_connection del panel principal
-            if conn is None:
-                return []  # Si no hay conexión, regresa una lista vacía
-            cursor = conn.cursor()
-            cursor.execute("SELECT corriente, potencia FROM Lecturas WHERE artefacto_id IS NOT NULL")
-            rows = cursor.fetchall()
-            conn.close()
-            return [[row.corriente, row.potencia] for row in rows]
-        except Exception as e:
-            print(f"Error al obtener datos históricos: {e}")
-            return []
+        self.start_analysis(self.mostrar_resultados)
+
+    def start_analysis(self, al_terminar):
+        """Lanza el análisis en segundo plano; `al_terminar` recibe el resultado."""
+        self.al_terminar = al_terminar
+        if self.worker is not None and self.worker.isRunning():
+            return  # Ya hay un análisis en curso; solo se cambia qué mostrar al final
+
+        self.worker = AnomalyAnalysisWorker(self.model_registry)
+        self.worker.finished.connect(self.on_analysis_finished)
+        self.worker.progress.connect(self.on_analysis_progress)
+
+        # Diálogo de progreso con opción de cancelar
+        self.progress_dialog = QtWidgets.QProgressDialog("Analizando lecturas...", "Cancelar", 0, 0, self)
+        self.progress_dialog.setWindowTitle("Análisis de Anomalías")
+        self.progress_dialog.setWindowModality(QtCore.Qt.WindowModal)
+        self.progress_dialog.canceled.connect(self.worker.requestInterruption)
+        self.progress_dialog.show()
+        self.worker.start()
+
+    def on_analysis_progress(self, analizadas, total):
+        """Actualiza el diálogo con las lecturas analizadas sobre el total estimado."""
+        if self.progress_dialog is None:
+            return
+        if total > 0:
+            # Se escala a 0-1000 para no desbordar el rango entero del diálogo
+            self.progress_dialog.setMaximum(1000)
+            self.progress_dialog.setValue(min(1000, int(1000 * analizadas / total)))
+        self.progress_dialog.setLabelText(f"Analizando lecturas... {analizadas:,} de {total:,}")
+
+    def on_analysis_finished(self, resultado, message):
+        """Guarda el resultado del análisis y muestra la vista pedida."""
+        if self.progress_dialog is not None:
+            self.progress_dialog.canceled.disconnect()
+            self.progress_dialog.close()
+            self.progress_dialog = None
+        self.update_model_label()
+        al_terminar, self.al_terminar = self.al_terminar, None
+        if resultado is None:
+            if message.startswith("No se pudo"):
+                QtWidgets.QMessageBox.critical(self, "Error", message)
+            else:
+                print(message)
+            return
+        self.resultado = resultado
+        if len(resultado[1]) == 0:
+            QtWidgets.QMessageBox.warning(self, "Advertencia", "No hay datos históricos disponibles.")
+            return
+        if al_terminar is not None:
+            al_terminar()
+
+    def with_result(self, mostrar):
+        """Muestra el último análisis si sigue vigente; si no, analiza primero."""
+        if self.resultado is not None and self.resultado[3] == self.model_registry.hash \
+                and not self.model_registry.is_stale():
+            mostrar()
+        else:
+            self.start_analysis(mostrar)
+
+    def get_model(self):
+        """Devuelve el modelo del registro y muestra cuánto tardó su última carga."""
+        model = self.model_registry.get()
+        self.update_model_label()
+        return model
+
+    def update_model_label(self):
+        if self.model_registry.load_seconds is not None:
+            self.model_label.setText(
+                f"Modelo cargado en {1000 * self.model_registry.load_seconds:.0f} ms "
+                f"(cargas: {self.model_registry.loads})"
+            )
 
-    def mostrar_resultados(self, resultados):
-        """Muestra los resultados del análisis en la tabla."""
-        self.resultados_tabla.setRowCount(len(resultados))
-        for row, resultado in enumerate(resultados):
-            self.resultados_tabla.setItem(row, 0, QtWidgets.QTableWidgetItem(f"{resultado['corriente']:.3f}"))
-            self.resultados_tabla.setItem(row, 1, QtWidgets.QTableWidgetItem(f"{resultado['potencia']:.3f}"))
-            self.resultados_tabla.setItem(row, 2, QtWidgets.QTableWidgetItem(resultado['estado']))
+    def mostrar_resultados(self):
+        """Muestra los resultados del último análisis en la tabla."""
+        artefacto_ids, data, anomalas, _ = self.resultado
+        self.resultados_modelo.set_columns([
+            tablas.Column("Artefacto", artefacto_ids),
+            tablas.Column("Corriente (A)", data[:, 0], lambda v: f"{v:.3f}"),
+            tablas.Column("Potencia (W)", data[:, 1], lambda v: f"{v:.3f}"),
+            tablas.Column("Estado", anomalas, lambda v: "Anomalía" if v else "Normal", QtCore.Qt.AlignCenter),
+        ])
+        self.apply_filter()
+
+    def apply_filter(self):
+        """Filtra la tabla por estado con una máscara de NumPy."""
+        if self.resultado is None:
+            return
+        anomalas = self.resultado[2]
+        opcion = self.filtro_combo.currentIndex()
+        self.resultados_modelo.set_filter(None if opcion == 0 else (anomalas if opcion == 1 else ~anomalas))
+        self.filas_label.setText(f"{self.resultados_modelo.visible_rows():,} de "
+                                 f"{self.resultados_modelo.total_rows():,} lecturas "
+                                 f"({int(anomalas.sum()):,} anomalías)")
 
     def view_anomalies_graph(self):
         """Muestra un gráfico de las anomalías detectadas."""
-        try:
-            data = self.obtener_datos_historicos()
-            model = joblib.load("modelo.pkl")
-            predictions = model.predict(data)
-
-            # Preparar datos para graficar
-            normales = [data[i] for i in range(len(data)) if predictions[i] == 1]
-            anomalias = [data[i] for i in range(len(data)) if predictions[i] == -1]
+        self.with_result(self.mostrar_grafico)
 
-            normales_x = [d[0] for d in normales]
-            normales_y = [d[1] for d in normales]
-            anomalias_x = [d[0] for d in anomalias]
-            anomalias_y = [d[1] for d in anomalias]
+    def mostrar_grafico(self):
+        """Grafica el último análisis: corriente contra potencia, normales y anómalas."""
+        try:
+            _, data, anomalas, _ = self.resultado
+            normales = data[~anomalas]
+            anomalias = data[anomalas]
 
             # Graficar
-            plt.scatter(normales_x, normales_y, label="Normal", color="green")
-            plt.scatter(anomalias_x, anomalias_y, label="Anomalía", color="red")
+            plt.scatter(normales[:, 0], normales[:, 1], label="Normal", color="green")
+            plt.scatter(anomalias[:, 0], anomalias[:, 1], label="Anomalía", color="red")
             plt.xlabel("Corriente (A)")
             plt.ylabel("Potencia (W)")
             plt.title("Análisis de Anomalías")
@@ -1135,90 +1565,382 @@ class AnomalyAnalysisPanel(QtWidgets.QWidget):
     def view_anomalies_table(self):
         """Muestra los resultados del análisis en la tabla."""
         print("Mostrando resultados en tabla...")
-        self.analyze_data()  # Llama al análisis de datos y actualiza la tabla
+        self.with_result(self.mostrar_resultados)
+
+    def closeEvent(self, event):
+        """Cancelar el análisis en curso al cerrar el panel."""
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.requestInterruption()
+            self.worker.wait()
+        super().closeEvent(event)
 
 class HistorialLecturasWindow(QtWidgets.QWidget):
-    def __init__(self, db_connection):
+    """Historial de lecturas; cada consulta o página toma una conexión del pool y la devuelve al terminar."""
+
+    def __init__(self):
         super().__init__()
-        self.db_connection = db_connection
+        self.query = None  # Consulta paginada en curso
         self.setWindowTitle("Historial de Lecturas")
         self.setFixedSize(800, 600)
         self.setup_ui()
+        self.load_artefactos()
 
     def setup_ui(self):
         """Configura la interfaz de la ventana de historial de lecturas."""
         self.layout = QtWidgets.QVBoxLayout(self)
 
-        # Selector de fecha
-        self.date_picker = QtWidgets.QDateEdit(self)
-        self.date_picker.setDate(QtCore.QDate.currentDate())  # Por defecto, hoy
-        self.date_picker.setDisplayFormat("yyyy-MM-dd")
-        self.layout.addWidget(self.date_picker)
-
-        # Botón para cargar lecturas
+        # Artefactos a consultar (uno o varios)
+        filtros_layout = QtWidgets.QHBoxLayout()
+        self.artefactos_list = QtWidgets.QListWidget(self)
+        self.artefactos_list.setMaximumHeight(90)
+        filtros_layout.addWidget(self.artefactos_list)
+
+        # Rango [desde, hasta); por defecto, el día de hoy
+        rango_layout = QtWidgets.QFormLayout()
+        desde, hasta = historial.day_range(datetime.now())
+        self.desde_edit = QtWidgets.QDateTimeEdit(QtCore.QDateTime(desde), self)
+        self.hasta_edit = QtWidgets.QDateTimeEdit(QtCore.QDateTime(hasta), self)
+        for edit in (self.desde_edit, self.hasta_edit):
+            edit.setDisplayFormat("yyyy-MM-dd HH:mm")
+            edit.setCalendarPopup(True)
+        rango_layout.addRow("Desde:", self.desde_edit)
+        rango_layout.addRow("Hasta:", self.hasta_edit)
+        self.resolucion_combo = QtWidgets.QComboBox(self)
+        for nombre, segundos in agregados.RESOLUCIONES:
+            self.resolucion_combo.addItem(nombre, segundos)
+        rango_layout.addRow("Resolución:", self.resolucion_combo)
+        filtros_layout.addLayout(rango_layout)
+        self.layout.addLayout(filtros_layout)
+
+        # Botones para cargar lecturas y graficar el rango
+        botones_layout = QtWidgets.QHBoxLayout()
         self.load_button = QtWidgets.QPushButton("Cargar Lecturas", self)
-        print("Conectando botón 'Cargar Lecturas' al método load_lecturas")
         self.load_button.clicked.connect(self.load_lecturas)  # Conexión al método
-        self.layout.addWidget(self.load_button)
-
-        # Tabla para mostrar las lecturas
-        self.table = QtWidgets.QTableWidget(self)
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["Fecha", "Artefacto", "Corriente (A)", "Potencia (W)"])
+        botones_layout.addWidget(self.load_button)
+        self.plot_button = QtWidgets.QPushButton("Ver Gráfico", self)
+        self.plot_button.clicked.connect(self.plot_range)
+        botones_layout.addWidget(self.plot_button)
+        self.layout.addLayout(botones_layout)
+
+        # Tabla para mostrar las lecturas: las páginas se piden al desplazarse
+        self.table_model = tablas.PagedTableModel(parent=self)
+        self.table_model.rowsInserted.connect(self.update_status)
+        self.table = QtWidgets.QTableView(self)
+        self.table.setModel(self.table_model)
+        self.table.horizontalHeader().setStretchLastSection(True)
         self.layout.addWidget(self.table)
 
-    def load_lecturas(self):
-        """Cargar lecturas desde la base de datos y mostrar en la tabla."""
-        try:
-            # Obtener artefacto_id y la fecha seleccionada
-            artefacto_id = 1  # Esto debe ser ajustado según el contexto, probablemente lo obtienes de algún lado
-            fecha = self.date_picker.date()  # Obtener la fecha del QDateEdit
-            print(f"Fecha seleccionada: {fecha.toString('yyyy-MM-dd')}")
+        self.status_label = QtWidgets.QLabel("")
+        self.status_label.setStyleSheet("color: #555; font-size: 11px;")
+        self.layout.addWidget(self.status_label)
 
-            # Conexión a la base de datos
-            cursor = self.db_connection.cursor()
+    def load_artefactos(self):
+        """Llena la lista de artefactos; el primero queda marcado."""
+        try:
+            for i, (artefacto_id, nombre) in enumerate(catalogo.get_catalog().all()):
+                item = QtWidgets.QListWidgetItem(f"{artefacto_id} - {nombre}", self.artefactos_list)
+                item.setData(QtCore.Qt.UserRole, artefacto_id)
+                item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
+                item.setCheckState(QtCore.Qt.Checked if i == 0 else QtCore.Qt.Unchecked)
+        except Exception as e:
+            print(f"Error al cargar los artefactos: {e}")
 
-            # Asegúrate de que la fecha esté en formato adecuado para SQL
-            fecha_str = fecha.toString("yyyy-MM-dd")  # Formato para SQL
-            print(f"Fecha en formato SQL: {fecha_str}")
+    def selected_artefactos(self):
+        return [
+            self.artefactos_list.item(i).data(QtCore.Qt.UserRole)
+            for i in range(self.artefactos_list.count())
+            if self.artefactos_list.item(i).checkState() == QtCore.Qt.Checked
+        ]
 
-            # Ejecutar la consulta SQL
-            cursor.execute("""
-                SELECT fecha_hora, corriente, potencia
-                FROM lecturas
-                WHERE artefacto_id = ? AND CAST(fecha_hora AS DATE) = ?
-                ORDER BY fecha_hora
-            """, (artefacto_id, fecha_str))
-
-            rows = cursor.fetchall()
-            print(f"Lecturas encontradas: {len(rows)}")  # Depuración para ver cuántos registros se obtienen
-
-            if rows:
-                # Actualizar la tabla con los datos obtenidos
-                self.table.setRowCount(len(rows))
-                for row, (fecha_hora, corriente, potencia) in enumerate(rows):
-                    self.table.setItem(row, 0, QtWidgets.QTableWidgetItem(str(fecha_hora)))
-                    self.table.setItem(row, 1, QtWidgets.QTableWidgetItem(str(corriente)))
-                    self.table.setItem(row, 2, QtWidgets.QTableWidgetItem(str(potencia)))
-            else:
-                print("No se encontraron lecturas para la fecha y artefacto seleccionados")
-                # Mostrar un mensaje si no se encuentran lecturas
-                QtWidgets.QMessageBox.warning(self, "Advertencia", "No se encontraron lecturas para la fecha seleccionada.")
+    def load_lecturas(self):
+        """Empieza una consulta paginada con los artefactos y el rango elegidos."""
+        try:
+            artefacto_ids = self.selected_artefactos()
+            if not artefacto_ids:
+                QtWidgets.QMessageBox.warning(self, "Advertencia", "Seleccione al menos un artefacto.")
+                return
+            desde = self.desde_edit.dateTime().toPyDateTime()
+            hasta = self.hasta_edit.dateTime().toPyDateTime()
+            if self.resolucion_combo.currentData():
+                self.load_agregados(artefacto_ids, desde, hasta, self.resolucion_combo.currentData())
+                return
+            self.query = historial.HistoryQuery(None, artefacto_ids, desde, hasta,
+                                                sql=almacenamiento.get_backend().sql_pagina, connect=get_connection)
+
+            self.table_model.set_source([
+                tablas.Column("Fecha", np.empty(0, dtype="datetime64[ms]"), tablas.format_datetime,
+                              QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter),
+                tablas.Column("Artefacto", np.empty(0, dtype=np.int64)),
+                tablas.Column("Corriente (A)", np.empty(0, dtype=np.float64), lambda v: f"{v:.3f}"),
+                tablas.Column("Potencia (W)", np.empty(0, dtype=np.float64), lambda v: f"{v:.3f}"),
+            ], self.next_page)
+            self.table_model.fetchMore()  # Primera página; las demás, al desplazarse
+            self.update_status()
+
+            if self.table_model.total_rows() == 0:
+                print("No se encontraron lecturas para el rango y artefactos seleccionados")
+                QtWidgets.QMessageBox.warning(self, "Advertencia", "No se encontraron lecturas en el rango seleccionado.")
 
         except Exception as e:
             print(f"Error al cargar las lecturas: {e}")
             QtWidgets.QMessageBox.critical(self, "Error", f"Error al cargar las lecturas: {e}")
 
+    def load_agregados(self, artefacto_ids, desde, hasta, resolucion):
+        """Muestra los agregados del nivel más grueso que alcanza para la resolución elegida."""
+        self.query = None
+        conn = get_connection()
+        try:
+            nivel, (ids, periodos, lecturas, pmin, pmax, pmedia, energia_wh) = agregados.query_resolution(
+                conn, artefacto_ids, desde, hasta, resolucion)
+        finally:
+            conn.close()
+        pagina = [(periodos, ids, lecturas, pmin, pmedia, pmax, energia_wh)]
+        formato = lambda v: f"{v:.3f}"
+        self.table_model.set_source([
+            tablas.Column("Periodo", periodos[:0], tablas.format_datetime, QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter),
+            tablas.Column("Artefacto", ids[:0]),
+            tablas.Column("Lecturas", lecturas[:0]),
+            tablas.Column("Pot. mín. (W)", pmin[:0], formato),
+            tablas.Column("Pot. media (W)", pmedia[:0], formato),
+            tablas.Column("Pot. máx. (W)", pmax[:0], formato),
+            tablas.Column("Energía (Wh)", energia_wh[:0], formato),
+        ], lambda: pagina.pop() if pagina else None)
+        self.table_model.fetchMore()
+        self.status_label.setText(f"{len(periodos):,} periodos de los agregados por {nivel.nombre} "
+                                  f"({int(lecturas.sum()):,} lecturas, {energia_wh.sum() / 1000:.3f} kWh)")
+        if len(periodos) == 0:
+            QtWidgets.QMessageBox.warning(self, "Advertencia", "No hay agregados en el rango seleccionado.")
+
+    def plot_range(self):
+        """Grafica la potencia del rango con el nivel de agregados que corresponde a su duración."""
+        try:
+            artefacto_ids = self.selected_artefactos()
+            desde = self.desde_edit.dateTime().toPyDateTime()
+            hasta = self.hasta_edit.dateTime().toPyDateTime()
+            if not artefacto_ids or desde >= hasta:
+                QtWidgets.QMessageBox.warning(self, "Advertencia", "Seleccione artefactos y un rango válido.")
+                return
+
+            nivel = agregados.level_for_range(desde, hasta)
+            conn = get_connection()  # Solo mientras se leen los datos del gráfico
+            try:
+                for artefacto_id in artefacto_ids:
+                    if nivel is None:
+                        # Rango corto: se grafican las lecturas crudas
+                        query = historial.HistoryQuery(conn, [artefacto_id], desde, hasta,
+                                                       sql=almacenamiento.get_backend().sql_pagina)
+                        paginas = list(iter(query.next_page, None))
+                        if not paginas:
+                            continue
+                        tiempos = np.concatenate([p[1] for p in paginas])
+                        plt.plot(tiempos, np.concatenate([p[3] for p in paginas]), label=f"Artefacto {artefacto_id}")
+                    else:
+                        _, (_, periodos, _, pmin, pmax, pmedia, _) = agregados.query_resolution(
+                            conn, [artefacto_id], desde, hasta, nivel.segundos)
+                        linea, = plt.plot(periodos, pmedia, label=f"Artefacto {artefacto_id}")
+                        plt.fill_between(periodos, pmin, pmax, color=linea.get_color(), alpha=0.2)
+            finally:
+                conn.close()
+            plt.xlabel("Fecha")
+            plt.ylabel("Potencia (W)")
+            plt.title(f"Potencia ({'lecturas' if nivel is None else 'agregados por ' + nivel.nombre})")
+            plt.legend()
+            plt.show()
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Error", f"No se pudo generar el gráfico: {e}")
+
+    def next_page(self):
+        """Siguiente página de la consulta, con las columnas en el orden de la tabla."""
+        pagina = self.query.next_page()
+        if pagina is None:
+            return None
+        ids, fechas, corrientes, potencias = pagina
+        return fechas, ids, corrientes, potencias
+
+    def update_status(self, *args):
+        if self.query is None:
+            return
+        estado = "completo" if self.query.exhausted else "desplácese para cargar más"
+        self.status_label.setText(f"{self.query.filas:,} lecturas en {self.query.paginas} páginas ({estado})")
+
+
+class EnergyReportWorker(QtCore.QThread):
+    finished = QtCore.pyqtSignal(object, str)  # Reporte (o None) y mensaje
+    progress = QtCore.pyqtSignal(int, int)  # Artefactos procesados, total
+
+    def __init__(self, artefacto_ids, desde, hasta, periodo):
+        super().__init__()
+        self.artefacto_ids = artefacto_ids
+        self.desde = desde
+        self.hasta = hasta
+        self.periodo = periodo
+
+    def run(self):
+        """Actualiza agregados y acumulado con los datos nuevos y arma el reporte, en un hilo separado."""
+        conn = None
+        try:
+            conn = get_connection()  # Del pool solo mientras dura el cálculo
+            tarifa = energia.TariffSchedule.load()
+            agregados.update(conn)  # Solo las lecturas posteriores a la marca de agua
+            ledger = energia.EnergyLedger.load(tarifa)
+            leidos = energia.update_ledger(conn, ledger, tarifa, self.artefacto_ids,
+                                           progress=self.progress.emit, cancelled=self.isInterruptionRequested)
+            if leidos is None:
+                self.finished.emit(None, "Reporte cancelado.")
+                return
+            ledger.save()
+            reporte = energia.build_report(ledger, tarifa, self.artefacto_ids, self.desde, self.hasta, self.periodo)
+            self.finished.emit(reporte, f"{leidos:,} minutos nuevos procesados")
+        except Exception as e:
+            self.finished.emit(None, f"No se pudo calcular el reporte: {e}")
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+class EnergyReportWindow(QtWidgets.QWidget):
+    def __init__(self):
+        super().__init__()
+        self.worker = None
+        self.progress_dialog = None
+        self.nombres = {}  # Nombre de cada artefacto por id
+        self.setWindowTitle("Consumo y Costo de Energía")
+        self.resize(900, 600)
+        self.setup_ui()
+        self.load_artefactos()
+
+    def setup_ui(self):
+        """Configura la interfaz de la ventana de reportes."""
+        self.layout = QtWidgets.QVBoxLayout(self)
+
+        filtros_layout = QtWidgets.QHBoxLayout()
+        self.artefactos_list = QtWidgets.QListWidget(self)
+        self.artefactos_list.setMaximumHeight(90)
+        filtros_layout.addWidget(self.artefactos_list)
+
+        rango_layout = QtWidgets.QFormLayout()
+        hoy = QtCore.QDate.currentDate()
+        self.desde_edit = QtWidgets.QDateEdit(QtCore.QDate(hoy.year(), hoy.month(), 1), self)
+        self.hasta_edit = QtWidgets.QDateEdit(hoy.addDays(1), self)
+        for edit in (self.desde_edit, self.hasta_edit):
+            edit.setDisplayFormat("yyyy-MM-dd")
+            edit.setCalendarPopup(True)
+        rango_layout.addRow("Desde:", self.desde_edit)
+        rango_layout.addRow("Hasta (excluido):", self.hasta_edit)
+        self.periodo_combo = QtWidgets.QComboBox(self)
+        for nombre, periodo in (("Por día", "dia"), ("Por semana", "semana"), ("Por mes", "mes")):
+            self.periodo_combo.addItem(nombre, periodo)
+        rango_layout.addRow("Agrupar:", self.periodo_combo)
+        filtros_layout.addLayout(rango_layout)
+        self.layout.addLayout(filtros_layout)
+
+        self.calcular_button = QtWidgets.QPushButton("Calcular Reporte", self)
+        self.calcular_button.clicked.connect(self.calcular)
+        self.layout.addWidget(self.calcular_button)
+
+        self.table_model = tablas.ColumnTableModel(parent=self)
+        self.table = QtWidgets.QTableView(self)
+        self.table.setModel(self.table_model)
+        self.table.setSortingEnabled(True)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.layout.addWidget(self.table)
+
+        self.total_label = QtWidgets.QLabel("")
+        self.total_label.setFont(QtGui.QFont("Arial", 12, QtGui.QFont.Bold))
+        self.layout.addWidget(self.total_label)
+
+    def load_artefactos(self):
+        """Llena la lista de artefactos, todos marcados."""
+        try:
+            for artefacto_id, nombre in catalogo.get_catalog().all():
+                self.nombres[artefacto_id] = nombre
+                item = QtWidgets.QListWidgetItem(f"{artefacto_id} - {nombre}", self.artefactos_list)
+                item.setData(QtCore.Qt.UserRole, artefacto_id)
+                item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
+                item.setCheckState(QtCore.Qt.Checked)
+        except Exception as e:
+            print(f"Error al cargar los artefactos: {e}")
+
+    def calcular(self):
+        """Calcula el reporte en segundo plano."""
+        artefacto_ids = [
+            self.artefactos_list.item(i).data(QtCore.Qt.UserRole)
+            for i in range(self.artefactos_list.count())
+            if self.artefactos_list.item(i).checkState() == QtCore.Qt.Checked
+        ]
+        if not artefacto_ids:
+            QtWidgets.QMessageBox.warning(self, "Advertencia", "Seleccione al menos un artefacto.")
+            return
+        if self.worker is not None and self.worker.isRunning():
+            return
+
+        self.worker = EnergyReportWorker(artefacto_ids, self.desde_edit.date().toPyDate(),
+                                         self.hasta_edit.date().toPyDate(), self.periodo_combo.currentData())
+        self.worker.finished.connect(self.on_report_finished)
+        self.worker.progress.connect(self.on_report_progress)
+
+        # Diálogo de progreso con opción de cancelar
+        self.progress_dialog = QtWidgets.QProgressDialog("Calculando consumo...", "Cancelar", 0, 0, self)
+        self.progress_dialog.setWindowTitle("Consumo y Costo")
+        self.progress_dialog.setWindowModality(QtCore.Qt.WindowModal)
+        self.progress_dialog.canceled.connect(self.worker.requestInterruption)
+        self.progress_dialog.show()
+        self.worker.start()
+
+    def on_report_progress(self, procesados, total):
+        if self.progress_dialog is None:
+            return
+        self.progress_dialog.setMaximum(total)
+        self.progress_dialog.setValue(procesados)
+        self.progress_dialog.setLabelText(f"Calculando consumo... artefacto {procesados} de {total}")
+
+    def on_report_finished(self, reporte, message):
+        """Muestra el reporte en la tabla y los totales debajo."""
+        if self.progress_dialog is not None:
+            self.progress_dialog.canceled.disconnect()
+            self.progress_dialog.close()
+            self.progress_dialog = None
+        if reporte is None:
+            if message.startswith("No se pudo"):
+                QtWidgets.QMessageBox.critical(self, "Error", message)
+            else:
+                print(message)
+            return
+
+        tarifa = reporte.tarifa
+        formato = lambda v: f"{v:.3f}"
+        columnas = [
+            tablas.Column("Periodo", reporte.periodos, str, QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter),
+            tablas.Column("Artefacto", reporte.artefacto_ids, lambda v: self.nombres.get(int(v), str(v)),
+                          QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter),
+        ]
+        if len(tarifa.nombres) > 1:
+            columnas += [tablas.Column(f"kWh {nombre}", reporte.kwh_franjas[:, i], formato)
+                         for i, nombre in enumerate(tarifa.nombres)]
+        columnas += [
+            tablas.Column("Total (kWh)", reporte.kwh, formato),
+            tablas.Column(f"Costo ({tarifa.moneda})", reporte.costo, lambda v: f"{v:.2f}"),
+        ]
+        self.table_model.set_columns(columnas)
+        self.total_label.setText(f"Total: {reporte.total_kwh():.3f} kWh — "
+                                 f"{tarifa.moneda} {reporte.total_cost():.2f}  ({message})")
+
     def closeEvent(self, event):
-        """Cerrar la conexión a la base de datos al cerrar el panel."""
-        if self.db_connection:
-            self.db_connection.close()
-            print("Conexión a la base de datos cerrada.")
+        """Cancelar el cálculo en curso al cerrar la ventana."""
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.requestInterruption()
+            self.worker.wait()
         super().closeEvent(event)
 
 
 if __name__ == "__main__":
     app = QtWidgets.QApplication(sys.argv)
+    app.aboutToQuit.connect(stop_batch_writer)  # No perder las lecturas aún en cola
     window = LoginWindow()
     window.show()
+    if arranque.OPCION_TIEMPOS in sys.argv:
+        # Se informa cuando el bucle de eventos ya mostró la ventana, y otra vez al salir
+        hasta_ventana = lambda: time.perf_counter() - arranque.import_timer.inicio
+        QTimer.singleShot(0, lambda: print(arranque.import_timer.report(hasta_ventana())))
+        app.aboutToQuit.connect(lambda: print(arranque.import_timer.report()))
     sys.exit(app.exec_())
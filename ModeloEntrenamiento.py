@@ -1,68 +1,414 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import shared_memory
 from sklearn.ensemble import IsolationForest
 import numpy as np
 import joblib
-from Interfaz import get_connection  
-
-# Mensaje de inicio
-print("Iniciando el script de entrenamiento del modelo de anomalías...")
-
-try:
-    # Conectar a la base de datos
-    conn = get_connection()
-    print("Conexión a la base de datos exitosa.")
-except Exception as e:
-    print(f"Error de conexión: {e}")
-    exit()
-
-# Crear un cursor para ejecutar las consultas
-cursor = conn.cursor()
-
-# Obtener las lecturas de la tabla Lecturas
-try:
-    cursor.execute("""
-        SELECT corriente, potencia 
-        FROM Lecturas 
-        WHERE artefacto_id IS NOT NULL
-    """)
-    rows = cursor.fetchall()
-    print(f"Datos obtenidos de la tabla Lecturas: {len(rows)} filas.")
-except Exception as e:
-    print(f"Error al obtener los datos: {e}")
-    exit()
-
-# Verificar si se obtuvieron datos
-if not rows:
-    print("No se encontraron datos en la tabla Lecturas.")
-    exit()
-
-# Convertir las lecturas a un formato adecuado para el modelo
-try:
-    historical_data = np.array([[row.corriente, row.potencia] for row in rows])
+from basedatos import get_connection  # Conexión del pool compartido
+from archivo import ReadingArchive
+from historial import last_reading_id
+from modelos import RUTA_MODELO, RUTA_MODELOS_ARTEFACTOS, VERSION_PAQUETE
+
+RUTA_ESTADO = 'entrenamiento_estado.npz'  # Marca de agua y reservorio del modo incremental
+TAMANO_RESERVORIO = 200000                # Lecturas que se conservan como muestra de todo el historial
+TAMANO_BLOQUE = 50000                     # Filas por fetchmany
+MIN_LECTURAS_ARTEFACTO = 500              # Con menos lecturas, el artefacto usa el modelo global
+
+
+def cargar_desde_base_de_datos():
+    """Obtiene corriente y potencia de todas las lecturas de la tabla Lecturas."""
+    try:
+        # Conectar a la base de datos
+        conn = get_connection()
+        print("Conexión a la base de datos exitosa.")
+    except Exception as e:
+        print(f"Error de conexión: {e}")
+        exit()
+
+    # Crear un cursor para ejecutar las consultas
+    cursor = conn.cursor()
+
+    # Obtener las lecturas de la tabla Lecturas
+    try:
+        cursor.execute("""
+            SELECT corriente, potencia
+            FROM Lecturas
+            WHERE artefacto_id IS NOT NULL
+        """)
+        rows = cursor.fetchall()
+        print(f"Datos obtenidos de la tabla Lecturas: {len(rows)} filas.")
+    except Exception as e:
+        print(f"Error al obtener los datos: {e}")
+        exit()
+
+    # Cerrar la conexión a la base de datos
+    cursor.close()
+    conn.close()
+    print("Conexión a la base de datos cerrada.")
+
+    # Convertir las lecturas a un formato adecuado para el modelo
+    try:
+        return np.array([[row.corriente, row.potencia] for row in rows])
+    except Exception as e:
+        print(f"Error al convertir los datos: {e}")
+        exit()
+
+
+def sincronizar_archivo(archivo):
+    """Trae al archivo local las lecturas nuevas; si falla, se sigue con lo archivado."""
+    try:
+        conn = get_connection()
+        try:
+            print(f"Archivo sincronizado: {archivo.sync(conn)} lecturas nuevas.")
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"No se pudo sincronizar el archivo, se usan los datos ya archivados: {e}")
+
+
+def cargar_desde_archivo(sincronizar=True):
+    """Obtiene corriente y potencia del archivo columnar local (ver archivo.py)."""
+    archivo = ReadingArchive()
+    if sincronizar:
+        sincronizar_archivo(archivo)
+
+    partes = []
+    for artefacto_id in archivo.artefactos():
+        for _, corrientes, potencias in archivo.iter_range(artefacto_id):
+            partes.append(np.column_stack((corrientes, potencias)))
+    print(f"Datos obtenidos del archivo local: {sum(len(p) for p in partes)} lecturas.")
+    return np.concatenate(partes).astype(np.float64) if partes else np.empty((0, 2))
+
+
+def cargar_estado(ruta=RUTA_ESTADO, capacidad=TAMANO_RESERVORIO):
+    """Lee la marca de agua, el último id de Lecturas visto y el reservorio; si no existen, empieza de cero."""
+    if not os.path.exists(ruta):
+        return None, None, np.empty((capacidad, 2), dtype=np.float64), 0
+    with np.load(ruta) as estado:
+        guardado = estado['reservorio']
+        vistos = int(estado['vistos'])
+        marca = datetime.fromisoformat(str(estado['marca'])) if str(estado['marca']) else None
+        ultimo_id = int(estado['ultimo_id']) if 'ultimo_id' in estado.files and int(estado['ultimo_id']) >= 0 else None
+    if vistos > len(guardado):
+        # El reservorio ya está lleno: se conserva la capacidad con la que se construyó
+        capacidad = len(guardado)
+    reservorio = np.empty((capacidad, 2), dtype=np.float64)
+    reservorio[:len(guardado)] = guardado
+    return marca, ultimo_id, reservorio, vistos
+
+
+def guardar_estado(marca, ultimo_id, reservorio, vistos, ruta=RUTA_ESTADO):
+    """Guarda la marca de agua, el último id visto y el reservorio de forma atómica."""
+    temporal = ruta + '.tmp.npz'
+    np.savez(temporal, marca=marca.isoformat() if marca else '',
+             ultimo_id=-1 if ultimo_id is None else ultimo_id,
+             reservorio=reservorio[:min(vistos, len(reservorio))], vistos=vistos)
+    os.replace(temporal, ruta)
+
+
+def actualizar_reservorio(reservorio, vistos, bloque, rng):
+    """Muestreo de reservorio (algoritmo R) vectorizado sobre un bloque de lecturas.
+
+    Tras procesar N lecturas en total, cada una tiene la misma probabilidad
+    k/N de estar en el reservorio de tamaño k. Devuelve el nuevo total visto.
+    """
+    capacidad = len(reservorio)
+    m = len(bloque)
+    directas = max(0, min(capacidad - vistos, m))
+    reservorio[vistos:vistos + directas] = bloque[:directas]
+    resto = bloque[directas:]
+    if len(resto):
+        indices = np.arange(vistos + directas, vistos + m)  # Posición global de cada lectura
+        destinos = rng.integers(0, indices + 1)
+        elegidas = destinos < capacidad
+        reservorio[destinos[elegidas]] = resto[elegidas]
+    return vistos + m
+
+
+def cargar_incremental(margen=timedelta(minutes=5), connect=get_connection, ruta=RUTA_ESTADO):
+    """Trae solo las lecturas nuevas y actualiza el reservorio.
+
+    Son nuevas las posteriores a la marca de agua y, además, las insertadas
+    desde la vez anterior con una fecha_hora anterior a la marca (las que la
+    bitácora local carga tarde tras una caída de la base); estas se reconocen
+    por el id de Lecturas. Cada lectura entra una sola vez al reservorio.
+    Devuelve la muestra con la que se entrena y una función que guarda el
+    nuevo estado una vez que el modelo quedó escrito.
+    """
+    marca, visto, reservorio, vistos = cargar_estado(ruta)
+    print(f"Marca de agua anterior: {marca or 'ninguna'} ({vistos} lecturas vistas).")
+    hasta = datetime.now() - margen  # Dar tiempo a que terminen de escribirse los lotes recientes
+    rng = np.random.default_rng()
+    bloque = np.empty((TAMANO_BLOQUE, 2), dtype=np.float64)  # Se reutiliza en cada fetchmany
+
+    conn = connect()
+    try:
+        ultimo_id = last_reading_id(conn)
+        if visto is None:
+            visto = ultimo_id  # Estado sin id: no se pueden distinguir las lecturas tardías anteriores
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT fecha_hora, corriente, potencia
+            FROM Lecturas
+            WHERE artefacto_id IS NOT NULL AND id <= ? AND fecha_hora <= ? AND (fecha_hora > ? OR id > ?)
+        """, (ultimo_id, hasta, marca or datetime(1900, 1, 1), visto))
+        nuevas = 0
+        while True:
+            rows = cursor.fetchmany(TAMANO_BLOQUE)
+            if not rows:
+                break
+            n = len(rows)
+            bloque[:n] = [(row[1], row[2]) for row in rows]
+            vistos = actualizar_reservorio(reservorio, vistos, bloque[:n], rng)
+            ultima = max(row[0] for row in rows)
+            marca = ultima if marca is None else max(marca, ultima)
+            nuevas += n
+        cursor.close()
+    finally:
+        conn.close()
+
+    print(f"Lecturas nuevas: {nuevas}. Muestra de entrenamiento: {min(vistos, len(reservorio))} lecturas.")
+    muestra = reservorio[:min(vistos, len(reservorio))]
+    return muestra, lambda: guardar_estado(marca, ultimo_id, reservorio, vistos, ruta)
+
+
+def cargar_por_artefacto(desde_archivo=False, sincronizar=True):
+    """Obtiene (artefacto_id, corriente, potencia) de todas las lecturas.
+
+    Devuelve los ids y una matriz (n, 2) float64 contigua ordenada por
+    artefacto, lista para copiarse a memoria compartida.
+    """
+    ids, partes = [], []
+    if desde_archivo:
+        archivo = ReadingArchive()
+        if sincronizar:
+            sincronizar_archivo(archivo)
+        for artefacto_id in archivo.artefactos():
+            for _, corrientes, potencias in archivo.iter_range(artefacto_id):
+                partes.append(np.column_stack((corrientes, potencias)))
+                ids.append(np.full(len(corrientes), artefacto_id, dtype=np.int64))
+    else:
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT artefacto_id, corriente, potencia
+                FROM Lecturas
+                WHERE artefacto_id IS NOT NULL
+            """)
+            while True:
+                rows = cursor.fetchmany(TAMANO_BLOQUE)
+                if not rows:
+                    break
+                bloque = np.array([tuple(row) for row in rows], dtype=np.float64)
+                ids.append(bloque[:, 0].astype(np.int64))
+                partes.append(bloque[:, 1:])
+            cursor.close()
+        finally:
+            conn.close()
+
+    if not partes:
+        return np.empty(0, dtype=np.int64), np.empty((0, 2))
+    artefacto_ids = np.concatenate(ids)
+    orden = np.argsort(artefacto_ids, kind='stable')
+    datos = np.concatenate(partes).astype(np.float64)[orden]
+    print(f"Datos obtenidos para el entrenamiento por artefacto: {len(datos)} lecturas.")
+    return artefacto_ids[orden], np.ascontiguousarray(datos)
+
+
+def _entrenar_particion(nombre, forma, inicio, fin, artefacto_id):
+    """Entrena el modelo de un artefacto en un proceso del pool.
+
+    Las lecturas se leen directamente del bloque de memoria compartida, así
+    que al proceso solo se le envían el nombre del bloque y los límites.
+    """
+    memoria = shared_memory.SharedMemory(name=nombre)
+    try:
+        datos = np.ndarray(forma, dtype=np.float64, buffer=memoria.buf)
+        inicio_ajuste = time.perf_counter()
+        model = IsolationForest(contamination=0.1, n_jobs=1)  # El paralelismo lo pone el pool
+        model.fit(datos[inicio:fin])
+        segundos = time.perf_counter() - inicio_ajuste
+        del datos  # Liberar la vista antes de cerrar el bloque
+    finally:
+        memoria.close()
+    return artefacto_id, model, segundos, fin - inicio
+
+
+def _particiones(artefacto_ids):
+    """Límites [inicio, fin) de cada artefacto en el arreglo ordenado."""
+    ids, inicios, cantidades = np.unique(artefacto_ids, return_index=True, return_counts=True)
+    return [(int(i), int(a), int(a + n)) for i, a, n in zip(ids, inicios, cantidades)]
+
+
+def entrenar_por_artefacto(artefacto_ids, datos, procesos=None, comparar_serial=False):
+    """Entrena un IsolationForest por artefacto en un pool de procesos.
+
+    Devuelve el paquete versionado que carga modelos.ModelRegistry y un
+    resumen de tiempos con la aceleración respecto al entrenamiento en serie.
+    """
+    particiones = [p for p in _particiones(artefacto_ids) if p[2] - p[1] >= MIN_LECTURAS_ARTEFACTO]
+    omitidos = len(np.unique(artefacto_ids)) - len(particiones)
+    if omitidos:
+        print(f"{omitidos} artefactos con menos de {MIN_LECTURAS_ARTEFACTO} lecturas usarán el modelo global.")
+
+    memoria = shared_memory.SharedMemory(create=True, size=max(datos.nbytes, 1))
+    try:
+        compartidos = np.ndarray(datos.shape, dtype=np.float64, buffer=memoria.buf)
+        compartidos[:] = datos
+        del compartidos
+
+        inicio = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            futuros = [pool.submit(_entrenar_particion, memoria.name, datos.shape, a, b, artefacto_id)
+                       for artefacto_id, a, b in particiones]
+            resultados = [f.result() for f in futuros]
+        paralelo = time.perf_counter() - inicio
+
+        serial = None
+        if comparar_serial:
+            inicio = time.perf_counter()
+            for artefacto_id, a, b in particiones:
+                _entrenar_particion(memoria.name, datos.shape, a, b, artefacto_id)
+            serial = time.perf_counter() - inicio
+    finally:
+        memoria.close()
+        memoria.unlink()
+
+    modelos = {}
+    for artefacto_id, model, segundos, n in resultados:
+        modelos[artefacto_id] = model
+        print(f"  Artefacto {artefacto_id}: {n} lecturas, {segundos:.2f} s.")
+
+    # Modelo global para los artefactos sin modelo propio (sobre una muestra acotada)
+    rng = np.random.default_rng()
+    muestra = datos if len(datos) <= TAMANO_RESERVORIO else datos[rng.choice(len(datos), TAMANO_RESERVORIO, replace=False)]
+    global_model = IsolationForest(contamination=0.1, n_jobs=-1).fit(muestra)
+
+    suma = sum(r[2] for r in resultados)
+    resumen = {
+        "artefactos": len(modelos),
+        "segundos_paralelo": paralelo,
+        "segundos_ajuste": suma,  # Tiempo que tardaría en serie sin contar el arranque del pool
+        "segundos_serial": serial,
+        "aceleracion": (serial if serial is not None else suma) / paralelo if paralelo else 0.0,
+    }
+    paquete = {
+        "version": VERSION_PAQUETE,
+        "generado": datetime.now().isoformat(timespec='seconds'),
+        "modelos": modelos,
+        "global": global_model,
+    }
+    return paquete, resumen
+
+
+def guardar_modelo(model, filename):
+    """Escribe el modelo en un archivo temporal y lo reemplaza de forma atómica.
+
+    La interfaz nunca ve un `modelo.pkl` a medio escribir.
+    """
+    temporal = filename + '.tmp'
+    with open(temporal, 'wb') as f:
+        joblib.dump(model, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, filename)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Entrena el modelo de detección de anomalías.",
+        epilog=f"Los modos globales (por defecto, --archivo, --incremental) escriben '{RUTA_MODELO}' y "
+               f"--por-artefacto escribe '{RUTA_MODELOS_ARTEFACTOS}'. La interfaz usa el más reciente "
+               "de los dos, así que el último entrenamiento es el que queda en uso.")
+    parser.add_argument("--archivo", action="store_true",
+                        help="Leer las lecturas del archivo columnar local en vez de SQL Server")
+    parser.add_argument("--sin-sincronizar", action="store_true",
+                        help="Con --archivo, no traer lecturas nuevas de la base de datos")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Traer solo las lecturas nuevas y entrenar sobre un reservorio acotado del historial")
+    parser.add_argument("--por-artefacto", action="store_true",
+                        help=f"Entrenar un modelo por artefacto en paralelo y guardarlos en '{RUTA_MODELOS_ARTEFACTOS}'")
+    parser.add_argument("--procesos", type=int, default=None,
+                        help="Con --por-artefacto, cantidad de procesos del pool (por defecto, uno por núcleo)")
+    parser.add_argument("--comparar-serial", action="store_true",
+                        help="Con --por-artefacto, volver a entrenar en serie para medir la aceleración real")
+    args = parser.parse_args()
+
+    # Mensaje de inicio
+    print("Iniciando el script de entrenamiento del modelo de anomalías...")
+
+    if args.por_artefacto:
+        entrenar_paquete(args)
+        return
+
+    guardar_estado_incremental = None
+    if args.incremental:
+        historical_data, guardar_estado_incremental = cargar_incremental()
+    elif args.archivo:
+        historical_data = cargar_desde_archivo(sincronizar=not args.sin_sincronizar)
+    else:
+        historical_data = cargar_desde_base_de_datos()
+
+    # Verificar si se obtuvieron datos
+    if len(historical_data) == 0:
+        print("No se encontraron datos en la tabla Lecturas.")
+        exit()
     print(f"Datos convertidos para el modelo: {historical_data.shape[0]} lecturas.")
-except Exception as e:
-    print(f"Error al convertir los datos: {e}")
-    exit()
-
-# Entrenar el modelo de Isolation Forest
-try:
-    model = IsolationForest(contamination=0.1)  # Ajusta el porcentaje de anomalías esperado
-    model.fit(historical_data)
-    print("Modelo entrenado exitosamente.")
-except Exception as e:
-    print(f"Error durante el entrenamiento del modelo: {e}")
-    exit()
-
-# Guardar el modelo entrenado en un archivo
-try:
-    # Cambia la ruta si quieres guardar el archivo en una ubicación específica
-    filename = 'modelo.pkl'
-    joblib.dump(model, filename)
-    print(f"Modelo guardado correctamente en '{filename}'.")
-except Exception as e:
-    print(f"Error al guardar el modelo: {e}")
-    exit()
-
-# Cerrar la conexión a la base de datos
-cursor.close()
-conn.close()
-print("Conexión a la base de datos cerrada.")
+
+    # Entrenar el modelo de Isolation Forest
+    try:
+        model = IsolationForest(contamination=0.1, n_jobs=-1)  # Ajusta el porcentaje de anomalías esperado
+        model.fit(historical_data)
+        print("Modelo entrenado exitosamente.")
+    except Exception as e:
+        print(f"Error durante el entrenamiento del modelo: {e}")
+        exit()
+
+    # Guardar el modelo entrenado en un archivo
+    try:
+        # Cambia la ruta si quieres guardar el archivo en una ubicación específica
+        filename = RUTA_MODELO
+        guardar_modelo(model, filename)
+        print(f"Modelo guardado correctamente en '{filename}'.")
+        if guardar_estado_incremental:
+            guardar_estado_incremental()  # Solo se avanza la marca de agua si el modelo quedó escrito
+    except Exception as e:
+        print(f"Error al guardar el modelo: {e}")
+        exit()
+
+
+def entrenar_paquete(args):
+    """Modo --por-artefacto: entrena, informa la aceleración y guarda el paquete."""
+    artefacto_ids, datos = cargar_por_artefacto(desde_archivo=args.archivo,
+                                                sincronizar=not args.sin_sincronizar)
+    if len(datos) == 0:
+        print("No se encontraron datos en la tabla Lecturas.")
+        exit()
+
+    try:
+        paquete, resumen = entrenar_por_artefacto(artefacto_ids, datos, procesos=args.procesos,
+                                                  comparar_serial=args.comparar_serial)
+    except Exception as e:
+        print(f"Error durante el entrenamiento de los modelos: {e}")
+        exit()
+
+    print(f"{resumen['artefactos']} modelos entrenados en {resumen['segundos_paralelo']:.2f} s "
+          f"(suma de ajustes: {resumen['segundos_ajuste']:.2f} s).")
+    if resumen['segundos_serial'] is not None:
+        print(f"Entrenamiento en serie: {resumen['segundos_serial']:.2f} s.")
+    print(f"Aceleración respecto al entrenamiento en serie: {resumen['aceleracion']:.2f}x")
+
+    try:
+        guardar_modelo(paquete, RUTA_MODELOS_ARTEFACTOS)
+        print(f"Modelos guardados correctamente en '{RUTA_MODELOS_ARTEFACTOS}'.")
+    except Exception as e:
+        print(f"Error al guardar los modelos: {e}")
+        exit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""Adquisición de datos del Arduino en un hilo dedicado.
+
+El hilo lector es dueño del puerto serie: lee de una vez todo lo que haya
+llegado, lo interpreta por bloques y deja las muestras con su marca de tiempo en un búfer circular
+acotado. La interfaz gráfica vacía ese búfer a su propio ritmo, de modo que un
+repintado lento o una base de datos ocupada ya no retrasan la lectura del puerto.
+
+Se aceptan dos protocolos:
+
+- `texto` (el firmware actual): líneas `Irms: x A, Potencia: y W`. Las
+  líneas completas de cada bloque se extraen con una sola expresión regular
+  precompilada; la línea incompleta del final espera al siguiente bloque.
+- `binario`: tramas de 22 bytes en little-endian, pensadas para tasas altas de
+  muestreo a 230400 baudios o más. En el firmware:
+
+      struct __attribute__((packed)) Trama {
+          uint8_t  magia[2];     // 0xA5 0x5A
+          uint32_t secuencia;    // +1 por trama, para detectar pérdidas
+          uint32_t millis;       // millis() del Arduino al medir
+          float    corriente;    // A
+          float    potencia;     // W
+          uint32_t crc;          // CRC-32 (zlib) de los 18 bytes anteriores
+      };
+
+  Las tramas se decodifican por bloques con `np.frombuffer`; las que no
+  pasan el CRC se descartan y se cuentan, y tras bytes perdidos se
+  resincroniza buscando la siguiente marca.
+"""
+import re
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+import serial
+
+PROTOCOLOS = ("texto", "binario")
+NUMERO = rb"([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+PATRON_LECTURA = re.compile(rb"Irms:[ \t]*" + NUMERO + rb"[ \t]*A?[ \t]*,[ \t]*Potencia:[ \t]*" + NUMERO)
+LARGO_MAXIMO_LINEA = 256  # Una "línea" más larga sin salto es basura del puerto
+MAGIA_TRAMA = b"\xa5\x5a"
+FORMATO_TRAMA = "<2sIIffI"
+TAMANO_TRAMA = struct.calcsize(FORMATO_TRAMA)
+DTYPE_TRAMA = np.dtype([("magia", "S2"), ("secuencia", "<u4"), ("millis", "<u4"),
+                        ("corriente", "<f4"), ("potencia", "<f4"), ("crc", "<u4")])
+
+
+class LineDecoder:
+    """Extrae las lecturas de texto de un flujo de bytes que llega en pedazos arbitrarios.
+
+    Cuenta las líneas recibidas y las que no tienen el formato esperado, sin
+    imprimir nada por cada una.
+    """
+
+    def __init__(self):
+        self._resto = b""
+        self.lineas = 0
+        self.invalidas = 0
+
+    def feed(self, datos):
+        """Devuelve las lecturas de las líneas completas de `datos` como (corrientes, potencias)."""
+        buffer = self._resto + bytes(datos)
+        fin = buffer.rfind(b"\n") + 1
+        completas, self._resto = buffer[:fin], buffer[fin:]
+        if len(self._resto) > LARGO_MAXIMO_LINEA:
+            self.lineas += 1
+            self.invalidas += 1
+            self._resto = b""
+        if not completas:
+            vacio = np.empty(0)
+            return vacio, vacio
+        valores = PATRON_LECTURA.findall(completas)
+        lineas = completas.count(b"\n")
+        self.lineas += lineas
+        self.invalidas += max(0, lineas - len(valores))
+        if not valores:
+            vacio = np.empty(0)
+            return vacio, vacio
+        lecturas = np.array(valores, dtype=np.float64)  # float() acepta bytes: sin decodificar a str
+        return lecturas[:, 0], lecturas[:, 1]
+
+
+def encode_frame(secuencia, millis, corriente, potencia):
+    """Arma una trama binaria (lo que envía el firmware en modo binario)."""
+    cuerpo = struct.pack("<2sIIff", MAGIA_TRAMA, secuencia & 0xFFFFFFFF, millis & 0xFFFFFFFF, corriente, potencia)
+    return cuerpo + struct.pack("<I", zlib.crc32(cuerpo))
+
+
+class FrameDecoder:
+    """Decodifica tramas binarias de un flujo de bytes que llega en pedazos arbitrarios.
+
+    Los bytes de una trama incompleta quedan para el siguiente `feed`. Cuenta
+    las tramas con CRC inválido (`corruptas`), los bytes descartados al
+    resincronizar y las tramas perdidas según los saltos de la secuencia. El
+    hueco que deja una trama corrupta ya está contado en `corruptas`, así que
+    no se suma también a `perdidas`.
+    """
+
+    def __init__(self):
+        self._resto = b""
+        self._ultima_secuencia = None
+        self.tramas = 0
+        self.corruptas = 0
+        self.bytes_descartados = 0
+        self.perdidas = 0
+        self._corruptas_sin_hueco = 0  # Corruptas después de la última trama válida
+
+    def feed(self, datos):
+        """Devuelve las tramas válidas de `datos` como (secuencias, millis, corrientes, potencias)."""
+        buffer = self._resto + bytes(datos)
+        partes = []
+        pos = 0
+        while len(buffer) - pos >= TAMANO_TRAMA:
+            if buffer.startswith(MAGIA_TRAMA, pos):
+                # Tramas alineadas: se decodifican todas de una vez hasta la primera marca inválida
+                n = (len(buffer) - pos) // TAMANO_TRAMA
+                tramas = np.frombuffer(buffer, DTYPE_TRAMA, count=n, offset=pos)
+                malas = np.flatnonzero(tramas["magia"] != MAGIA_TRAMA)
+                if len(malas):
+                    tramas = tramas[:malas[0]]
+                partes.append(self._validas(buffer, pos, tramas))
+                pos += len(tramas) * TAMANO_TRAMA
+                if len(tramas) == n:
+                    break
+            # Resincronizar: saltar hasta la siguiente marca
+            siguiente = buffer.find(MAGIA_TRAMA, pos + 1)
+            if siguiente < 0:
+                siguiente = len(buffer) - 1 if buffer.endswith(MAGIA_TRAMA[:1]) else len(buffer)
+            self.bytes_descartados += siguiente - pos
+            pos = siguiente
+        self._resto = buffer[pos:]
+
+        if not partes:
+            vacio = np.empty(0)
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint32), vacio, vacio
+        tramas = np.concatenate([p[0] for p in partes])
+        self._count_gaps(tramas["secuencia"], np.concatenate([p[1] for p in partes]))
+        return (tramas["secuencia"].copy(), tramas["millis"].copy(),
+                tramas["corriente"].astype(np.float64), tramas["potencia"].astype(np.float64))
+
+    def _validas(self, buffer, pos, tramas):
+        """Filtra por CRC las tramas que empiezan en `pos`.
+
+        Devuelve (tramas válidas, corruptas justo antes de cada una).
+        """
+        cuerpo = TAMANO_TRAMA - 4
+        crc = np.fromiter((zlib.crc32(buffer[inicio:inicio + cuerpo])
+                           for inicio in range(pos, pos + len(tramas) * TAMANO_TRAMA, TAMANO_TRAMA)),
+                          dtype=np.uint32, count=len(tramas))
+        ok = crc == tramas["crc"]
+        self.tramas += int(ok.sum())
+        self.corruptas += int(len(ok) - ok.sum())
+        acumuladas = np.cumsum(~ok)
+        en_validas = acumuladas[ok]
+        previas = np.diff(np.r_[0, en_validas])
+        if len(previas):
+            previas[0] += self._corruptas_sin_hueco
+            self._corruptas_sin_hueco = int(acumuladas[-1] - en_validas[-1])
+        elif len(acumuladas):
+            self._corruptas_sin_hueco += int(acumuladas[-1])
+        return tramas[ok], previas
+
+    def _count_gaps(self, secuencias, corruptas_previas):
+        if len(secuencias) == 0:
+            return
+        previas = np.r_[secuencias[:1] - 1 if self._ultima_secuencia is None else self._ultima_secuencia,
+                        secuencias[:-1]].astype(np.uint32)
+        saltos = (secuencias - previas).astype(np.uint32).astype(np.int64)  # Aritmética módulo 2**32
+        # Un salto "hacia atrás" es un reinicio del Arduino, no una pérdida; las
+        # tramas corruptas entre dos válidas explican parte del hueco
+        huecos = np.maximum(saltos - 1 - corruptas_previas, 0)
+        self.perdidas += int(np.where(saltos < 0x80000000, huecos, 0).sum())
+        self._ultima_secuencia = int(secuencias[-1])
+
+
+class SampleRingBuffer:
+    """Búfer circular de muestras (tiempo, corriente, potencia) de capacidad fija.
+
+    Está pensado para un único productor (el hilo lector) y un único consumidor
+    (la interfaz). Cada lado solo modifica su propio contador, por lo que no se
+    necesitan bloqueos. Si el consumidor se atrasa y el búfer se llena, las
+    muestras nuevas se descartan y se cuentan en `descartadas`.
+    """
+
+    def __init__(self, capacidad=4096):
+        self.capacidad = int(capacidad)
+        self._datos = np.zeros((self.capacidad, 3), dtype=np.float64)
+        self._escritas = 0  # Solo lo modifica el productor
+        self._leidas = 0    # Solo lo modifica el consumidor
+        self.descartadas = 0
+
+    def __len__(self):
+        return self._escritas - self._leidas
+
+    def push(self, tiempo, corriente, potencia):
+        """Agrega una muestra. Devuelve False si el búfer estaba lleno."""
+        if self._escritas - self._leidas >= self.capacidad:
+            self.descartadas += 1
+            return False
+        self._datos[self._escritas % self.capacidad] = (tiempo, corriente, potencia)
+        self._escritas += 1
+        return True
+
+    def push_many(self, tiempos, corrientes, potencias):
+        """Agrega un bloque de muestras; las que no caben se descartan y se cuentan."""
+        n = len(tiempos)
+        libres = self.capacidad - (self._escritas - self._leidas)
+        if n > libres:
+            self.descartadas += n - libres
+            n = libres
+        if n <= 0:
+            return 0
+        indices = np.arange(self._escritas, self._escritas + n) % self.capacidad
+        self._datos[indices, 0] = tiempos[:n]
+        self._datos[indices, 1] = corrientes[:n]
+        self._datos[indices, 2] = potencias[:n]
+        self._escritas += n
+        return n
+
+    def drain(self, maximo=None):
+        """Extrae las muestras pendientes como arreglos (tiempos, corrientes, potencias)."""
+        inicio = self._leidas
+        fin = self._escritas
+        if maximo is not None:
+            fin = min(fin, inicio + maximo)
+        indices = np.arange(inicio, fin) % self.capacidad
+        bloque = self._datos[indices]  # Copia: el productor puede reutilizar las ranuras
+        self._leidas = fin
+        return bloque[:, 0], bloque[:, 1], bloque[:, 2]
+
+
+class SerialReader(threading.Thread):
+    """Hilo que lee el puerto serie del Arduino y llena un SampleRingBuffer."""
+
+    def __init__(self, arduino, capacidad=4096, protocolo="texto"):
+        super().__init__(daemon=True)
+        if protocolo not in PROTOCOLOS:
+            raise ValueError(f"Protocolo desconocido: {protocolo}")
+        self.arduino = arduino  # El hilo es dueño del manejador serial.Serial
+        self.protocolo = protocolo
+        self.buffer = SampleRingBuffer(capacidad)
+        self.decoder = FrameDecoder() if protocolo == "binario" else LineDecoder()
+        self.errores = 0
+        self._ultima_llegada = None  # Llegada del bloque anterior, mientras el puerto no se quede callado
+        self._detener = threading.Event()
+
+    @classmethod
+    def abrir(cls, puerto, baudrate=9600, capacidad=4096, protocolo="texto"):
+        """Abre el puerto indicado y devuelve un lector listo para iniciar.
+
+        Lanza serial.SerialException si el puerto no está disponible.
+        """
+        return cls(serial.Serial(puerto, baudrate, timeout=1), capacidad, protocolo)
+
+    def run(self):
+        """Bucle de lectura: cada lectura válida se guarda con su marca de tiempo."""
+        leer = self._read_frames if self.protocolo == "binario" else self._read_lines
+        while not self._detener.is_set():
+            try:
+                leer()  # Bloquea como máximo el timeout del puerto
+            except (serial.SerialException, OSError) as e:
+                if not self._detener.is_set():
+                    self.errores += 1
+                    print(f"Error al leer del Arduino: {e}")
+                    time.sleep(0.5)
+
+    def _read_chunk(self):
+        # Todo lo disponible de una vez; si no hay nada, espera el primer byte
+        return self.arduino.read(max(1, self.arduino.in_waiting))
+
+    def _read_lines(self):
+        datos = self._read_chunk()
+        if not datos:
+            self._ultima_llegada = None  # Venció el timeout: el próximo bloque no sigue a este
+            return
+        tiempo = time.time()
+        anterior, self._ultima_llegada = self._ultima_llegada, tiempo
+        corrientes, potencias = self.decoder.feed(datos)
+        if len(corrientes) == 0:
+            return
+        # Sin reloj del Arduino: las líneas del bloque se reparten entre la llegada anterior y esta
+        desde = tiempo if anterior is None else anterior
+        self.buffer.push_many(np.linspace(desde, tiempo, len(corrientes) + 1)[1:], corrientes, potencias)
+
+    def _read_frames(self):
+        datos = self._read_chunk()
+        if not datos:
+            return
+        tiempo = time.time()
+        _, millis, corrientes, potencias = self.decoder.feed(datos)
+        if len(millis) == 0:
+            return
+        # Cada muestra se ubica antes de la llegada según el reloj del Arduino (millis da la vuelta a los 49 días)
+        atraso = (millis[-1] - millis).astype(np.uint32) / 1000.0
+        self.buffer.push_many(tiempo - atraso, corrientes, potencias)
+
+    def stop(self):
+        """Detiene el hilo y cierra el puerto."""
+        self._detener.set()
+        if self.is_alive():
+            self.join(timeout=2)
+        try:
+            self.arduino.close()
+        except Exception as e:
+            print(f"Error al cerrar la conexión con el Arduino: {e}")
+
+    def estadisticas(self):
+        """Contadores de lectura para saber si el consumidor se está quedando atrás."""
+        stats = {"pendientes": len(self.buffer), "descartadas": self.buffer.descartadas, "errores": self.errores}
+        if self.protocolo == "binario":
+            stats.update(lineas=self.decoder.tramas + self.decoder.corruptas, invalidas=self.decoder.corruptas,
+                         perdidas=self.decoder.perdidas, bytes_descartados=self.decoder.bytes_descartados)
+        else:
+            stats.update(lineas=self.decoder.lineas, invalidas=self.decoder.invalidas)
+        return stats
@@ -0,0 +1,422 @@
+"""Agregados por minuto, hora y día de la tabla Lecturas.
+
+Por cada artefacto y periodo se guarda la cantidad de lecturas, la potencia
+mínima, máxima, media y su suma, y la energía integrada (Wh) en las tablas
+`Agregados_Minuto`, `Agregados_Hora` y `Agregados_Dia` (ver
+migraciones/002_agregados.sql).
+
+`update()` procesa solo las lecturas posteriores a la marca de agua de cada
+artefacto (`Agregados_Estado`) y, además, las insertadas desde la última vez
+con una fecha_hora anterior a la marca (las que la bitácora local recarga tras
+una caída de la base): para eso la marca guarda también el último id de
+`Lecturas` visto. `backfill()` recalcula un rango del historial.
+Las dos borran y vuelven a calcular los periodos afectados, así que repetirlas
+no duplica nada. Los minutos se calculan con NumPy a partir de las lecturas, las
+horas a partir de los minutos y los días a partir de las horas.
+
+La energía de cada intervalo entre dos lecturas consecutivas se integra con
+energia.interval_energy y se asigna al periodo de la lectura de la derecha.
+
+Uso desde la línea de comandos:
+
+    python agregados.py                                   # Actualización incremental
+    python agregados.py --backfill [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD]
+"""
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from archivo import datetimes_to_seconds, from_seconds
+from energia import MAX_HUECO_SEGUNDOS, interval_energy
+from historial import inserted_since, last_reading_id
+
+TAMANO_BLOQUE = 50000
+
+
+class RollupLevel:
+    """Un nivel de agregación: nombre, tabla y duración del periodo en segundos."""
+
+    def __init__(self, nombre, tabla, segundos):
+        self.nombre = nombre
+        self.tabla = tabla
+        self.segundos = segundos
+
+    def floor(self, fecha_hora):
+        """Inicio del periodo que contiene a `fecha_hora`."""
+        if self.segundos == 86400:
+            return datetime(fecha_hora.year, fecha_hora.month, fecha_hora.day)
+        if self.segundos == 3600:
+            return fecha_hora.replace(minute=0, second=0, microsecond=0)
+        return fecha_hora.replace(second=0, microsecond=0)
+
+    def ceil(self, fecha_hora):
+        """Inicio del primer periodo que empieza en o después de `fecha_hora`."""
+        inicio = self.floor(fecha_hora)
+        return inicio if inicio == fecha_hora else inicio + timedelta(seconds=self.segundos)
+
+    def __repr__(self):
+        return f"RollupLevel({self.nombre!r})"
+
+
+MINUTO = RollupLevel("minuto", "Agregados_Minuto", 60)
+HORA = RollupLevel("hora", "Agregados_Hora", 3600)
+DIA = RollupLevel("dia", "Agregados_Dia", 86400)
+NIVELES = (MINUTO, HORA, DIA)
+
+# Resoluciones que se ofrecen en la interfaz (0: lecturas sin agregar)
+RESOLUCIONES = (("Lecturas", 0), ("1 minuto", 60), ("15 minutos", 900), ("1 hora", 3600), ("1 día", 86400))
+
+COLUMNAS = "periodo, lecturas, potencia_min, potencia_max, potencia_media, potencia_suma, energia_wh"
+
+
+def choose_level(resolucion_segundos):
+    """Nivel más grueso cuyo periodo no supera la resolución pedida (None: lecturas crudas)."""
+    elegido = None
+    for nivel in NIVELES:
+        if nivel.segundos <= resolucion_segundos:
+            elegido = nivel
+    return elegido
+
+
+def level_for_range(desde, hasta, max_puntos=2000):
+    """Nivel adecuado para mostrar [desde, hasta) con a lo sumo unos `max_puntos` por artefacto."""
+    return choose_level((hasta - desde).total_seconds() / max_puntos)
+
+
+# Cálculo
+
+def _group_starts(periodos):
+    """Posición donde empieza cada grupo de periodos iguales (ya ordenados)."""
+    return np.r_[0, np.flatnonzero(np.diff(periodos)) + 1]
+
+
+def rollup_readings(tiempos, potencias, segundos=60, previo=None, max_hueco=MAX_HUECO_SEGUNDOS):
+    """Agrega lecturas ordenadas en periodos de `segundos`.
+
+    `previo` es la lectura (tiempo, potencia) inmediatamente anterior a la
+    primera, para integrar la energía del primer intervalo. Devuelve un
+    arreglo (k, 7): periodo (s), lecturas, mín, máx, media, suma, energía (Wh).
+    """
+    tiempos = np.asarray(tiempos, dtype=np.float64)
+    potencias = np.asarray(potencias, dtype=np.float64)
+    if len(tiempos) == 0:
+        return np.empty((0, 7))
+
+    energia = interval_energy(tiempos, potencias, previo, max_hueco)  # Asignada a la lectura de la derecha
+
+    periodos = np.floor(tiempos / segundos) * segundos
+    inicios = _group_starts(periodos)
+    lecturas = np.diff(np.r_[inicios, len(tiempos)])
+    suma = np.add.reduceat(potencias, inicios)
+    return np.column_stack((
+        periodos[inicios],
+        lecturas,
+        np.minimum.reduceat(potencias, inicios),
+        np.maximum.reduceat(potencias, inicios),
+        suma / lecturas,
+        suma,
+        np.add.reduceat(energia, inicios),
+    ))
+
+
+def rollup_rollups(filas, segundos):
+    """Agrega filas de un nivel más fino (mismo formato que rollup_readings) en periodos de `segundos`."""
+    filas = np.asarray(filas, dtype=np.float64).reshape(-1, 7)
+    if len(filas) == 0:
+        return filas
+    periodos = np.floor(filas[:, 0] / segundos) * segundos
+    inicios = _group_starts(periodos)
+    lecturas = np.add.reduceat(filas[:, 1], inicios)
+    suma = np.add.reduceat(filas[:, 5], inicios)
+    return np.column_stack((
+        periodos[inicios],
+        lecturas,
+        np.minimum.reduceat(filas[:, 2], inicios),
+        np.maximum.reduceat(filas[:, 3], inicios),
+        suma / lecturas,
+        suma,
+        np.add.reduceat(filas[:, 6], inicios),
+    ))
+
+
+# Base de datos
+
+def _insert(cursor, nivel, artefacto_id, filas):
+    if len(filas) == 0:
+        return
+    cursor.executemany(
+        f"INSERT INTO {nivel.tabla} (artefacto_id, {COLUMNAS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(artefacto_id, from_seconds(f[0]), int(f[1]), *map(float, f[2:])) for f in filas.tolist()],
+    )
+
+
+def _delete(cursor, nivel, artefacto_id, desde, hasta):
+    cursor.execute(f"DELETE FROM {nivel.tabla} WHERE artefacto_id = ? AND periodo >= ? AND periodo < ?",
+                   (artefacto_id, desde, hasta))
+
+
+def _previous_reading(cursor, artefacto_id, desde):
+    cursor.execute("""
+        SELECT fecha_hora, potencia
+        FROM Lecturas
+        WHERE artefacto_id = ? AND fecha_hora = (
+            SELECT MAX(fecha_hora) FROM Lecturas WHERE artefacto_id = ? AND fecha_hora < ?
+        )
+    """, (artefacto_id, artefacto_id, desde))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    cursor.fetchall()  # Descartar otras lecturas con la misma marca de tiempo
+    return float(datetimes_to_seconds([row[0]])[0]), float(row[1])
+
+
+def fetch_level(cursor, nivel, artefacto_id, desde, hasta):
+    cursor.execute(f"""
+        SELECT {COLUMNAS}
+        FROM {nivel.tabla}
+        WHERE artefacto_id = ? AND periodo >= ? AND periodo < ?
+        ORDER BY periodo
+    """, (artefacto_id, desde, hasta))
+    rows = cursor.fetchall()
+    if not rows:
+        return np.empty((0, 7))
+    periodos, *resto = zip(*rows)
+    return np.column_stack((datetimes_to_seconds(periodos), *(np.array(c, dtype=np.float64) for c in resto)))
+
+
+def recompute(conn, artefacto_id, desde, hasta, chunk_size=TAMANO_BLOQUE):
+    """Borra y recalcula los agregados del artefacto que cubren [desde, hasta).
+
+    Los límites se amplían a minutos completos, y las horas y días que tocan el
+    rango se recalculan enteros a partir del nivel más fino. Las lecturas del
+    rango se leen completas antes de escribir (SQL Server no admite otra
+    sentencia mientras un cursor tiene resultados pendientes), así que conviene
+    llamarla con rangos acotados, como hacen update() y backfill().
+
+    Devuelve (lecturas procesadas, fecha_hora de la última lectura o None). No
+    confirma la transacción: eso queda a cargo de quien llama.
+    """
+    desde, hasta = MINUTO.floor(desde), MINUTO.ceil(hasta)
+    cursor = conn.cursor()
+    previo = _previous_reading(cursor, artefacto_id, desde)
+
+    cursor.execute("""
+        SELECT fecha_hora, potencia
+        FROM Lecturas
+        WHERE artefacto_id = ? AND fecha_hora >= ? AND fecha_hora < ?
+        ORDER BY fecha_hora
+    """, (artefacto_id, desde, hasta))
+    fechas, potencias = [], []
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        f, p = zip(*rows)
+        fechas.extend(f)
+        potencias.extend(p)
+
+    # Minutos a partir de las lecturas; horas a partir de los minutos y días a partir de las horas
+    _delete(cursor, MINUTO, artefacto_id, desde, hasta)
+    _insert(cursor, MINUTO, artefacto_id,
+            rollup_readings(datetimes_to_seconds(fechas) if fechas else [], potencias, 60, previo))
+    for fino, grueso in ((MINUTO, HORA), (HORA, DIA)):
+        inicio, fin = grueso.floor(desde), grueso.ceil(hasta)
+        filas = rollup_rollups(fetch_level(cursor, fino, artefacto_id, inicio, fin), grueso.segundos)
+        _delete(cursor, grueso, artefacto_id, inicio, fin)
+        _insert(cursor, grueso, artefacto_id, filas)
+    cursor.close()
+    return len(fechas), (fechas[-1] if fechas else None)
+
+
+def _first_reading(conn, artefacto_id, desde):
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(fecha_hora) FROM Lecturas WHERE artefacto_id = ? AND fecha_hora >= ?",
+                   (artefacto_id, desde))
+    row = cursor.fetchone()
+    cursor.close()
+    if row is None or row[0] is None:
+        return None
+    # SQLite devuelve MIN() como texto porque el resultado no tiene tipo declarado
+    return datetime.fromisoformat(row[0]) if isinstance(row[0], str) else row[0]
+
+
+def recompute_range(conn, artefacto_id, desde, hasta, avanzar_marca=False, ultimo_id=None):
+    """Recalcula [desde, hasta) en tramos de un día, confirmando cada uno.
+
+    Con `avanzar_marca`, la marca de agua (y `ultimo_id`, si se indica) se
+    guarda en la misma transacción que cada tramo, así una ejecución
+    interrumpida se retoma donde quedó. Devuelve la cantidad de lecturas
+    procesadas.
+    """
+    total = 0
+    inicio = desde
+    while inicio < hasta:
+        siguiente = _first_reading(conn, artefacto_id, inicio)
+        if siguiente is None or siguiente >= hasta:
+            break
+        if DIA.floor(siguiente) > inicio:
+            inicio = DIA.floor(siguiente)  # Saltar los días sin lecturas
+        fin = min(DIA.floor(inicio) + timedelta(days=1), hasta)
+        try:
+            procesadas, ultima = recompute(conn, artefacto_id, inicio, fin)
+            if avanzar_marca and ultima is not None:
+                _set_watermark(conn, artefacto_id, ultima, ultimo_id)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        total += procesadas
+        inicio = fin
+    return total
+
+
+def watermark(conn, artefacto_id):
+    """Fecha_hora de la última lectura agregada del artefacto, o None."""
+    return _watermarks(conn).get(artefacto_id, (None, None))[0]
+
+
+def _watermarks(conn):
+    """{artefacto_id: (marca, último id de Lecturas visto o None)}."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT artefacto_id, marca, ultimo_id FROM Agregados_Estado")
+    marcas = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+    cursor.close()
+    return marcas
+
+
+def id_watermark(conn, artefacto_ids=None):
+    """Último id de Lecturas que ya reflejan los agregados de todos los artefactos, o None."""
+    vistos = [ultimo_id for artefacto_id, (_, ultimo_id) in _watermarks(conn).items()
+              if artefacto_ids is None or artefacto_id in artefacto_ids]
+    return None if not vistos or None in vistos else min(vistos)
+
+
+def _set_watermark(conn, artefacto_id, marca, ultimo_id=None):
+    """Guarda la marca; sin `ultimo_id` se conserva el que tenía."""
+    cursor = conn.cursor()
+    cursor.execute("UPDATE Agregados_Estado SET marca = ?, ultimo_id = COALESCE(?, ultimo_id) WHERE artefacto_id = ?",
+                   (marca, ultimo_id, artefacto_id))
+    if cursor.rowcount == 0:
+        cursor.execute("INSERT INTO Agregados_Estado (artefacto_id, marca, ultimo_id) VALUES (?, ?, ?)",
+                       (artefacto_id, marca, ultimo_id))
+    cursor.close()
+
+
+def _artefactos(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM artefactos ORDER BY id")
+    ids = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return ids
+
+
+def update(conn, margen=timedelta(minutes=5)):
+    """Actualiza los agregados con las lecturas nuevas de cada artefacto.
+
+    Se recalcula desde el minuto de la marca de agua hasta `margen` antes de
+    ahora, para dar tiempo a que terminen de escribirse los lotes recientes.
+    Si desde la última vez se insertaron lecturas con fecha_hora anterior a la
+    marca, se empieza en la más antigua de ellas. Devuelve la cantidad de
+    lecturas procesadas.
+    """
+    hasta = datetime.now() - margen
+    ultimo_id = last_reading_id(conn)
+    marcas = _watermarks(conn)
+    vistos = [visto for _, visto in marcas.values() if visto is not None]
+    tardias = inserted_since(conn, min(vistos), ultimo_id) if vistos else {}
+    total = 0
+    for artefacto_id in _artefactos(conn):
+        marca, _ = marcas.get(artefacto_id, (None, None))
+        desde = _first_reading(conn, artefacto_id, marca or datetime(1900, 1, 1))
+        tardia = tardias.get(artefacto_id)
+        if marca is not None and tardia is not None and tardia <= marca:
+            desde = tardia  # Lecturas cargadas tarde: rehacer desde la más antigua
+        if desde is None or desde >= hasta:
+            if marca is not None:
+                _set_watermark(conn, artefacto_id, marca, ultimo_id)
+                conn.commit()
+            continue
+        total += recompute_range(conn, artefacto_id, desde, hasta, avanzar_marca=True, ultimo_id=ultimo_id)
+    return total
+
+
+def backfill(conn, desde=None, hasta=None, artefacto_ids=None, margen=timedelta(minutes=5)):
+    """Recalcula los agregados de [desde, hasta) para el historial existente. Es idempotente.
+
+    Sin `desde` se empieza en la primera lectura de cada artefacto y sin
+    `hasta`, `margen` antes de ahora. Si el rango llega más allá de la marca de
+    agua, esta avanza para que update() no lo repita.
+    """
+    hasta = hasta or datetime.now() - margen
+    # Solo un recálculo desde el principio cubre todas las lecturas insertadas hasta ahora
+    ultimo_id = last_reading_id(conn) if desde is None else None
+    total = 0
+    for artefacto_id in artefacto_ids or _artefactos(conn):
+        inicio = _first_reading(conn, artefacto_id, desde or datetime(1900, 1, 1))
+        if inicio is None or inicio >= hasta:
+            continue
+        marca = watermark(conn, artefacto_id)
+        total += recompute_range(conn, artefacto_id, inicio, hasta,
+                                 avanzar_marca=marca is None or marca < hasta, ultimo_id=ultimo_id)
+    return total
+
+
+# Consultas
+
+def query_rollup(conn, nivel, artefacto_ids, desde, hasta, segundos=None):
+    """Agregados de los artefactos en [desde, hasta), ordenados por (artefacto, periodo).
+
+    Con `segundos` mayor que el periodo del nivel, las filas se vuelven a
+    agrupar en periodos de esa duración (por ejemplo, 15 minutos a partir de
+    los agregados por minuto). Devuelve columnas de NumPy: (artefacto_ids,
+    periodos datetime64[s], lecturas, potencia_min, potencia_max,
+    potencia_media, energia_wh).
+    """
+    cursor = conn.cursor()
+    ids, partes = [], []
+    for artefacto_id in sorted(set(artefacto_ids)):
+        filas = fetch_level(cursor, nivel, artefacto_id, nivel.floor(desde), hasta)
+        if segundos and segundos > nivel.segundos:
+            filas = rollup_rollups(filas, segundos)
+        ids.append(np.full(len(filas), artefacto_id, dtype=np.int64))
+        partes.append(filas)
+    cursor.close()
+    filas = np.concatenate(partes) if partes else np.empty((0, 7))
+    return (np.concatenate(ids) if ids else np.empty(0, dtype=np.int64),
+            np.round(filas[:, 0]).astype(np.int64).astype("datetime64[s]"),
+            filas[:, 1].astype(np.int64), filas[:, 2], filas[:, 3], filas[:, 4], filas[:, 6])
+
+
+def query_resolution(conn, artefacto_ids, desde, hasta, resolucion_segundos):
+    """Consulta el nivel más grueso que alcanza para la resolución pedida.
+
+    Devuelve (nivel, columnas de query_rollup), o (None, None) si la
+    resolución es más fina que un minuto y hay que leer las lecturas crudas.
+    """
+    nivel = choose_level(resolucion_segundos)
+    if nivel is None:
+        return None, None
+    return nivel, query_rollup(conn, nivel, artefacto_ids, desde, hasta, resolucion_segundos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantiene los agregados por minuto, hora y día de Lecturas.")
+    parser.add_argument("--backfill", action="store_true", help="Recalcular el historial existente")
+    parser.add_argument("--desde", type=datetime.fromisoformat, help="Inicio del backfill (AAAA-MM-DD)")
+    parser.add_argument("--hasta", type=datetime.fromisoformat, help="Fin del backfill, excluido (AAAA-MM-DD)")
+    args = parser.parse_args()
+
+    from basedatos import get_connection
+
+    conn = get_connection()
+    try:
+        if args.backfill:
+            print(f"Backfill completado: {backfill(conn, args.desde, args.hasta)} lecturas procesadas.")
+        print(f"Agregados actualizados: {update(conn)} lecturas nuevas.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""Backends de almacenamiento: SQL Server o SQLite embebido.
+
+Toda la persistencia (usuarios, artefactos y Lecturas) pasa por un
+`StorageBackend`. La aplicación usa el que indique la variable de entorno
+`MONITOREO_BD`:
+
+- `sqlserver` (por defecto): la base DataBaseProject de SQL Server, con la
+  cadena de conexión de basedatos.py.
+- `sqlite`: un archivo local (`MONITOREO_SQLITE`, por defecto `monitoreo.db`)
+  en modo WAL, pensado para instalaciones de un solo equipo y para probar o
+  medir el sistema sin un servidor. El esquema se crea al conectarse.
+
+Para crear el esquema y un usuario en SQLite:
+
+    MONITOREO_BD=sqlite python almacenamiento.py --usuario ana --nombres Ana --apellidos Pérez
+    MONITOREO_BD=sqlite python almacenamiento.py --artefacto Refrigeradora
+"""
+import argparse
+import getpass
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from basedatos import connect_sqlserver
+from escritura import INSERT_LECTURAS
+from historial import SQL_PAGINA
+
+VARIABLE_BACKEND = "MONITOREO_BD"
+VARIABLE_RUTA_SQLITE = "MONITOREO_SQLITE"
+RUTA_SQLITE = "monitoreo.db"
+
+# Ajustes de SQLite: WAL deja leer mientras el escritor por lotes inserta, y con
+# synchronous=NORMAL cada commit ya no espera un fsync (solo los checkpoints)
+PRAGMAS_SQLITE = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",      # 64 MB de caché de páginas por conexión
+    "PRAGMA mmap_size=268435456",    # Lecturas de hasta 256 MB por mmap
+    "PRAGMA busy_timeout=5000",      # Esperar al otro escritor en vez de fallar
+)
+
+# Mismo esquema que DataBaseProject más las migraciones (índice y agregados)
+ESQUEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL,
+    role TEXT NOT NULL,
+    totp_secret TEXT,
+    nombres TEXT,
+    apellidos TEXT
+);
+CREATE TABLE IF NOT EXISTS artefactos (
+    id INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS Lecturas (
+    id INTEGER PRIMARY KEY,
+    fecha_hora TIMESTAMP NOT NULL,
+    corriente REAL,
+    potencia REAL,
+    artefacto_id INTEGER,
+    ingesta_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS IX_Lecturas_fecha ON Lecturas (fecha_hora);
+CREATE TABLE IF NOT EXISTS Agregados_Minuto ({agregado});
+CREATE TABLE IF NOT EXISTS Agregados_Hora ({agregado});
+CREATE TABLE IF NOT EXISTS Agregados_Dia ({agregado});
+CREATE TABLE IF NOT EXISTS Agregados_Estado (
+    artefacto_id INTEGER PRIMARY KEY,
+    marca TIMESTAMP NOT NULL,
+    ultimo_id INTEGER
+);
+""".format(agregado="""
+    artefacto_id INTEGER NOT NULL,
+    periodo TIMESTAMP NOT NULL,
+    lecturas INTEGER NOT NULL,
+    potencia_min REAL, potencia_max REAL, potencia_media REAL, potencia_suma REAL,
+    energia_wh REAL NOT NULL,
+    PRIMARY KEY (artefacto_id, periodo)
+""")
+
+# El id va en la clave para que las páginas del historial, ordenadas por (fecha_hora, id), salgan del índice
+INDICE_HISTORIAL_SQLITE = """
+CREATE INDEX IF NOT EXISTS IX_Lecturas_artefacto_fecha ON Lecturas (artefacto_id, fecha_hora, id, corriente, potencia)
+"""
+# Clave de idempotencia de la bitácora (bitacora.py); va aparte porque las
+# bases creadas antes no tienen la columna
+INDICE_INGESTA_SQLITE = """
+CREATE UNIQUE INDEX IF NOT EXISTS UX_Lecturas_ingesta ON Lecturas (ingesta_id) WHERE ingesta_id IS NOT NULL
+"""
+
+# Las fechas se guardan como texto ISO ('AAAA-MM-DD HH:MM:SS.ffffff'), que
+# ordena igual que el tiempo; se registran explícitamente porque los
+# adaptadores por defecto de sqlite3 están obsoletos desde Python 3.12
+sqlite3.register_adapter(datetime, lambda valor: valor.isoformat(" "))
+sqlite3.register_converter("TIMESTAMP", lambda valor: datetime.fromisoformat(valor.decode()))
+
+
+class StorageBackend:
+    """Operaciones de almacenamiento comunes a todos los motores.
+
+    Las consultas que son SQL estándar están aquí; cada motor define cómo
+    conectarse, su consulta de páginas del historial y su esquema. Las
+    operaciones reciben una conexión (por lo general del pool de basedatos.py)
+    y no hacen commit salvo que se indique.
+    """
+
+    nombre = None
+    health_query = "SELECT 1"
+    sql_pagina = None  # Página del historial (ver historial.HistoryQuery)
+    sql_insertar_ingesta = None  # INSERT de la bitácora que omite los ingesta_id repetidos
+    sql_version_artefactos = None  # Versión barata de la tabla artefactos (ver catalogo.py)
+
+    def connect(self):
+        """Abre una conexión DB-API nueva."""
+        raise NotImplementedError
+
+    def ensure_schema(self, conn):
+        """Crea las tablas e índices que falten."""
+
+    def _bulk_cursor(self, conn):
+        return conn.cursor()
+
+    # Usuarios
+
+    def get_user(self, conn, username):
+        """Devuelve (role, password_hash, totp_secret, nombres, apellidos) o None."""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT role, password_hash, totp_secret, nombres, apellidos
+                FROM users WHERE username = ?
+            """, (username,))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        return tuple(row) if row else None
+
+    def add_user(self, conn, username, password, role, totp_secret=None, nombres=None, apellidos=None):
+        """Registra un usuario con la contraseña en SHA-256, como la valida el inicio de sesión."""
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO users (username, password_hash, role, totp_secret, nombres, apellidos)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (username, hashlib.sha256(password.encode()).hexdigest(), role, totp_secret, nombres, apellidos))
+        conn.commit()
+        cursor.close()
+
+    # Artefactos
+
+    def list_artefactos(self, conn):
+        """Devuelve [(id, nombre)] ordenados por id."""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT id, nombre FROM artefactos ORDER BY id")
+            return [tuple(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def add_artefacto(self, conn, nombre):
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO artefactos (nombre) VALUES (?)", (nombre,))
+        conn.commit()
+        cursor.close()
+
+    # Lecturas
+
+    def insert_readings(self, conn, filas):
+        """Inserta un lote de (fecha_hora, corriente, potencia, artefacto_id); el commit es del llamador."""
+        cursor = self._bulk_cursor(conn)
+        try:
+            cursor.executemany(INSERT_LECTURAS, filas)
+        finally:
+            cursor.close()
+
+    def insert_spooled(self, conn, filas):
+        """Inserta (fecha_hora, corriente, potencia, artefacto_id, ingesta_id) omitiendo los ingesta_id
+        ya guardados; el commit es del llamador."""
+        cursor = self._bulk_cursor(conn)
+        try:
+            cursor.executemany(self.sql_insertar_ingesta, filas)
+        finally:
+            cursor.close()
+
+    def read_range(self, conn, artefacto_id, desde, hasta, chunk_size=50000):
+        """Lecturas de [desde, hasta) como (fechas datetime64[ms], corrientes, potencias)."""
+        cursor = conn.cursor()
+        fechas, corrientes, potencias = [], [], []
+        try:
+            cursor.execute("""
+                SELECT fecha_hora, corriente, potencia
+                FROM Lecturas
+                WHERE artefacto_id = ? AND fecha_hora >= ? AND fecha_hora < ?
+                ORDER BY fecha_hora
+            """, (artefacto_id, desde, hasta))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                f, c, p = zip(*rows)
+                fechas.append(np.array(f, dtype="datetime64[ms]"))
+                corrientes.append(np.array(c, dtype=np.float64))
+                potencias.append(np.array(p, dtype=np.float64))
+        finally:
+            cursor.close()
+        if not fechas:
+            return np.empty(0, dtype="datetime64[ms]"), np.empty(0), np.empty(0)
+        return np.concatenate(fechas), np.concatenate(corrientes), np.concatenate(potencias)
+
+    def aggregate(self, conn, artefacto_id, desde, hasta):
+        """Resumen de [desde, hasta): lecturas, potencia mínima, máxima y media, corriente media."""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT COUNT(*), MIN(potencia), MAX(potencia), AVG(potencia), AVG(corriente)
+                FROM Lecturas
+                WHERE artefacto_id = ? AND fecha_hora >= ? AND fecha_hora < ?
+            """, (artefacto_id, desde, hasta))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        claves = ("lecturas", "potencia_min", "potencia_max", "potencia_media", "corriente_media")
+        return dict(zip(claves, row))
+
+
+class SqlServerBackend(StorageBackend):
+    """DataBaseProject en SQL Server; el esquema viene del respaldo y de migraciones/."""
+
+    nombre = "sqlserver"
+    sql_pagina = SQL_PAGINA
+    # Los CAST dan el tipo de cada parámetro a fast_executemany; el índice de migraciones/003 hace
+    # que el NOT EXISTS sea una búsqueda
+    sql_insertar_ingesta = """
+        INSERT INTO Lecturas (fecha_hora, corriente, potencia, artefacto_id, ingesta_id)
+        SELECT v.fecha_hora, v.corriente, v.potencia, v.artefacto_id, v.ingesta_id
+        FROM (SELECT CAST(? AS DATETIME2) AS fecha_hora, CAST(? AS FLOAT) AS corriente,
+                     CAST(? AS FLOAT) AS potencia, CAST(? AS INT) AS artefacto_id,
+                     CAST(? AS BIGINT) AS ingesta_id) AS v
+        WHERE NOT EXISTS (SELECT 1 FROM Lecturas l WHERE l.ingesta_id = v.ingesta_id)
+    """
+
+    # Una fila con la cantidad y una suma de verificación: cambia al agregar, borrar o renombrar
+    sql_version_artefactos = "SELECT COUNT_BIG(*), CHECKSUM_AGG(BINARY_CHECKSUM(id, nombre)) FROM artefactos"
+
+    def connect(self):
+        return connect_sqlserver()
+
+    def _bulk_cursor(self, conn):
+        cursor = conn.cursor()
+        cursor.fast_executemany = True  # Envía el lote en un solo viaje
+        return cursor
+
+
+class SqliteBackend(StorageBackend):
+    """Base SQLite local en modo WAL."""
+
+    nombre = "sqlite"
+    sql_pagina = """
+        SELECT fecha_hora, corriente, potencia, id
+        FROM Lecturas
+        WHERE artefacto_id = ? AND fecha_hora >= ? AND (fecha_hora > ? OR id > ?) AND fecha_hora < ?
+        ORDER BY fecha_hora, id
+        LIMIT ?
+    """
+    sql_insertar_ingesta = """
+        INSERT OR IGNORE INTO Lecturas (fecha_hora, corriente, potencia, artefacto_id, ingesta_id)
+        VALUES (?, ?, ?, ?, ?)
+    """
+
+    def __init__(self, ruta=RUTA_SQLITE):
+        self.ruta = ruta
+        self._esquema_listo = False
+        self._lock = threading.Lock()
+
+    def connect(self):
+        # El pool presta cada conexión a un solo hilo a la vez, pero no siempre al mismo
+        conn = sqlite3.connect(self.ruta, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        for pragma in PRAGMAS_SQLITE:
+            conn.execute(pragma)
+        with self._lock:
+            if not self._esquema_listo:
+                self.ensure_schema(conn)
+                self._esquema_listo = True
+        return conn
+
+    def ensure_schema(self, conn):
+        conn.executescript(ESQUEMA_SQLITE)
+        if "ingesta_id" not in {fila[1] for fila in conn.execute("PRAGMA table_info(Lecturas)")}:
+            conn.execute("ALTER TABLE Lecturas ADD COLUMN ingesta_id INTEGER")
+        if "ultimo_id" not in {fila[1] for fila in conn.execute("PRAGMA table_info(Agregados_Estado)")}:
+            conn.execute("ALTER TABLE Agregados_Estado ADD COLUMN ultimo_id INTEGER")
+        if "id" not in {fila[2] for fila in conn.execute("PRAGMA index_info(IX_Lecturas_artefacto_fecha)")}:
+            # Índice de una versión anterior, sin el id en la clave
+            conn.execute("DROP INDEX IF EXISTS IX_Lecturas_artefacto_fecha")
+        conn.execute(INDICE_HISTORIAL_SQLITE)
+        conn.execute(INDICE_INGESTA_SQLITE)
+        conn.commit()
+
+
+BACKENDS = {"sqlserver": SqlServerBackend, "sqlite": SqliteBackend}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(nombre=None):
+    """Crea el backend `nombre` (o el de la variable MONITOREO_BD)."""
+    nombre = (nombre or os.environ.get(VARIABLE_BACKEND) or "sqlserver").lower()
+    if nombre not in BACKENDS:
+        raise ValueError(f"Backend de almacenamiento desconocido: {nombre} (opciones: {', '.join(BACKENDS)})")
+    if nombre == "sqlite":
+        return SqliteBackend(os.environ.get(VARIABLE_RUTA_SQLITE, RUTA_SQLITE))
+    return SqlServerBackend()
+
+
+def get_backend():
+    """Devuelve el backend de la aplicación, creándolo la primera vez."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend()
+        return _backend
+
+
+def set_backend(backend):
+    """Reemplaza el backend de la aplicación (antes de abrir la primera conexión del pool)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepara la base de datos del backend configurado.")
+    parser.add_argument("--usuario", help="Crea un usuario (pide la contraseña)")
+    parser.add_argument("--rol", default="usuario", help="Rol del usuario nuevo")
+    parser.add_argument("--nombres")
+    parser.add_argument("--apellidos")
+    parser.add_argument("--artefacto", action="append", default=[], help="Registra un artefacto (se puede repetir)")
+    args = parser.parse_args()
+
+    backend = get_backend()
+    conn = backend.connect()
+    try:
+        backend.ensure_schema(conn)
+        if args.usuario:
+            import pyotp
+            password = getpass.getpass(f"Contraseña para {args.usuario}: ")
+            backend.add_user(conn, args.usuario, password, args.rol, pyotp.random_base32(),
+                             args.nombres, args.apellidos)
+            print(f"Usuario '{args.usuario}' creado.")
+        for nombre in args.artefacto:
+            backend.add_artefacto(conn, nombre)
+            print(f"Artefacto '{nombre}' registrado.")
+        print("Artefactos:", ", ".join(f"{i} {n}" for i, n in backend.list_artefactos(conn)) or "ninguno")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Archivo local de lecturas en formato columnar, particionado por artefacto y día.
+
+Cada partición es una carpeta `<raiz>/<artefacto_id>/<AAAA-MM-DD>/` con tres
+archivos binarios de solo anexado:
+
+    tiempo.f8     float64  segundos desde 1970 en hora local (la misma hora de pared de fecha_hora)
+    corriente.f4  float32
+    potencia.f4   float32
+
+Los archivos se abren con `np.memmap`, de modo que leer un rango devuelve vistas
+sobre el disco sin copiar ni pasar por ODBC. `sync()` trae de `Lecturas` solo las
+filas posteriores a la última lectura archivada de cada artefacto. Las
+lecturas insertadas tarde con una fecha ya archivada (las que la bitácora
+local recarga tras una caída de la base) se detectan por el id de `Lecturas`,
+que se guarda en `<raiz>/estado.json`, y sus días se vuelven a escribir.
+
+Uso desde la línea de comandos:
+
+    python archivo.py            # Sincroniza el archivo con la base de datos
+"""
+import json
+import os
+import shutil
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from historial import inserted_since, last_reading_id
+
+DIRECTORIO_ARCHIVO = "archivo_lecturas"
+ARCHIVO_ESTADO = "estado.json"
+SEGUNDOS_POR_DIA = 86400
+COLUMNAS = (("tiempo", np.float64, "f8"), ("corriente", np.float32, "f4"), ("potencia", np.float32, "f4"))
+
+_EPOCA = datetime(1970, 1, 1)
+
+
+def to_seconds(fecha_hora):
+    """Convierte un datetime sin zona a los segundos que usa el archivo."""
+    return (fecha_hora - _EPOCA) / timedelta(seconds=1)
+
+
+def from_seconds(segundos):
+    """Convierte segundos del archivo a datetime sin zona."""
+    return _EPOCA + timedelta(seconds=float(segundos))
+
+
+def datetimes_to_seconds(fechas):
+    """Versión vectorizada de to_seconds para una lista de datetimes."""
+    return np.array(fechas, dtype="datetime64[us]").astype(np.int64) / 1e6
+
+
+class ReadingArchive:
+    """Archivo columnar de lecturas con particiones diarias por artefacto."""
+
+    def __init__(self, raiz=DIRECTORIO_ARCHIVO):
+        self.raiz = raiz
+
+    # Escritura
+
+    def _ruta(self, artefacto_id, dia):
+        return os.path.join(self.raiz, str(artefacto_id), dia.isoformat())
+
+    def append(self, artefacto_id, tiempos, corrientes, potencias):
+        """Anexa lecturas ordenadas por tiempo, repartiéndolas en sus particiones diarias."""
+        tiempos = np.asarray(tiempos, dtype=np.float64)
+        if len(tiempos) == 0:
+            return
+        columnas = (tiempos, np.asarray(corrientes), np.asarray(potencias))
+        dias = np.floor(tiempos / SEGUNDOS_POR_DIA).astype(np.int64)
+        cortes = np.flatnonzero(np.diff(dias)) + 1
+        for inicio, fin in zip(np.r_[0, cortes], np.r_[cortes, len(tiempos)]):
+            ruta = self._ruta(artefacto_id, date(1970, 1, 1) + timedelta(days=int(dias[inicio])))
+            os.makedirs(ruta, exist_ok=True)
+            for (nombre, dtype, sufijo), valores in zip(COLUMNAS, columnas):
+                with open(os.path.join(ruta, f"{nombre}.{sufijo}"), "ab") as f:
+                    f.write(np.ascontiguousarray(valores[inicio:fin], dtype=dtype).tobytes())
+
+    def drop_from(self, artefacto_id, dia):
+        """Borra las particiones del artefacto desde `dia` (inclusive)."""
+        for particion in self.partitions(artefacto_id):
+            if particion >= dia:
+                shutil.rmtree(self._ruta(artefacto_id, particion))
+
+    # Lectura
+
+    def artefactos(self):
+        """Identificadores de los artefactos que tienen datos archivados."""
+        if not os.path.isdir(self.raiz):
+            return []
+        return sorted(int(nombre) for nombre in os.listdir(self.raiz) if nombre.isdigit())
+
+    def partitions(self, artefacto_id):
+        """Días archivados del artefacto, en orden."""
+        ruta = os.path.join(self.raiz, str(artefacto_id))
+        if not os.path.isdir(ruta):
+            return []
+        return sorted(date.fromisoformat(nombre) for nombre in os.listdir(ruta))
+
+    def _abrir(self, artefacto_id, dia):
+        """Mapea las columnas de una partición. Devuelve None si está vacía."""
+        ruta = self._ruta(artefacto_id, dia)
+        columnas = []
+        for nombre, dtype, sufijo in COLUMNAS:
+            archivo = os.path.join(ruta, f"{nombre}.{sufijo}")
+            n = os.path.getsize(archivo) // np.dtype(dtype).itemsize if os.path.exists(archivo) else 0
+            columnas.append((archivo, dtype, n))
+        # Si una escritura se interrumpió, las columnas pueden diferir: se usa la más corta
+        n = min(c[2] for c in columnas)
+        if n == 0:
+            return None
+        return tuple(np.memmap(archivo, dtype=dtype, mode="r", shape=(n,)) for archivo, dtype, _ in columnas)
+
+    def iter_range(self, artefacto_id, desde=None, hasta=None):
+        """Recorre el rango [desde, hasta) partición por partición.
+
+        Produce tuplas (tiempos, corrientes, potencias) que son vistas sobre los
+        archivos mapeados, sin copias.
+        """
+        t0 = -np.inf if desde is None else to_seconds(desde)
+        t1 = np.inf if hasta is None else to_seconds(hasta)
+        for dia in self.partitions(artefacto_id):
+            inicio_dia = (datetime.combine(dia, datetime.min.time()) - _EPOCA).total_seconds()
+            if inicio_dia + SEGUNDOS_POR_DIA <= t0 or inicio_dia >= t1:
+                continue
+            columnas = self._abrir(artefacto_id, dia)
+            if columnas is None:
+                continue
+            tiempos = columnas[0]
+            i0, i1 = np.searchsorted(tiempos, (t0, t1))
+            if i1 > i0:
+                yield tuple(c[i0:i1] for c in columnas)
+
+    def read_range(self, artefacto_id, desde=None, hasta=None):
+        """Devuelve (tiempos, corrientes, potencias) del rango [desde, hasta).
+
+        Si el rango cae en una sola partición el resultado son vistas sin copia;
+        si abarca varias, se concatenan.
+        """
+        partes = list(self.iter_range(artefacto_id, desde, hasta))
+        if not partes:
+            return (np.empty(0, np.float64), np.empty(0, np.float32), np.empty(0, np.float32))
+        if len(partes) == 1:
+            return partes[0]
+        return tuple(np.concatenate(columna) for columna in zip(*partes))
+
+    def last_time(self, artefacto_id):
+        """Última marca de tiempo archivada del artefacto (en segundos), o None."""
+        for dia in reversed(self.partitions(artefacto_id)):
+            columnas = self._abrir(artefacto_id, dia)
+            if columnas is not None:
+                return float(columnas[0][-1])
+        return None
+
+    # Sincronización
+
+    def sync(self, conn, chunk_size=50000, margen=timedelta(minutes=5)):
+        """Trae de Lecturas las filas nuevas de cada artefacto y devuelve cuántas se archivaron.
+
+        La marca de agua de cada artefacto es su última lectura archivada, así que
+        una sincronización interrumpida se retoma sin duplicar filas. No se
+        archivan las lecturas de los últimos `margen` minutos, para dar tiempo a
+        que terminen de escribirse los lotes con marca de tiempo del cliente.
+        Si desde la sincronización anterior se insertaron lecturas con una
+        fecha ya archivada, se vuelve a escribir desde el día de la más antigua.
+        """
+        ultimo_id = last_reading_id(conn)
+        tardias = inserted_since(conn, self._last_id(), ultimo_id)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM artefactos")
+        ids = [row[0] for row in cursor.fetchall()]
+        hasta = datetime.now() - margen
+
+        total = 0
+        for artefacto_id in ids:
+            ultimo = self.last_time(artefacto_id)
+            tardia = tardias.get(artefacto_id)
+            if ultimo is not None and tardia is not None and to_seconds(tardia) <= ultimo:
+                self.drop_from(artefacto_id, tardia.date())
+                ultimo = self.last_time(artefacto_id)
+            desde = _EPOCA if ultimo is None else from_seconds(ultimo)
+            cursor.execute("""
+                SELECT fecha_hora, corriente, potencia
+                FROM Lecturas
+                WHERE artefacto_id = ? AND fecha_hora > ? AND fecha_hora <= ?
+                ORDER BY fecha_hora
+            """, (artefacto_id, desde, hasta))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                fechas, corrientes, potencias = zip(*rows)
+                self.append(artefacto_id, datetimes_to_seconds(fechas),
+                            np.array(corrientes, dtype=np.float32), np.array(potencias, dtype=np.float32))
+                total += len(rows)
+        cursor.close()
+        self._save_last_id(ultimo_id)
+        return total
+
+    def _last_id(self):
+        """Último id de Lecturas visto por la sincronización anterior, o None."""
+        try:
+            with open(os.path.join(self.raiz, ARCHIVO_ESTADO), encoding="utf-8") as f:
+                return int(json.load(f)["ultimo_id"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save_last_id(self, ultimo_id):
+        os.makedirs(self.raiz, exist_ok=True)
+        ruta = os.path.join(self.raiz, ARCHIVO_ESTADO)
+        with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"ultimo_id": ultimo_id}, f)
+        os.replace(ruta + ".tmp", ruta)
+
+
+if __name__ == "__main__":
+    from basedatos import get_connection
+
+    conn = get_connection()
+    try:
+        filas = ReadingArchive().sync(conn)
+        print(f"Archivo sincronizado: {filas} lecturas nuevas.")
+    finally:
+        conn.close()
@@ -0,0 +1,151 @@
+"""Importaciones diferidas y medición del arranque de la interfaz.
+
+Interfaz.py importa al inicio solo lo necesario para mostrar la ventana de
+inicio de sesión. Los módulos pesados (matplotlib, pyqtgraph, NumPy, el
+modelo) se declaran con `lazy_import` y se importan la primera vez que se usa
+uno de sus atributos, es decir, al abrir el panel que los necesita. Tras
+iniciar sesión, `preload` importa en un hilo de fondo los que no tocan Qt
+para que esos paneles ya no esperen. pyqtgraph y matplotlib.pyplot crean
+estado de Qt y del backend gráfico al importarse, así que se cargan con
+`load_modules` desde el hilo principal.
+
+Con `python Interfaz.py --tiempos-importacion` se imprime cuánto tardó cada
+importación y el tiempo hasta mostrar la ventana de inicio de sesión.
+"""
+import builtins
+import importlib
+import sys
+import threading
+import time
+import types
+
+OPCION_TIEMPOS = "--tiempos-importacion"
+OPCION_SIN_PRECARGA = "--sin-precarga"
+PRESUPUESTO_ARRANQUE_MS = 1500  # Tiempo objetivo hasta mostrar la ventana de inicio de sesión
+
+# Segundos de cada importación diferida, en el orden en que ocurrieron
+tiempos_diferidos = {}
+
+
+class LazyModule(types.ModuleType):
+    """Módulo que se importa la primera vez que se accede a uno de sus atributos."""
+
+    def __init__(self, nombre):
+        super().__init__(nombre)
+        self.__dict__["_modulo"] = None
+
+    def _load(self):
+        modulo = self.__dict__["_modulo"]
+        if modulo is None:
+            nombre = self.__name__
+            cargado = nombre in sys.modules
+            inicio = time.perf_counter()
+            modulo = importlib.import_module(nombre)  # importlib serializa las importaciones concurrentes
+            if not cargado:
+                tiempos_diferidos.setdefault(nombre, time.perf_counter() - inicio)
+            self.__dict__["_modulo"] = modulo
+        return modulo
+
+    def __getattr__(self, atributo):
+        return getattr(self._load(), atributo)
+
+    def __setattr__(self, atributo, valor):
+        setattr(self._load(), atributo, valor)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        estado = "cargado" if self.__dict__["_modulo"] is not None else "diferido"
+        return f"<módulo {estado} '{self.__name__}'>"
+
+
+def lazy_import(nombre):
+    """Devuelve el módulo si ya está importado; si no, un LazyModule que lo importa al usarse."""
+    return sys.modules.get(nombre) or LazyModule(nombre)
+
+
+def load_modules(modulos):
+    """Importa ya `modulos` (LazyModule, módulos ya importados o nombres) en el hilo actual.
+
+    Los errores no se propagan: el módulo se volverá a intentar importar
+    cuando se use.
+    """
+    for modulo in modulos:
+        if isinstance(modulo, types.ModuleType) and not isinstance(modulo, LazyModule):
+            continue  # lazy_import devolvió el módulo real: ya estaba importado
+        try:
+            (modulo if isinstance(modulo, LazyModule) else LazyModule(modulo))._load()
+        except Exception as e:
+            print(f"No se pudo precargar {getattr(modulo, '__name__', modulo)}: {e}")
+
+
+def preload(modulos, al_terminar=None):
+    """Importa `modulos` con `load_modules` en un hilo de fondo.
+
+    Solo para módulos que no tocan Qt al importarse. `al_terminar()` se llama
+    desde el hilo al acabar.
+    """
+    def precargar():
+        load_modules(modulos)
+        if al_terminar:
+            al_terminar()
+
+    hilo = threading.Thread(target=precargar, daemon=True)
+    hilo.start()
+    return hilo
+
+
+class ImportTimer:
+    """Mide cuánto tarda cada importación de primer nivel hecha con `import`.
+
+    Solo se cuentan las importaciones más externas de cada hilo (las que hace
+    el propio código de la aplicación), con el tiempo acumulado de todo lo
+    que importan a su vez.
+    """
+
+    def __init__(self):
+        self.tiempos = {}
+        self.inicio = time.perf_counter()
+        self._original = None
+        self._local = threading.local()
+
+    def start(self):
+        if self._original is None:
+            self._original = builtins.__import__
+            builtins.__import__ = self._import
+
+    def stop(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or getattr(self._local, "dentro", False) or name in sys.modules:
+            return self._original(name, globals, locals, fromlist, level)
+        self._local.dentro = True
+        inicio = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            self._local.dentro = False
+            self.tiempos[name] = self.tiempos.get(name, 0.0) + time.perf_counter() - inicio
+
+    def report(self, hasta_ventana=None, limite=15):
+        """Texto con las importaciones más lentas, las diferidas y el tiempo hasta la ventana."""
+        lineas = ["Importaciones al arrancar (ms, acumulado):"]
+        for nombre, segundos in sorted(self.tiempos.items(), key=lambda t: -t[1])[:limite]:
+            lineas.append(f"  {1000 * segundos:8.1f}  {nombre}")
+        lineas.append(f"  {1000 * sum(self.tiempos.values()):8.1f}  total")
+        if tiempos_diferidos:
+            lineas.append("Importaciones diferidas (ms):")
+            for nombre, segundos in tiempos_diferidos.items():
+                lineas.append(f"  {1000 * segundos:8.1f}  {nombre}")
+        if hasta_ventana is not None:
+            estado = "dentro" if 1000 * hasta_ventana <= PRESUPUESTO_ARRANQUE_MS else "FUERA"
+            lineas.append(f"Ventana de inicio de sesión en {1000 * hasta_ventana:.0f} ms "
+                          f"({estado} del presupuesto de {PRESUPUESTO_ARRANQUE_MS} ms)")
+        return "\n".join(lineas)
+
+
+import_timer = ImportTimer()
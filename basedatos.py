@@ -0,0 +1,241 @@
+"""Acceso compartido a la base de datos.
+
+Todas las conexiones de la aplicación (interfaz, hilos de trabajo y
+ModeloEntrenamiento.py) salen de un único pool, en lugar de repetir la cadena
+de conexión y pagar el handshake ODBC completo en cada consulta. Las
+conexiones las abre el backend configurado (SQL Server o SQLite, ver
+almacenamiento.py).
+"""
+import threading
+import time
+
+CONNECTION_STRING = (
+    'DRIVER={ODBC Driver 17 for SQL Server};'
+    'SERVER=DESKTOP-D5VHBMM\\MSSQLSERVER1;'  # Cambiar por el servidor que tiene
+    'DATABASE=DataBaseProject;'
+    'Trusted_Connection=yes;'  # Si su servidor tiene contraseña agregar 'UID=tu_usuario;' y 'PWD=tu_contraseña;'
+)
+
+
+def connect_sqlserver():
+    """Abre una conexión nueva a SQL Server (sin pasar por el pool)."""
+    import pyodbc  # Solo se necesita al conectarse a SQL Server
+    return pyodbc.connect(CONNECTION_STRING)
+
+
+class PoolTimeoutError(Exception):
+    """No hubo una conexión libre dentro del tiempo de espera."""
+
+
+class PooledConnection:
+    """Conexión prestada por el pool.
+
+    Se usa igual que una conexión pyodbc; `close()` la devuelve al pool en vez
+    de cerrarla, por lo que el código existente que hace `conn.close()` sigue
+    funcionando sin cambios.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise AttributeError(f"La conexión ya fue devuelta al pool ({name})")
+        return getattr(self._raw, name)
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool._checkin(raw)
+
+    def discard(self):
+        """Cierra la conexión física (por ejemplo, tras un error de red)."""
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool._discard(raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Una conexión olvidada sin close() vuelve al pool al recolectarse
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Pool de conexiones seguro para hilos.
+
+    - `min_size`: conexiones que se mantienen abiertas aunque estén ociosas.
+    - `max_size`: máximo de conexiones abiertas; al llegar al tope se espera.
+    - `idle_timeout`: segundos tras los que se cierra una conexión ociosa sobrante.
+    - `health_check_after`: si una conexión estuvo ociosa más de estos segundos,
+      se verifica con `health_query` antes de prestarla.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=8, idle_timeout=300.0,
+                 health_check_after=30.0, health_query="SELECT 1", checkout_timeout=15.0):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.health_query = health_query
+        self.checkout_timeout = checkout_timeout
+
+        self._idle = []  # (conexión, instante en que quedó libre); la última es la más reciente
+        self._open = 0
+        self._lock = threading.Condition()
+
+        # Estadísticas
+        self.checkouts = 0
+        self.waits = 0
+        self.created = 0
+        self.evicted = 0
+        self.failed_health_checks = 0
+        self._checkout_total = 0.0
+        self._checkout_max = 0.0
+
+    def connection(self, timeout=None):
+        """Presta una conexión. Usar con `with` o llamar a `close()` para devolverla."""
+        inicio = time.perf_counter()
+        limite = time.monotonic() + (self.checkout_timeout if timeout is None else timeout)
+        raw = None
+        while raw is None:
+            candidata = None
+            crear = False
+            with self._lock:
+                self._evict_idle()
+                esperando = False
+                while not self._idle and self._open >= self.max_size:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise PoolTimeoutError("No hay conexiones libres en el pool")
+                    if not esperando:
+                        self.waits += 1
+                        esperando = True
+                    self._lock.wait(restante)
+                if self._idle:
+                    candidata, libre_desde = self._idle.pop()
+                else:
+                    self._open += 1  # Se reserva el lugar antes de conectar fuera del lock
+                    crear = True
+
+            if crear:
+                try:
+                    raw = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._open -= 1
+                        self._lock.notify()
+                    raise
+                with self._lock:
+                    self.created += 1
+            elif time.monotonic() - libre_desde < self.health_check_after or self._is_healthy(candidata):
+                raw = candidata
+            else:
+                with self._lock:
+                    self.failed_health_checks += 1
+                self._discard(candidata)
+
+        espera = time.perf_counter() - inicio
+        with self._lock:
+            self.checkouts += 1
+            self._checkout_total += espera
+            self._checkout_max = max(self._checkout_max, espera)
+        return PooledConnection(self, raw)
+
+    def _is_healthy(self, raw):
+        try:
+            cursor = raw.cursor()
+            cursor.execute(self.health_query)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _checkin(self, raw):
+        try:
+            raw.rollback()  # No dejar transacciones abiertas para el próximo usuario
+        except Exception:
+            self._discard(raw)
+            return
+        with self._lock:
+            self._idle.append((raw, time.monotonic()))
+            self._lock.notify()
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._open -= 1
+            self._lock.notify()
+
+    def _evict_idle(self):
+        """Cierra las conexiones ociosas más antiguas que `idle_timeout` (con el lock tomado)."""
+        ahora = time.monotonic()
+        while (self._idle and self._open > self.min_size
+               and ahora - self._idle[0][1] > self.idle_timeout):
+            raw, _ = self._idle.pop(0)
+            self._open -= 1
+            self.evicted += 1
+            try:
+                raw.close()
+            except Exception:
+                pass
+
+    def close_all(self):
+        """Cierra las conexiones ociosas (las prestadas se cierran al devolverse)."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for raw, _ in idle:
+            try:
+                raw.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        """Estadísticas del pool: conexiones abiertas, esperas y latencia de préstamo."""
+        with self._lock:
+            return {
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "created": self.created,
+                "evicted": self.evicted,
+                "failed_health_checks": self.failed_health_checks,
+                "checkout_avg_ms": 1000 * self._checkout_total / self.checkouts if self.checkouts else 0.0,
+                "checkout_max_ms": 1000 * self._checkout_max,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Devuelve el pool compartido de la aplicación, creándolo la primera vez."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from almacenamiento import get_backend  # almacenamiento importa este módulo
+            backend = get_backend()
+            _pool = ConnectionPool(backend.connect, health_query=backend.health_query)
+        return _pool
+
+
+def get_connection():
+    """Presta una conexión del pool compartido. `close()` la devuelve al pool."""
+    return get_pool().connection()
@@ -0,0 +1,301 @@
+"""Benchmark de extremo a extremo de la ingesta de lecturas (solo Linux).
+
+Un Arduino virtual escribe líneas `Irms: x A, Potencia: y W` (o tramas
+binarias con `--protocolo binario`, ver adquisicion.py) en un pseudoterminal
+(pty) a la tasa y con el jitter indicados. Del otro lado, el
+mismo `SerialReader` de la aplicación lee el puerto y un `RealTimeMonitoring`
+sin ventana (Qt offscreen) vacía el búfer, grafica, puntúa y agrega las
+lecturas a la bitácora local, desde donde se guardan por lotes en una base
+SQLite temporal (ver bitacora.py y almacenamiento.py).
+
+Cada línea lleva su número de secuencia en la potencia, así se sabe cuándo se
+emitió cada lectura que llega a la base. Se informa:
+
+- parseo: lecturas por segundo del decodificador (sin puerto ni interfaz);
+- lectura: latencia desde la emisión hasta la marca de tiempo del lector;
+- extremo_a_extremo: latencia desde la emisión hasta el INSERT en la base;
+- líneas perdidas, filas por segundo insertadas y duración de cada cuadro.
+
+El resultado se escribe en JSON para comparar entre commits:
+
+    python benchmark_ingesta.py --tasa 500 --jitter 0.3 --duracion 20 --salida bench.json
+    python benchmark_ingesta.py --tasa 2000 --protocolo binario
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tty
+from datetime import datetime
+
+import numpy as np
+
+RUTA_SALIDA = "benchmark_ingesta.json"
+PERCENTILES = (50, 90, 95, 99)
+RANGO_TOTAL = (datetime(1970, 1, 2), datetime(2100, 1, 1))
+
+
+def format_line(secuencia, voltaje=220.0):
+    """Línea del Arduino con el número de secuencia como potencia."""
+    return f"Irms: {secuencia / voltaje:.3f} A, Potencia: {secuencia:.2f} W\r\n"
+
+
+def format_frame(secuencia, millis, voltaje=220.0):
+    """Trama binaria equivalente a `format_line`."""
+    from adquisicion import encode_frame
+    return encode_frame(secuencia, millis, secuencia / voltaje, secuencia)
+
+
+class VirtualArduino(threading.Thread):
+    """Emite líneas en el lado maestro de un pty; el lado esclavo se abre como puerto serie.
+
+    Los intervalos entre líneas son 1/`tasa` con un jitter uniforme de
+    ±`jitter` (fracción del intervalo). Las líneas cuyo instante ya pasó se
+    escriben juntas, así la tasa se sostiene aunque `sleep` no sea tan fino.
+    La latencia se mide desde el instante programado de cada línea: si el
+    lector se atrasa y el pty se llena, la espera cuenta como latencia.
+    """
+
+    def __init__(self, tasa, duracion, jitter=0.0, semilla=0, protocolo="texto"):
+        super().__init__(daemon=True)
+        self.protocolo = protocolo
+        self.maestro, self.esclavo = os.openpty()
+        tty.setraw(self.esclavo)  # Sin eco ni traducción de fin de línea
+        self.puerto = os.ttyname(self.esclavo)
+        rng = np.random.default_rng(semilla)
+        n = int(tasa * duracion)
+        intervalos = (1.0 / tasa) * (1 + rng.uniform(-jitter, jitter, n))
+        self.desfases = np.cumsum(intervalos)
+        self.emitidas = np.full(n, np.nan)  # Instante programado (time.time()) de cada secuencia
+        self.enviadas = 0
+        self._detener = threading.Event()
+
+    def run(self):
+        inicio = time.monotonic()
+        self.emitidas[:] = time.time() + self.desfases  # Mismo reloj que la marca del lector
+        n = len(self.desfases)
+        while self.enviadas < n and not self._detener.is_set():
+            ahora = time.monotonic() - inicio
+            hasta = int(np.searchsorted(self.desfases, ahora, side="right"))
+            if hasta > self.enviadas:
+                bloque = self._block(self.enviadas, hasta)
+                os.write(self.maestro, bloque)  # Bloquea si el lector no vacía el pty
+                self.enviadas = hasta
+            else:
+                time.sleep(min(0.001, self.desfases[self.enviadas] - ahora))
+
+    def _block(self, desde, hasta):
+        if self.protocolo == "binario":
+            # millis del Arduino: el instante programado de cada trama
+            return b"".join(format_frame(s, int(1000 * self.desfases[s])) for s in range(desde, hasta))
+        return "".join(format_line(s) for s in range(desde, hasta)).encode()
+
+    def stop(self):
+        self._detener.set()
+        if self.is_alive():
+            self.join(timeout=2)
+
+    def close(self):
+        for fd in (self.maestro, self.esclavo):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def percentiles(valores):
+    valores = np.asarray(valores, dtype=np.float64)
+    valores = valores[np.isfinite(valores)]
+    if len(valores) == 0:
+        return None
+    resumen = {f"p{p}": float(np.percentile(valores, p)) for p in PERCENTILES}
+    resumen.update(promedio=float(valores.mean()), max=float(valores.max()), n=int(len(valores)))
+    return resumen
+
+
+def parse_throughput(n=200000, protocolo="texto"):
+    """Lecturas por segundo que interpreta el lector en un solo hilo."""
+    from adquisicion import FrameDecoder, LineDecoder
+    if protocolo == "binario":
+        datos = b"".join(format_frame(s, s) for s in range(n))
+        decoder = FrameDecoder()
+    else:
+        datos = "".join(format_line(s) for s in range(n)).encode()
+        decoder = LineDecoder()
+    inicio = time.perf_counter()
+    for i in range(0, len(datos), 4096):  # Lecturas de 4 KiB, como las del puerto
+        decoder.feed(datos[i:i + 4096])
+    return n / (time.perf_counter() - inicio)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(tasa, duracion, jitter, fps, lote, latencia_max, ruta_db, protocolo="texto"):
+    from PyQt5 import QtCore, QtWidgets
+    import serial
+    import almacenamiento
+    import Interfaz
+    from adquisicion import SerialReader
+
+    class MeasuredBackend(almacenamiento.SqliteBackend):
+        """Backend SQLite que anota cuándo se insertó cada secuencia."""
+
+        def __init__(self, ruta):
+            super().__init__(ruta)
+            self.insertadas = []  # (time.time(), secuencias)
+
+        def insert_spooled(self, conn, filas):
+            super().insert_spooled(conn, filas)
+            secuencias = np.rint([fila[2] for fila in filas]).astype(np.int64)
+            self.insertadas.append((time.time(), secuencias))
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+    backend = MeasuredBackend(ruta_db)
+    almacenamiento.set_backend(backend)
+    Interfaz.LOTE_LECTURAS = lote
+    Interfaz.LATENCIA_MAX_LECTURAS = latencia_max
+    Interfaz.RUTA_BITACORA = ruta_db + ".bitacora"
+    conn = backend.connect()
+    backend.add_artefacto(conn, "Banco de pruebas")
+    artefacto_id = backend.list_artefactos(conn)[-1][0]
+
+    arduino = VirtualArduino(tasa, duracion, jitter, protocolo=protocolo)
+    reader = SerialReader(serial.Serial(arduino.puerto, 9600, timeout=0.1), capacidad=max(4096, 4 * tasa),
+                          protocolo=protocolo)
+    monitor = Interfaz.RealTimeMonitoring(reader, artefacto_id, "Banco de pruebas", max_fps=fps)
+
+    # Cada cuadro se cronometra: se reemplaza la conexión del temporizador del monitor
+    cuadros = []
+
+    def cuadro():
+        inicio = time.perf_counter()
+        monitor.update_plot()
+        cuadros.append(time.perf_counter() - inicio)
+
+    monitor.timer.timeout.disconnect()
+    monitor.timer.timeout.connect(cuadro)
+    monitor.start_monitoring()
+    arduino.start()
+
+    inicio = time.monotonic()
+    limite = inicio + duracion + 30
+    while time.monotonic() < limite:
+        app.processEvents(QtCore.QEventLoop.AllEvents, 50)
+        time.sleep(0.001)
+        if (not arduino.is_alive() and len(reader.buffer) == 0
+                and reader.estadisticas()["lineas"] >= arduino.enviadas):
+            break
+    transcurrido = time.monotonic() - inicio
+    cuadro()  # Último vaciado del búfer
+    lector = reader.estadisticas()
+    scorer = monitor.scorer.estadisticas() if monitor.scorer else None
+    writer = Interfaz.get_batch_writer()
+    monitor.stop_monitoring()
+    arduino.stop()
+    Interfaz.stop_batch_writer()  # Carga lo que quede en la bitácora
+    arduino.close()
+    bd = writer.estadisticas()
+
+    # Latencias por secuencia
+    emitidas = arduino.emitidas[:arduino.enviadas]
+    fechas, _, potencias = backend.read_range(conn, artefacto_id, *RANGO_TOTAL)
+    filas = backend.aggregate(conn, artefacto_id, *RANGO_TOTAL)["lecturas"]
+    conn.close()
+    secuencias = np.rint(potencias).astype(np.int64)
+    validas = (secuencias >= 0) & (secuencias < len(emitidas))
+    # fecha_hora se guarda en hora local sin zona: se vuelve a epoch con la misma conversión
+    leidas = fechas.astype("datetime64[us]").astype(object)
+    tiempos_lector = np.array([f.timestamp() for f in leidas])
+    latencia_lectura = tiempos_lector[validas] - emitidas[secuencias[validas]]
+    latencia_total = []
+    for instante, lote_secuencias in backend.insertadas:
+        lote_secuencias = lote_secuencias[(lote_secuencias >= 0) & (lote_secuencias < len(emitidas))]
+        latencia_total.append(instante - emitidas[lote_secuencias])
+    latencia_total = np.concatenate(latencia_total) if latencia_total else np.empty(0)
+
+    recibidas = len(np.unique(secuencias[validas]))
+    return {
+        "lineas": {
+            "emitidas": int(arduino.enviadas),
+            "leidas": lector["lineas"],
+            "invalidas": lector["invalidas"],
+            "descartadas_bufer": lector["descartadas"],
+            "perdidas": int(arduino.enviadas - recibidas),
+            "duplicadas": int(validas.sum() - recibidas),
+            "lineas_por_segundo": lector["lineas"] / transcurrido if transcurrido else 0.0,
+        },
+        "latencia_ms": {
+            "lectura": percentiles(1000 * latencia_lectura),
+            "extremo_a_extremo": percentiles(1000 * latencia_total),
+        },
+        "base_de_datos": {
+            "filas": filas,
+            "lotes": bd["lotes"],
+            "errores": bd["errores"],
+            "filas_por_segundo": bd["filas_por_segundo"],
+            "filas_por_segundo_escritura": bd["filas_por_segundo_escritura"],
+        },
+        "cuadros_ms": percentiles(1000 * np.array(cuadros)),
+        "modelo": scorer,
+        "duracion_segundos": transcurrido,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de ingesta con un Arduino virtual en un pty.")
+    parser.add_argument("--tasa", type=int, default=200, help="Líneas por segundo que emite el Arduino virtual")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Variación del intervalo (fracción, 0 a 1)")
+    parser.add_argument("--duracion", type=float, default=10.0, help="Segundos de emisión")
+    parser.add_argument("--fps", type=int, default=None, help="Cuadros por segundo de la gráfica")
+    parser.add_argument("--lote", type=int, default=None, help="Filas por INSERT del escritor por lotes")
+    parser.add_argument("--latencia-max", type=float, default=None, help="Segundos máximos en la cola de escritura")
+    parser.add_argument("--protocolo", choices=("texto", "binario"), default="texto",
+                        help="Formato que emite el Arduino virtual")
+    parser.add_argument("--salida", default=RUTA_SALIDA, help="Archivo JSON con los resultados")
+    args = parser.parse_args()
+    if not sys.platform.startswith("linux"):
+        parser.error("El Arduino virtual necesita un pseudoterminal de Linux.")
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")  # Sin ventanas
+    import Interfaz  # Valores por defecto de la aplicación
+    fps = args.fps or Interfaz.MAX_FPS_GRAFICAS
+    lote = args.lote or Interfaz.LOTE_LECTURAS
+    latencia_max = args.latencia_max if args.latencia_max is not None else Interfaz.LATENCIA_MAX_LECTURAS
+
+    with tempfile.TemporaryDirectory() as directorio:
+        resultados = run(args.tasa, args.duracion, args.jitter, fps, lote, latencia_max,
+                         os.path.join(directorio, "benchmark.db"), args.protocolo)
+    reporte = {
+        "commit": git_commit(),
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "plataforma": {"python": platform.python_version(), "sistema": platform.platform(),
+                       "procesador": platform.processor() or platform.machine()},
+        "parametros": {"tasa": args.tasa, "jitter": args.jitter, "duracion": args.duracion,
+                       "fps": fps, "lote": lote, "latencia_max": latencia_max,
+                       "protocolo": args.protocolo},
+        "parseo_lineas_por_segundo": parse_throughput(protocolo=args.protocolo),
+        **resultados,
+    }
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(reporte, f, indent=2, ensure_ascii=False)
+
+    lat = reporte["latencia_ms"]["extremo_a_extremo"] or {}
+    print(f"Líneas: {reporte['lineas']['emitidas']} emitidas, {reporte['lineas']['perdidas']} perdidas | "
+          f"Extremo a extremo p50 {lat.get('p50', float('nan')):.1f} ms, p99 {lat.get('p99', float('nan')):.1f} ms | "
+          f"BD {reporte['base_de_datos']['filas_por_segundo']:.0f} filas/s")
+    print(f"Resultados en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+"""Bitácora local (spool) de las lecturas antes de guardarlas en la base de datos.
+
+Cada lectura se agrega primero a una bitácora en disco de solo escritura al
+final, y un hilo de fondo la copia a `Lecturas` por lotes. Así la adquisición
+no espera a la base: si SQL Server está lento o caído, las lecturas se
+acumulan en disco y se cargan cuando vuelve, incluso después de reiniciar la
+aplicación.
+
+La bitácora es un directorio con segmentos `<primer ingesta_id>.seg`. Cada
+registro es un bloque de lecturas:
+
+    uint32 largo | uint32 crc32 | largo bytes de DTYPE_REGISTRO
+
+Al abrir se descarta el final incompleto del último segmento (un corte de luz
+a mitad de una escritura). Los `fsync` se agrupan: se hacen cada
+`INTERVALO_FSYNC` segundos, al rotar de segmento y al cerrar.
+
+Cada lectura lleva un `ingesta_id` único que se guarda en `Lecturas`; con el
+índice único de migraciones/003_ingesta_id.sql, reenviar un lote que ya se
+insertó (por ejemplo, si la aplicación se cerró antes de confirmarlo) no
+duplica filas. El índice es único en toda la tabla, así que los ids no pueden
+repetirse entre equipos: cada bitácora elige al crearse un número de equipo
+aleatorio de `BITS_EQUIPO` bits, que va en los bits altos del id, y en los
+`BITS_CONTADOR` bits bajos lleva un contador que crece de a uno por lectura.
+Con unos pocos equipos la probabilidad de que dos elijan el mismo número es
+del orden de una en un millón; el contador alcanza para 2**39 lecturas
+(más de ocho años a 2000 lecturas por segundo).
+
+`estado.json` guarda el número de equipo y el último id confirmado en la
+base; los segmentos confirmados por completo se borran.
+"""
+import json
+import os
+import secrets
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+RUTA_BITACORA = "bitacora"
+ARCHIVO_ESTADO = "estado.json"
+EXTENSION_SEGMENTO = ".seg"
+TAMANO_SEGMENTO = 4 * 1024 * 1024  # Bytes por segmento antes de rotar
+INTERVALO_FSYNC = 0.2              # Segundos de lecturas que puede perder un corte de luz
+ESPERA_MAX_REINTENTO = 30.0        # Segundos entre reintentos con la base caída
+BITS_EQUIPO = 24    # Número de equipo aleatorio en los bits altos del ingesta_id (sin el de signo)
+BITS_CONTADOR = 39  # Contador de lecturas de la bitácora en los bits bajos
+
+CABECERA = struct.Struct("<II")  # largo, crc32
+# fecha_us: fecha local sin zona en microsegundos, como datetime64[us]
+DTYPE_REGISTRO = np.dtype([("ingesta_id", "<i8"), ("fecha_us", "<i8"), ("corriente", "<f8"),
+                           ("potencia", "<f8"), ("artefacto_id", "<i4")])
+
+
+class Spool:
+    """Bitácora de lecturas en segmentos de disco.
+
+    Un solo productor agrega con `append` y un solo consumidor lee con `read`
+    y confirma con `ack`. `read` no avanza: la misma lectura se repite hasta
+    que se confirma, así un lote que falló se reintenta tal cual.
+    """
+
+    def __init__(self, directorio=RUTA_BITACORA, tamano_segmento=TAMANO_SEGMENTO):
+        os.makedirs(directorio, exist_ok=True)
+        self.directorio = directorio
+        self.tamano_segmento = tamano_segmento
+        self._lock = threading.Lock()
+        self.confirmado, self.equipo = self._load_state()
+        self.pendientes = 0
+        self.registros_corruptos = 0
+
+        # Recuperación: contar lo pendiente y recortar el final roto del último segmento
+        self._segmentos = sorted(int(nombre[:-len(EXTENSION_SEGMENTO)]) for nombre in os.listdir(directorio)
+                                 if nombre.endswith(EXTENSION_SEGMENTO))
+        ultimo_id = self.confirmado
+        for i, segmento in enumerate(list(self._segmentos)):
+            valido = 0
+            for fin, registros in self._records(segmento, 0):
+                valido = fin
+                self.pendientes += int((registros["ingesta_id"] > self.confirmado).sum())
+                ultimo_id = max(ultimo_id, int(registros["ingesta_id"][-1]))
+            if i == len(self._segmentos) - 1 and valido < os.path.getsize(self._path(segmento)):
+                with open(self._path(segmento), "r+b") as f:
+                    f.truncate(valido)
+            if valido == 0:
+                os.remove(self._path(segmento))
+                self._segmentos.remove(segmento)
+        if self.equipo is None:
+            # Sin estado: el equipo de los segmentos que queden o uno nuevo
+            self.equipo = (self._segmentos[0] >> BITS_CONTADOR if self._segmentos
+                           else 1 + secrets.randbelow(2 ** BITS_EQUIPO - 1))
+            self._save_state(sync=True)
+        self._siguiente = max(ultimo_id + 1, self.equipo << BITS_CONTADOR)
+        self._limite = (self.equipo + 1) << BITS_CONTADOR  # Primer id que ya no es de este equipo
+
+        self._fd = None        # Segmento abierto para agregar
+        self._escrito = 0      # Bytes completos del segmento abierto
+        self._sucio = False
+        self._lectura = (self._segmentos[0], 0) if self._segmentos else None
+
+    def _path(self, segmento):
+        return os.path.join(self.directorio, f"{segmento:020d}{EXTENSION_SEGMENTO}")
+
+    def _load_state(self):
+        """Devuelve (último id confirmado, número de equipo o None)."""
+        try:
+            with open(os.path.join(self.directorio, ARCHIVO_ESTADO), encoding="utf-8") as f:
+                estado = json.load(f)
+            return int(estado["confirmado"]), int(estado["equipo"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return 0, None
+
+    def _save_state(self, sync=False):
+        ruta = os.path.join(self.directorio, ARCHIVO_ESTADO)
+        with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"equipo": self.equipo, "confirmado": self.confirmado}, f)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(ruta + ".tmp", ruta)
+
+    def _records(self, segmento, desde, hasta=None):
+        """Recorre los registros válidos desde el byte `desde` (hasta `hasta`): (fin del registro, registros)."""
+        try:
+            f = open(self._path(segmento), "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(desde)
+            pos = desde
+            while hasta is None or pos + CABECERA.size <= hasta:
+                cabecera = f.read(CABECERA.size)
+                if len(cabecera) < CABECERA.size:
+                    return
+                largo, crc = CABECERA.unpack(cabecera)
+                cuerpo = f.read(largo)
+                if len(cuerpo) < largo:
+                    return  # Final incompleto: escritura cortada
+                if largo == 0 or largo % DTYPE_REGISTRO.itemsize or zlib.crc32(cuerpo) != crc:
+                    self.registros_corruptos += 1
+                    return  # Lo que sigue a un registro roto no es confiable
+                pos += CABECERA.size + largo
+                yield pos, np.frombuffer(cuerpo, DTYPE_REGISTRO)
+
+    def append(self, fechas, corrientes, potencias, artefacto_id):
+        """Agrega un bloque de lecturas (fechas datetime) y devuelve el último ingesta_id."""
+        registros = np.empty(len(fechas), DTYPE_REGISTRO)
+        registros["fecha_us"] = np.array(fechas, dtype="datetime64[us]").astype(np.int64)
+        registros["corriente"] = corrientes
+        registros["potencia"] = potencias
+        registros["artefacto_id"] = artefacto_id
+        with self._lock:
+            if self._siguiente + len(registros) > self._limite:
+                raise OSError(f"Se agotaron los ingesta_id del equipo {self.equipo}: "
+                              f"borre la bitácora vacía {self.directorio} para elegir otro equipo")
+            registros["ingesta_id"] = np.arange(self._siguiente, self._siguiente + len(registros))
+            cuerpo = registros.tobytes()
+            if self._fd is None:
+                segmento = self._siguiente
+                banderas = os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0)  # Sin traducir \n en Windows
+                self._fd = os.open(self._path(segmento), banderas, 0o644)
+                self._segmentos.append(segmento)
+                self._escrito = 0
+                if self._lectura is None:
+                    self._lectura = (segmento, 0)
+            os.write(self._fd, CABECERA.pack(len(cuerpo), zlib.crc32(cuerpo)) + cuerpo)
+            self._escrito += CABECERA.size + len(cuerpo)
+            self._sucio = True
+            self._siguiente += len(registros)
+            self.pendientes += len(registros)
+            if self._escrito >= self.tamano_segmento:
+                self._close_segment()
+            return self._siguiente - 1
+
+    def _close_segment(self):
+        os.fsync(self._fd)
+        os.close(self._fd)
+        self._fd = None
+        self._sucio = False
+
+    def sync(self):
+        """Lleva a disco lo agregado desde el último fsync."""
+        with self._lock:
+            if self._sucio:
+                os.fsync(self._fd)
+                self._sucio = False
+
+    def read(self, maximo):
+        """Lee registros sin confirmar hasta juntar unas `maximo` lecturas.
+
+        Devuelve (registros, posición) para pasar a `ack`; sin pendientes, los
+        registros están vacíos.
+        """
+        with self._lock:
+            posicion = self._lectura
+            segmentos = list(self._segmentos)
+            abierto = segmentos[-1] if self._fd is not None else None
+            escrito = self._escrito
+        partes, leidas = [], 0
+        while posicion is not None and leidas < maximo:
+            segmento, desde = posicion
+            hasta = escrito if segmento == abierto else None  # Solo registros completos del segmento abierto
+            for fin, registros in self._records(segmento, desde, hasta):
+                registros = registros[registros["ingesta_id"] > self.confirmado]
+                partes.append(registros)
+                leidas += len(registros)
+                posicion = (segmento, fin)
+                if leidas >= maximo:
+                    break
+            else:
+                # Segmento terminado: pasar al siguiente si ya no se le agrega nada
+                i = segmentos.index(segmento)
+                if segmento == abierto or i + 1 >= len(segmentos):
+                    break
+                posicion = (segmentos[i + 1], 0)
+        registros = np.concatenate(partes) if partes else np.empty(0, DTYPE_REGISTRO)
+        return registros, posicion
+
+    def ack(self, registros, posicion):
+        """Confirma que `registros` ya están en la base y borra los segmentos confirmados."""
+        if len(registros):
+            self.confirmado = max(self.confirmado, int(registros["ingesta_id"].max()))
+            # Sin fsync: perder una confirmación solo hace reenviar filas que la base ignora
+            self._save_state()
+        with self._lock:
+            self._lectura = posicion
+            self.pendientes -= len(registros)
+            abierto = self._segmentos[-1] if self._fd is not None else None
+            while self._segmentos and posicion is not None and self._segmentos[0] < posicion[0]:
+                os.remove(self._path(self._segmentos.pop(0)))
+            if (posicion is not None and self._segmentos == [posicion[0]] and posicion[0] != abierto
+                    and posicion[1] >= os.path.getsize(self._path(posicion[0]))):
+                # El único segmento que queda está cerrado y confirmado completo
+                os.remove(self._path(self._segmentos.pop(0)))
+                self._lectura = None
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                self._close_segment()
+
+
+class SpoolWriter(threading.Thread):
+    """Escritor de lecturas que pasa por la bitácora.
+
+    Tiene la misma interfaz que escritura.BatchWriter (`put`, `put_many`,
+    `flush`, `stop`, `estadisticas`): `put` solo agrega a la bitácora y el
+    hilo carga en la base lotes de hasta `batch_size` lecturas con
+    `backend.insert_spooled`. Si la base falla, reintenta con esperas
+    crecientes hasta `ESPERA_MAX_REINTENTO`; lo no cargado al cerrar queda en
+    la bitácora para la próxima vez.
+
+    Cada carga dura a lo sumo `INTERVALO_FSYNC` segundos: si la base es lenta
+    y las lecturas llegan tan rápido como se cargan, el hilo igual vuelve a
+    hacer el `fsync` a tiempo y a revisar si debe detenerse.
+    """
+
+    def __init__(self, connect, spool, batch_size=500, max_latencia=1.0, backend=None):
+        super().__init__(daemon=True)
+        if backend is None:
+            from almacenamiento import get_backend
+            backend = get_backend()
+        self.connect = connect
+        self.spool = spool
+        self.backend = backend
+        self.batch_size = batch_size
+        self.max_latencia = max_latencia
+
+        self._condicion = threading.Condition()
+        self._detener = False
+        self._plazo_detener = 0.0  # Hasta cuándo se intenta cargar lo pendiente al detenerse
+        self._forzar = False
+        self._conn = None
+
+        # Métricas
+        self.filas_escritas = 0
+        self.lotes_escritos = 0
+        self.filas_descartadas = 0
+        self.errores = 0
+        self.ultimo_lote_segundos = 0.0
+        self._tiempo_escritura = 0.0
+        self._inicio = time.monotonic()
+
+    def put(self, corriente, potencia, artefacto_id, fecha_hora=None):
+        """Agrega una lectura. La marca de tiempo se toma en el cliente si no se indica."""
+        self.put_many([fecha_hora or datetime.now()], [corriente], [potencia], artefacto_id)
+
+    def put_many(self, fechas, corrientes, potencias, artefacto_id):
+        """Agrega un bloque de lecturas de un artefacto a la bitácora."""
+        if not len(fechas):
+            return
+        antes = self.spool.pendientes
+        try:
+            self.spool.append(fechas, corrientes, potencias, artefacto_id)
+        except OSError as e:  # Disco lleno o sin permisos: no detener la adquisición
+            self.errores += 1
+            self.filas_descartadas += len(fechas)
+            print(f"Error al escribir en la bitácora de lecturas: {e}")
+            return
+        if antes < self.batch_size <= self.spool.pendientes:
+            with self._condicion:
+                self._condicion.notify()
+
+    def run(self):
+        """Bucle del hilo: agrupa los fsync y carga en la base lo pendiente de la bitácora."""
+        espera_error = self.max_latencia
+        reintentar_en = 0.0
+        ultimo_lote = time.monotonic()
+        atrasado = False  # La última carga agotó su plazo con lecturas pendientes
+        while True:
+            with self._condicion:
+                if not self._detener and not atrasado:
+                    self._condicion.wait(min(INTERVALO_FSYNC, self.max_latencia))
+                detener, forzar = self._detener, self._forzar
+            self.spool.sync()
+            ahora = time.monotonic()
+            listo = (atrasado or self.spool.pendientes >= self.batch_size or forzar or detener
+                     or ahora - ultimo_lote >= self.max_latencia)
+            atrasado = False
+            if listo and (ahora >= reintentar_en or detener):
+                ultimo_lote = ahora
+                cargado = self._drain(self._plazo_detener if detener else ahora + INTERVALO_FSYNC)
+                if cargado is None:
+                    atrasado = True
+                elif cargado:
+                    espera_error = self.max_latencia
+                    with self._condicion:
+                        self._forzar = False
+                        self._condicion.notify_all()
+                else:
+                    # Base caída: esperar cada vez más antes de reintentar
+                    reintentar_en = time.monotonic() + espera_error
+                    espera_error = min(2 * espera_error, ESPERA_MAX_REINTENTO)
+            if detener:
+                break  # Lo que no se pudo cargar queda en la bitácora
+        self.spool.close()
+        self._cerrar_conexion()
+
+    def _drain(self, plazo):
+        """Carga lotes hasta vaciar la bitácora o hasta el instante `plazo` (de `time.monotonic`).
+
+        Devuelve True si la bitácora quedó vacía, None si se acabó el plazo con
+        lecturas pendientes y False si la base falló.
+        """
+        while True:
+            if time.monotonic() >= plazo:
+                return None
+            registros, posicion = self.spool.read(self.batch_size)
+            if not len(registros):
+                self.spool.ack(registros, posicion)  # Borra los segmentos ya recorridos
+                return True
+            inicio = time.perf_counter()
+            filas = list(zip(registros["fecha_us"].astype("datetime64[us]").astype(object),
+                             registros["corriente"].tolist(), registros["potencia"].tolist(),
+                             registros["artefacto_id"].tolist(), registros["ingesta_id"].tolist()))
+            try:
+                if self._conn is None:
+                    self._conn = self.connect()
+                self.backend.insert_spooled(self._conn, filas)
+                self._conn.commit()
+            except Exception as e:
+                self.errores += 1
+                print(f"Error al guardar lecturas en la base de datos: {e}")
+                self._cerrar_conexion()
+                return False
+            self.spool.ack(registros, posicion)
+            self.ultimo_lote_segundos = time.perf_counter() - inicio
+            self._tiempo_escritura += self.ultimo_lote_segundos
+            self.filas_escritas += len(registros)
+            self.lotes_escritos += 1
+
+    def _cerrar_conexion(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception as e:
+                print(f"Error al cerrar la conexión: {e}")
+            self._conn = None
+
+    def flush(self, timeout=5.0):
+        """Espera a que se carguen en la base las lecturas agregadas hasta ahora."""
+        limite = time.monotonic() + timeout
+        with self._condicion:
+            self._forzar = True
+            self._condicion.notify_all()
+            while self.spool.pendientes and time.monotonic() < limite:
+                self._condicion.wait(min(0.05, limite - time.monotonic()))
+                self._forzar = True
+            return not self.spool.pendientes
+
+    def stop(self, timeout=10.0):
+        """Intenta cargar lo pendiente y detiene el hilo.
+
+        Se carga durante la mitad de `timeout`; la otra mitad queda para el lote
+        en curso y el cierre.
+        """
+        with self._condicion:
+            self._plazo_detener = time.monotonic() + timeout / 2
+            self._detener = True
+            self._condicion.notify_all()
+        if self.is_alive():
+            self.join(timeout)
+        else:
+            self.spool.close()
+
+    def estadisticas(self):
+        """Métricas de escritura: filas, lotes, pendientes en la bitácora y filas por segundo."""
+        transcurrido = time.monotonic() - self._inicio
+        return {
+            "filas": self.filas_escritas,
+            "lotes": self.lotes_escritos,
+            "pendientes": self.spool.pendientes,
+            "descartadas": self.filas_descartadas,
+            "errores": self.errores,
+            "filas_por_segundo": self.filas_escritas / transcurrido if transcurrido else 0.0,
+            "filas_por_segundo_escritura": (self.filas_escritas / self._tiempo_escritura
+                                            if self._tiempo_escritura else 0.0),
+            "ultimo_lote_segundos": self.ultimo_lote_segundos,
+        }
@@ -0,0 +1,126 @@
+"""Catálogo de artefactos compartido por todos los paneles.
+
+Los artefactos casi no cambian, pero cada panel los consultaba al abrirse
+(y el monitoreo en tiempo real cada vez que se volvía a él). El catálogo los
+carga una vez y los sirve desde memoria, por id o por nombre.
+
+Pasados `TTL_CATALOGO` segundos se comprueba si cambiaron: si el backend
+define `sql_version_artefactos` (en SQL Server, una suma de verificación de la
+tabla) se consulta solo esa versión y la lista se recarga únicamente si es
+distinta; si no, se recarga la lista completa. `invalidate()` fuerza la
+recarga en el próximo uso, por ejemplo tras registrar un artefacto.
+"""
+import threading
+import time
+
+SQL_ARTEFACTOS = "SELECT id, nombre FROM artefactos"
+TTL_CATALOGO = 60.0  # Segundos durante los que el catálogo se usa sin comprobar la base
+
+
+class ArtefactoCatalog:
+    """Lista de artefactos (id, nombre) en memoria con verificación periódica de cambios.
+
+    `connect` devuelve una conexión (por defecto, del pool de basedatos.py);
+    los métodos aceptan además una conexión ya abierta, que no se cierra.
+    """
+
+    def __init__(self, backend=None, connect=None, ttl=TTL_CATALOGO):
+        self.backend = backend
+        self.connect = connect
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._artefactos = None  # [(id, nombre)] ordenados por id
+        self._por_id = {}
+        self._por_nombre = {}
+        self._version = None
+        self._verificado = 0.0
+
+        # Métricas
+        self.cargas = 0
+        self.verificaciones = 0
+
+    def all(self, conn=None):
+        """Devuelve [(id, nombre)] ordenados por id."""
+        self._refresh(conn)
+        return list(self._artefactos)
+
+    def name_of(self, artefacto_id, conn=None):
+        """Nombre del artefacto, o None si no existe."""
+        self._refresh(conn)
+        return self._por_id.get(artefacto_id)
+
+    def id_of(self, nombre, conn=None):
+        """Id del artefacto con ese nombre, o None si no existe."""
+        self._refresh(conn)
+        return self._por_nombre.get(nombre)
+
+    def invalidate(self):
+        """Recarga la lista completa en el próximo uso."""
+        with self._lock:
+            self._artefactos = None
+
+    def _refresh(self, conn):
+        with self._lock:
+            if self._artefactos is not None and time.monotonic() - self._verificado < self.ttl:
+                return
+            propia = conn is None
+            try:
+                if propia:
+                    conn = self._connect()
+                sql_version = getattr(self._get_backend(), "sql_version_artefactos", None)
+                version = None
+                if sql_version:
+                    version = tuple(self._query(conn, sql_version)[0])
+                    self.verificaciones += 1
+                if self._artefactos is None or version is None or version != self._version:
+                    self._load(self._query(conn, SQL_ARTEFACTOS))
+                    self._version = version
+            except Exception as e:
+                if self._artefactos is None:
+                    raise
+                # Con la base caída se sigue usando la última lista
+                print(f"No se pudo verificar el catálogo de artefactos: {e}")
+            finally:
+                if propia and conn is not None:
+                    conn.close()
+            self._verificado = time.monotonic()
+
+    def _load(self, filas):
+        self._artefactos = sorted((artefacto_id, nombre) for artefacto_id, nombre in filas)
+        self._por_id = dict(self._artefactos)
+        self._por_nombre = {nombre: artefacto_id for artefacto_id, nombre in self._artefactos}
+        self.cargas += 1
+
+    @staticmethod
+    def _query(conn, sql):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def _connect(self):
+        if self.connect is None:
+            from basedatos import get_connection
+            return get_connection()
+        return self.connect()
+
+    def _get_backend(self):
+        if self.backend is None:
+            from almacenamiento import get_backend
+            return get_backend()
+        return self.backend
+
+
+_catalogo = None
+_catalogo_lock = threading.Lock()
+
+
+def get_catalog():
+    """Devuelve el catálogo compartido de la aplicación, creándolo la primera vez."""
+    global _catalogo
+    with _catalogo_lock:
+        if _catalogo is None:
+            _catalogo = ArtefactoCatalog()
+        return _catalogo
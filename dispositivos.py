@@ -0,0 +1,126 @@
+"""Asignación de artefactos a puertos serie y lectores concurrentes.
+
+Cada Arduino se conecta a un puerto y mide el artefacto enchufado a él. La
+asignación se configura en `dispositivos.json`:
+
+    {"dispositivos": [
+        {"artefacto_id": 1, "puerto": "COM7", "baudrate": 9600},
+        {"artefacto_id": 2, "puerto": "COM8"},
+        {"artefacto_id": 3, "puerto": "COM9", "protocolo": "binario"}]}
+
+Los artefactos sin entrada usan `PUERTO_POR_DEFECTO`. `protocolo` es "texto"
+(por defecto) o "binario" (tramas con CRC, ver adquisicion.py); los que usan
+el binario van por defecto a `BAUDRATE_BINARIO`. Un puerto solo puede
+medir un artefacto a la vez, pero puertos distintos se leen a la vez, cada uno
+con su propio `SerialReader` (un hilo por puerto).
+"""
+import json
+import os
+import threading
+
+RUTA_DISPOSITIVOS = "dispositivos.json"
+PUERTO_POR_DEFECTO = "COM7"
+BAUDRATE_POR_DEFECTO = 9600
+BAUDRATE_BINARIO = 230400
+PROTOCOLO_POR_DEFECTO = "texto"
+
+
+class DeviceConfig:
+    """Puerto, velocidad y protocolo de cada artefacto."""
+
+    def __init__(self, dispositivos=(), puerto_por_defecto=PUERTO_POR_DEFECTO, baudrate=BAUDRATE_POR_DEFECTO):
+        self.puerto_por_defecto = puerto_por_defecto
+        self.baudrate = baudrate
+        self._puertos = {}
+        self._protocolos = {}
+        for d in dispositivos:
+            artefacto_id = int(d["artefacto_id"])
+            protocolo = d.get("protocolo", PROTOCOLO_POR_DEFECTO)
+            por_defecto = BAUDRATE_BINARIO if protocolo == "binario" else baudrate
+            self._puertos[artefacto_id] = (d["puerto"], int(d.get("baudrate", por_defecto)))
+            self._protocolos[artefacto_id] = protocolo
+
+    @classmethod
+    def load(cls, ruta=RUTA_DISPOSITIVOS):
+        """Lee la asignación de `ruta`; si no existe, todos los artefactos usan el puerto por defecto."""
+        if not os.path.exists(ruta):
+            return cls()
+        with open(ruta, encoding="utf-8") as f:
+            config = json.load(f)
+        return cls(config.get("dispositivos", ()), config.get("puerto_por_defecto", PUERTO_POR_DEFECTO),
+                   config.get("baudrate", BAUDRATE_POR_DEFECTO))
+
+    def port_of(self, artefacto_id):
+        """(puerto, baudrate) del artefacto."""
+        return self._puertos.get(artefacto_id, (self.puerto_por_defecto, self.baudrate))
+
+    def protocol_of(self, artefacto_id):
+        """Protocolo serie del artefacto: "texto" o "binario"."""
+        return self._protocolos.get(artefacto_id, PROTOCOLO_POR_DEFECTO)
+
+
+class DeviceManager:
+    """Abre y cierra los lectores de cada puerto según los artefactos encendidos.
+
+    `abrir(puerto, baudrate, protocolo)` devuelve un lector sin iniciar (por defecto
+    `SerialReader.abrir`). Encender un artefacto cuyo puerto está midiendo otro
+    apaga primero a ese otro.
+    """
+
+    def __init__(self, config=None, abrir=None):
+        self.config = config or DeviceConfig.load()
+        if abrir is None:
+            from adquisicion import SerialReader  # Importa pyserial solo al conectarse
+            abrir = SerialReader.abrir
+        self._abrir = abrir
+        self._lectores = {}  # artefacto_id -> lector
+        self._lock = threading.Lock()
+
+    def start(self, artefacto_id):
+        """Enciende el artefacto: abre su puerto y arranca el hilo lector.
+
+        Devuelve el id del artefacto que se apagó por compartir el puerto (o
+        None). Lanza la excepción de `abrir` si el puerto no está disponible;
+        como para entonces el otro ya se apagó, su id queda en el atributo
+        `desplazado` de la excepción (None si no había otro).
+        """
+        puerto, baudrate = self.config.port_of(artefacto_id)
+        with self._lock:
+            if artefacto_id in self._lectores:
+                return None
+            desplazado = next((otro for otro in self._lectores
+                               if self.config.port_of(otro)[0] == puerto), None)
+            if desplazado is not None:
+                self._lectores.pop(desplazado).stop()  # Libera el puerto antes de reabrirlo
+            try:
+                lector = self._abrir(puerto, baudrate, protocolo=self.config.protocol_of(artefacto_id))
+            except Exception as e:
+                e.desplazado = desplazado
+                raise
+            lector.start()
+            self._lectores[artefacto_id] = lector
+        return desplazado
+
+    def stop(self, artefacto_id):
+        """Apaga el artefacto y cierra su puerto."""
+        with self._lock:
+            lector = self._lectores.pop(artefacto_id, None)
+        if lector is not None:
+            lector.stop()
+
+    def stop_all(self):
+        with self._lock:
+            lectores, self._lectores = list(self._lectores.values()), {}
+        for lector in lectores:
+            lector.stop()
+
+    def reader(self, artefacto_id):
+        return self._lectores.get(artefacto_id)
+
+    def active(self):
+        """Artefactos encendidos con su lector, en el orden en que se encendieron."""
+        with self._lock:
+            return dict(self._lectores)
+
+    def is_active(self, artefacto_id):
+        return artefacto_id in self._lectores
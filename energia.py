@@ -0,0 +1,275 @@
+"""Consumo de energía (kWh) y costo por artefacto.
+
+La energía se integra con la regla del trapecio sobre lecturas consecutivas,
+de forma vectorizada (`interval_energy`); los intervalos más largos que
+`MAX_HUECO_SEGUNDOS` se tratan como cortes (equipo apagado o sin datos) y no
+suman energía. Esa integración la hace agregados.py al calcular los minutos.
+
+Los reportes parten de los agregados por minuto: cada minuto se asigna a una
+franja tarifaria según su hora y se acumulan kWh por día y franja. Ese
+acumulado se guarda en `energia_estado.npz` junto con el último día procesado
+de cada artefacto, así cada reporte solo lee los minutos nuevos (y los días
+de lecturas que la bitácora local cargó tarde, que se detectan por el id de
+`Lecturas` hasta el que llegan los agregados). Los totales
+por semana y por mes se obtienen agrupando los días con NumPy.
+
+Las franjas se configuran en `tarifas.json`:
+
+    {"moneda": "S/", "franjas": [
+        {"nombre": "Punta", "desde": "18:00", "hasta": "23:00", "precio_kwh": 0.85},
+        {"nombre": "Fuera de punta", "desde": "23:00", "hasta": "18:00", "precio_kwh": 0.65}]}
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+MAX_HUECO_SEGUNDOS = 60
+RUTA_TARIFAS = "tarifas.json"
+RUTA_ESTADO = "energia_estado.npz"
+TARIFAS_POR_DEFECTO = {
+    "moneda": "S/",
+    "franjas": [{"nombre": "Única", "desde": "00:00", "hasta": "00:00", "precio_kwh": 0.75}],
+}
+DIAS_POR_CONSULTA = 31
+PERIODOS = ("dia", "semana", "mes")
+
+
+def interval_energy(tiempos, potencias, previo=None, max_hueco=MAX_HUECO_SEGUNDOS):
+    """Energía (Wh) de cada intervalo entre una lectura y la anterior.
+
+    `tiempos` en segundos y ordenados; `previo` es la lectura (tiempo, potencia)
+    anterior a la primera, si se conoce. El resultado tiene un valor por
+    lectura: el del intervalo que termina en ella (0 en cortes y en la primera
+    sin `previo`).
+    """
+    tiempos = np.asarray(tiempos, dtype=np.float64)
+    potencias = np.asarray(potencias, dtype=np.float64)
+    t_izq = np.r_[np.nan if previo is None else previo[0], tiempos[:-1]]
+    p_izq = np.r_[np.nan if previo is None else previo[1], potencias[:-1]]
+    dt = tiempos - t_izq
+    return np.where((dt > 0) & (dt <= max_hueco), (potencias + p_izq) / 2 * dt / 3600, 0.0)
+
+
+# Tarifas
+
+def _minuto_del_dia(texto):
+    horas, minutos = map(int, texto.split(":"))
+    return 60 * horas + minutos
+
+
+class TariffSchedule:
+    """Franjas horarias con su precio por kWh."""
+
+    def __init__(self, franjas, moneda="S/"):
+        if not franjas:
+            raise ValueError("Debe haber al menos una franja tarifaria.")
+        self.nombres = [f["nombre"] for f in franjas]
+        self.precios = np.array([f["precio_kwh"] for f in franjas], dtype=np.float64)
+        self.moneda = moneda
+        # Franja de cada minuto del día; las franjas pueden cruzar la medianoche
+        self.por_minuto = np.full(1440, -1, dtype=np.int64)
+        for i, f in enumerate(franjas):
+            inicio, fin = _minuto_del_dia(f["desde"]), _minuto_del_dia(f["hasta"])
+            minutos = np.arange(inicio, fin if fin > inicio else fin + 1440) % 1440
+            self.por_minuto[minutos] = i
+        if np.any(self.por_minuto < 0):
+            raise ValueError("Las franjas tarifarias no cubren las 24 horas.")
+        # Solo los horarios cambian la asignación de minutos; los precios no
+        self.firma = hashlib.sha256(self.por_minuto.tobytes()).hexdigest()[:16]
+
+    @classmethod
+    def load(cls, ruta=RUTA_TARIFAS):
+        """Lee las franjas de `ruta`; si no existe, se usa una tarifa única."""
+        config = TARIFAS_POR_DEFECTO
+        if os.path.exists(ruta):
+            with open(ruta, encoding="utf-8") as f:
+                config = json.load(f)
+        return cls(config["franjas"], config.get("moneda", "S/"))
+
+    def band_of(self, segundos):
+        """Franja de cada marca de tiempo (segundos en hora local)."""
+        minuto = (np.asarray(segundos, dtype=np.float64) // 60).astype(np.int64) % 1440
+        return self.por_minuto[minuto]
+
+
+# Acumulado diario por franja
+
+class EnergyLedger:
+    """kWh por artefacto, día y franja, con el último día procesado de cada artefacto.
+
+    `dias[id]` son días (datetime64[D]) ordenados y `kwh[id]` una matriz
+    (días, franjas). El último día de cada artefacto se vuelve a calcular en
+    la siguiente actualización, porque puede estar incompleto. `ultimo_id` es
+    el último id de Lecturas ya incorporado (None si se desconoce).
+    """
+
+    def __init__(self, firma_tarifa):
+        self.firma_tarifa = firma_tarifa
+        self.dias = {}
+        self.kwh = {}
+        self.ultimo_id = None
+
+    @classmethod
+    def load(cls, tarifa, ruta=RUTA_ESTADO):
+        """Lee el acumulado; si no existe o se calculó con otras franjas, empieza de cero."""
+        ledger = cls(tarifa.firma)
+        if not os.path.exists(ruta):
+            return ledger
+        with np.load(ruta) as estado:
+            if str(estado["firma_tarifa"]) != tarifa.firma:
+                return ledger
+            if "ultimo_id" in estado.files and int(estado["ultimo_id"]) >= 0:
+                ledger.ultimo_id = int(estado["ultimo_id"])
+            for clave in estado.files:
+                if clave.startswith("dias_"):
+                    artefacto_id = int(clave[5:])
+                    ledger.dias[artefacto_id] = estado[clave]
+                    ledger.kwh[artefacto_id] = estado[f"kwh_{artefacto_id}"]
+        return ledger
+
+    def save(self, ruta=RUTA_ESTADO):
+        """Guarda el acumulado de forma atómica."""
+        temporal = ruta + ".tmp.npz"
+        columnas = {"firma_tarifa": self.firma_tarifa, "ultimo_id": -1 if self.ultimo_id is None else self.ultimo_id}
+        for artefacto_id in self.dias:
+            columnas[f"dias_{artefacto_id}"] = self.dias[artefacto_id]
+            columnas[f"kwh_{artefacto_id}"] = self.kwh[artefacto_id]
+        np.savez(temporal, **columnas)
+        os.replace(temporal, ruta)
+
+    def last_day(self, artefacto_id):
+        dias = self.dias.get(artefacto_id)
+        return dias[-1] if dias is not None and len(dias) else None
+
+    def merge(self, artefacto_id, dias, kwh):
+        """Reemplaza los días desde el primero de `dias` con los valores nuevos."""
+        anteriores = self.dias.get(artefacto_id)
+        if anteriores is not None and len(dias):
+            conservar = anteriores < dias[0]
+            dias = np.r_[anteriores[conservar], dias]
+            kwh = np.vstack((self.kwh[artefacto_id][conservar], kwh))
+        elif anteriores is not None:
+            return
+        self.dias[artefacto_id] = dias
+        self.kwh[artefacto_id] = kwh
+
+
+def daily_band_energy(segundos, energia_wh, tarifa):
+    """Suma la energía de cada minuto por (día, franja). Devuelve (días, kWh (días, franjas))."""
+    segundos = np.asarray(segundos, dtype=np.float64)
+    if len(segundos) == 0:
+        return np.empty(0, dtype="datetime64[D]"), np.empty((0, len(tarifa.nombres)))
+    dia = (segundos // 86400).astype(np.int64)
+    dias, fila = np.unique(dia, return_inverse=True)
+    kwh = np.zeros((len(dias), len(tarifa.nombres)))
+    np.add.at(kwh, (fila, tarifa.band_of(segundos)), np.asarray(energia_wh) / 1000)
+    return dias.astype("datetime64[D]"), kwh
+
+
+def _first_minute(conn, artefacto_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(periodo) FROM Agregados_Minuto WHERE artefacto_id = ?", (artefacto_id,))
+    primero = cursor.fetchone()[0]
+    cursor.close()
+    # SQLite devuelve MIN() como texto porque el resultado no tiene tipo declarado
+    return datetime.fromisoformat(primero) if isinstance(primero, str) else primero
+
+
+def update_ledger(conn, ledger, tarifa, artefacto_ids, progress=None, cancelled=None):
+    """Incorpora al acumulado los minutos nuevos de cada artefacto.
+
+    Lee de Agregados_Minuto desde el último día procesado (inclusive) en
+    tramos de DIAS_POR_CONSULTA días, así un historial de años se procesa en
+    memoria acotada y las siguientes veces solo se lee desde el día en curso.
+    Si los agregados incorporaron lecturas insertadas tarde con fecha anterior
+    a ese día, se vuelve a leer desde el día de la más antigua. Devuelve la
+    cantidad de minutos leídos, o None si se canceló.
+    """
+    from agregados import MINUTO, fetch_level, id_watermark  # agregados importa este módulo
+    from historial import inserted_since
+
+    hasta_id = id_watermark(conn, artefacto_ids)  # Lecturas que ya están en los agregados
+    tardias = inserted_since(conn, ledger.ultimo_id, hasta_id)
+    leidos = 0
+    hasta = datetime.now() + timedelta(days=1)
+    for n, artefacto_id in enumerate(artefacto_ids):
+        ultimo = ledger.last_day(artefacto_id)
+        desde = ultimo.astype(datetime) if ultimo is not None else _first_minute(conn, artefacto_id)
+        tardia = tardias.get(artefacto_id)
+        if desde is not None:
+            if tardia is not None:
+                desde = min(datetime(desde.year, desde.month, desde.day), tardia)
+            desde = datetime(desde.year, desde.month, desde.day)
+            cursor = conn.cursor()
+            try:
+                while desde < hasta:
+                    if cancelled and cancelled():
+                        return None
+                    fin = desde + timedelta(days=DIAS_POR_CONSULTA)
+                    filas = fetch_level(cursor, MINUTO, artefacto_id, desde, fin)
+                    ledger.merge(artefacto_id, *daily_band_energy(filas[:, 0], filas[:, 6], tarifa))
+                    leidos += len(filas)
+                    desde = fin
+            finally:
+                cursor.close()
+        if progress:
+            progress(n + 1, len(artefacto_ids))
+    if hasta_id is not None:
+        ledger.ultimo_id = hasta_id
+    return leidos
+
+
+# Reportes
+
+def _period_start(dias, periodo):
+    """Inicio del periodo (día, semana desde el lunes o mes) de cada día."""
+    if periodo == "dia":
+        return dias
+    if periodo == "semana":
+        numero = dias.astype(np.int64)
+        return (numero - (numero + 3) % 7).astype("datetime64[D]")  # 1970-01-01 fue jueves
+    if periodo == "mes":
+        return dias.astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"Periodo desconocido: {periodo}")
+
+
+class EnergyReport:
+    """kWh y costo por artefacto y periodo, separados por franja."""
+
+    def __init__(self, tarifa, periodo, filas):
+        self.tarifa = tarifa
+        self.periodo = periodo
+        # Filas: (artefacto_id, inicio del periodo, kWh por franja)
+        self.artefacto_ids = np.array([f[0] for f in filas], dtype=np.int64)
+        self.periodos = np.array([f[1] for f in filas], dtype="datetime64[D]")
+        self.kwh_franjas = np.array([f[2] for f in filas], dtype=np.float64).reshape(-1, len(tarifa.nombres))
+        self.kwh = self.kwh_franjas.sum(axis=1)
+        self.costo = self.kwh_franjas @ tarifa.precios
+
+    def total_kwh(self):
+        return float(self.kwh.sum())
+
+    def total_cost(self):
+        return float(self.costo.sum())
+
+
+def build_report(ledger, tarifa, artefacto_ids, desde, hasta, periodo="dia"):
+    """Agrupa el acumulado de [desde, hasta) por día, semana o mes."""
+    d0, d1 = np.datetime64(desde, "D"), np.datetime64(hasta, "D")
+    filas = []
+    for artefacto_id in sorted(set(artefacto_ids)):
+        dias = ledger.dias.get(artefacto_id)
+        if dias is None:
+            continue
+        dentro = (dias >= d0) & (dias < d1)
+        inicios = _period_start(dias[dentro], periodo)
+        if len(inicios) == 0:
+            continue
+        unicos, grupo = np.unique(inicios, return_inverse=True)
+        kwh = np.zeros((len(unicos), len(tarifa.nombres)))
+        np.add.at(kwh, grupo, ledger.kwh[artefacto_id][dentro])
+        filas.extend((artefacto_id, inicio, valores) for inicio, valores in zip(unicos, kwh))
+    return EnergyReport(tarifa, periodo, filas)
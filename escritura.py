@@ -0,0 +1,182 @@
+"""Escritura diferida (write-behind) de las lecturas en la base de datos.
+
+Las lecturas se encolan con su marca de tiempo del cliente y un hilo de fondo
+las inserta por lotes con `executemany`, en lugar de abrir una conexión y hacer
+un INSERT + commit por cada muestra.
+"""
+import collections
+import threading
+import time
+from datetime import datetime
+
+INSERT_LECTURAS = """
+    INSERT INTO Lecturas (fecha_hora, corriente, potencia, artefacto_id)
+    VALUES (?, ?, ?, ?)
+"""
+
+
+class BatchWriter(threading.Thread):
+    """Hilo que acumula lecturas y las inserta por lotes.
+
+    Un lote se escribe cuando se juntan `batch_size` lecturas o cuando la más
+    antigua lleva `max_latencia` segundos esperando, lo que ocurra primero.
+    `connect` es una función que devuelve una conexión DB-API nueva; si se
+    indica `backend` (ver almacenamiento.py), los lotes se insertan con
+    `backend.insert_readings`.
+    """
+
+    def __init__(self, connect, batch_size=500, max_latencia=1.0, max_pendientes=100000, backend=None):
+        super().__init__(daemon=True)
+        self.connect = connect
+        self.backend = backend
+        self.batch_size = batch_size
+        self.max_latencia = max_latencia
+        self.max_pendientes = max_pendientes
+
+        self._pendientes = collections.deque()
+        self._condicion = threading.Condition()
+        self._detener = False
+        self._forzar = False
+        self._en_vuelo = 0
+        self._conn = None
+
+        # Métricas
+        self.filas_escritas = 0
+        self.lotes_escritos = 0
+        self.filas_descartadas = 0
+        self.errores = 0
+        self.ultimo_lote_segundos = 0.0
+        self._tiempo_escritura = 0.0
+        self._inicio = time.monotonic()
+
+    def put(self, corriente, potencia, artefacto_id, fecha_hora=None):
+        """Encola una lectura. La marca de tiempo se toma en el cliente si no se indica."""
+        fila = (fecha_hora or datetime.now(), float(corriente), float(potencia), artefacto_id)
+        with self._condicion:
+            if len(self._pendientes) >= self.max_pendientes:
+                self._pendientes.popleft()  # Se pierde la más antigua para acotar la memoria
+                self.filas_descartadas += 1
+            self._pendientes.append((time.monotonic(), fila))
+            if len(self._pendientes) >= self.batch_size:
+                self._condicion.notify()
+
+    def put_many(self, fechas, corrientes, potencias, artefacto_id):
+        """Encola un bloque de lecturas de un artefacto tomando el lock una sola vez."""
+        ahora = time.monotonic()
+        filas = [(ahora, (fecha, float(c), float(p), artefacto_id))
+                 for fecha, c, p in zip(fechas, corrientes, potencias)]
+        with self._condicion:
+            exceso = len(self._pendientes) + len(filas) - self.max_pendientes
+            for _ in range(min(max(exceso, 0), len(self._pendientes))):
+                self._pendientes.popleft()  # Se pierden las más antiguas para acotar la memoria
+                self.filas_descartadas += 1
+            self._pendientes.extend(filas[-self.max_pendientes:])
+            self.filas_descartadas += max(len(filas) - self.max_pendientes, 0)
+            if len(self._pendientes) >= self.batch_size:
+                self._condicion.notify()
+
+    def run(self):
+        """Bucle del hilo: espera a que se cumpla el tamaño o la latencia y escribe el lote."""
+        while True:
+            with self._condicion:
+                while not self._detener and not self._lote_listo():
+                    espera = self.max_latencia
+                    if self._pendientes:
+                        espera = max(0.0, self._pendientes[0][0] + self.max_latencia - time.monotonic())
+                    self._condicion.wait(espera)
+                if self._detener and not self._pendientes:
+                    break
+                lote = [self._pendientes.popleft()[1]
+                        for _ in range(min(self.batch_size, len(self._pendientes)))]
+                if not self._pendientes:
+                    self._forzar = False
+                self._en_vuelo = len(lote)
+            self._escribir(lote)
+            with self._condicion:
+                self._en_vuelo = 0
+                self._condicion.notify_all()
+        self._cerrar_conexion()
+
+    def _lote_listo(self):
+        if len(self._pendientes) >= self.batch_size or (self._forzar and self._pendientes):
+            return True
+        return bool(self._pendientes) and time.monotonic() - self._pendientes[0][0] >= self.max_latencia
+
+    def _escribir(self, lote):
+        """Inserta un lote; si falla, lo devuelve a la cola para reintentarlo."""
+        inicio = time.perf_counter()
+        try:
+            if self._conn is None:
+                self._conn = self.connect()
+            if self.backend is not None:
+                self.backend.insert_readings(self._conn, lote)
+            else:
+                cursor = self._conn.cursor()
+                try:
+                    cursor.fast_executemany = True  # Envía el lote en un solo viaje (pyodbc)
+                except AttributeError:
+                    pass
+                cursor.executemany(INSERT_LECTURAS, lote)
+                cursor.close()
+            self._conn.commit()
+        except Exception as e:
+            self.errores += 1
+            print(f"Error al guardar lecturas en la base de datos: {e}")
+            self._cerrar_conexion()
+            with self._condicion:
+                ahora = time.monotonic()
+                self._pendientes.extendleft((ahora, fila) for fila in reversed(lote))
+                # Pausa breve para no reintentar en bucle contra un servidor caído
+                if not self._detener:
+                    self._condicion.wait(self.max_latencia)
+                else:
+                    # Al cerrar no se reintenta indefinidamente
+                    self.filas_descartadas += len(self._pendientes)
+                    self._pendientes.clear()
+            return
+
+        self.ultimo_lote_segundos = time.perf_counter() - inicio
+        self._tiempo_escritura += self.ultimo_lote_segundos
+        self.filas_escritas += len(lote)
+        self.lotes_escritos += 1
+
+    def _cerrar_conexion(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception as e:
+                print(f"Error al cerrar la conexión: {e}")
+            self._conn = None
+
+    def flush(self, timeout=5.0):
+        """Espera a que se escriban las lecturas encoladas hasta ahora."""
+        limite = time.monotonic() + timeout
+        with self._condicion:
+            self._forzar = True
+            self._condicion.notify_all()
+            while (self._pendientes or self._en_vuelo) and time.monotonic() < limite:
+                self._condicion.wait(limite - time.monotonic())
+            return not (self._pendientes or self._en_vuelo)
+
+    def stop(self, timeout=10.0):
+        """Vacía la cola y detiene el hilo."""
+        with self._condicion:
+            self._detener = True
+            self._condicion.notify_all()
+        if self.is_alive():
+            self.join(timeout)
+
+    def estadisticas(self):
+        """Métricas de escritura: filas, lotes, pendientes y filas por segundo."""
+        transcurrido = time.monotonic() - self._inicio
+        return {
+            "filas": self.filas_escritas,
+            "lotes": self.lotes_escritos,
+            "pendientes": len(self._pendientes),
+            "descartadas": self.filas_descartadas,
+            "errores": self.errores,
+            "filas_por_segundo": self.filas_escritas / transcurrido if transcurrido else 0.0,
+            "filas_por_segundo_escritura": (self.filas_escritas / self._tiempo_escritura
+                                            if self._tiempo_escritura else 0.0),
+            "ultimo_lote_segundos": self.ultimo_lote_segundos,
+        }
@@ -0,0 +1,155 @@
+"""Consultas paginadas del historial de lecturas.
+
+Las páginas se piden con paginación por clave (keyset) sobre
+(artefacto_id, fecha_hora, id) y rangos semiabiertos [desde, hasta), de modo que
+cada página es una sola búsqueda en el índice
+`IX_Lecturas_artefacto_fecha` (ver migraciones/001_indice_lecturas_artefacto_fecha.sql)
+sin importar cuántos meses se hayan recorrido antes. Nunca se usa
+`CAST(fecha_hora AS DATE)` ni OFFSET, que obligan a recorrer la tabla.
+
+`last_reading_id` e `inserted_since` permiten a los procesos incrementales
+(agregados, archivo local, reservorio de entrenamiento, acumulado de energía)
+detectar lecturas insertadas tarde, por ejemplo las que la bitácora local
+recarga tras una caída de la base con su fecha_hora original, anterior a la
+marca de agua de esos procesos. Cada proceso guarda además el último id de
+`Lecturas` que vio; los ids crecen en el orden de inserción.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+TAMANO_PAGINA = 2000
+ID_INICIAL = -1  # Menor que cualquier id: la primera página incluye las lecturas en `desde`
+
+# Parámetros: artefacto_id, última fecha_hora, última fecha_hora, último id, hasta, cantidad de filas.
+# El id desempata las lecturas con la misma marca de tiempo: sin él, SQL Server
+# no garantiza el mismo orden entre una consulta y la siguiente. Equivale a
+# (fecha_hora, id) > (última, último id); el `fecha_hora >= ?` redundante es el
+# que permite empezar la búsqueda en el índice en la última fecha.
+SQL_PAGINA = """
+    SELECT fecha_hora, corriente, potencia, id
+    FROM Lecturas
+    WHERE artefacto_id = ? AND fecha_hora >= ? AND (fecha_hora > ? OR id > ?) AND fecha_hora < ?
+    ORDER BY fecha_hora, id
+    OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY
+"""
+
+# Lecturas insertadas en un rango de ids: se busca por la clave primaria
+SQL_INSERTADAS = """
+    SELECT artefacto_id, MIN(fecha_hora)
+    FROM Lecturas
+    WHERE id > ? AND id <= ? AND artefacto_id IS NOT NULL
+    GROUP BY artefacto_id
+"""
+
+
+def day_range(dia):
+    """Rango semiabierto [dia 00:00, día siguiente 00:00) de una fecha."""
+    desde = datetime(dia.year, dia.month, dia.day)
+    return desde, desde + timedelta(days=1)
+
+
+def _as_datetime(valor):
+    # SQLite devuelve MIN() como texto porque el resultado no tiene tipo declarado
+    return datetime.fromisoformat(valor) if isinstance(valor, str) else valor
+
+
+def last_reading_id(conn):
+    """Id de la última lectura insertada (0 si la tabla está vacía)."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT MAX(id) FROM Lecturas")
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    return int(row[0]) if row and row[0] is not None else 0
+
+
+def inserted_since(conn, desde_id, hasta_id):
+    """{artefacto_id: fecha_hora más antigua} de las lecturas con id en (desde_id, hasta_id]."""
+    if desde_id is None or hasta_id is None or hasta_id <= desde_id:
+        return {}
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SQL_INSERTADAS, (desde_id, hasta_id))
+        return {artefacto_id: _as_datetime(primera) for artefacto_id, primera in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+class HistoryQuery:
+    """Recorre por páginas las lecturas de uno o más artefactos en [desde, hasta).
+
+    Las lecturas salen ordenadas por (artefacto_id, fecha_hora, id). La
+    posición se guarda como (artefacto, última fecha_hora, último id), así las
+    lecturas con la misma marca de tiempo no se pierden ni se repiten entre
+    páginas, y cada página pide solo las filas que le faltan.
+
+    Con `connect` (por ejemplo, `basedatos.get_connection`) en vez de `conn`,
+    cada página toma una conexión del pool y la devuelve al terminar, así una
+    ventana abierta no retiene una conexión mientras nadie se desplaza.
+    """
+
+    def __init__(self, conn, artefacto_ids, desde, hasta, page_size=TAMANO_PAGINA, sql=SQL_PAGINA, connect=None):
+        if desde >= hasta:
+            raise ValueError("El inicio del rango debe ser anterior al final.")
+        if (conn is None) == (connect is None):
+            raise ValueError("Se necesita una conexión o una función que la devuelva, no ambas.")
+        self.conn = conn
+        self.connect = connect
+        self.artefacto_ids = sorted(set(artefacto_ids))
+        self.desde = desde
+        self.hasta = hasta
+        self.page_size = page_size
+        self.sql = sql
+        self.paginas = 0
+        self.filas = 0
+        self._pos = 0  # Índice del artefacto en curso
+        self._ultima = desde  # Última fecha_hora entregada del artefacto en curso
+        self._ultimo_id = ID_INICIAL  # id de esa última lectura
+
+    @property
+    def exhausted(self):
+        return self._pos >= len(self.artefacto_ids)
+
+    def next_page(self):
+        """Devuelve la siguiente página como columnas de NumPy, o None si no quedan lecturas.
+
+        Columnas: (artefacto_ids int64, fechas datetime64[ms], corrientes float64, potencias float64).
+        Una página puede abarcar el final de un artefacto y el inicio del siguiente.
+        """
+        ids, filas = [], []
+        if self.exhausted:
+            return None
+        conn = self.conn if self.connect is None else self.connect()
+        cursor = conn.cursor()
+        try:
+            while not self.exhausted and len(filas) < self.page_size:
+                artefacto_id = self.artefacto_ids[self._pos]
+                pedidas = self.page_size - len(filas)
+                cursor.execute(self.sql, (artefacto_id, self._ultima, self._ultima, self._ultimo_id,
+                                          self.hasta, pedidas))
+                rows = cursor.fetchall()
+                if rows:
+                    filas.extend(row[:3] for row in rows)
+                    ids.extend([artefacto_id] * len(rows))
+                    self._ultima, self._ultimo_id = rows[-1][0], rows[-1][3]
+                if len(rows) < pedidas:
+                    # El artefacto no tiene más lecturas en el rango: pasar al siguiente
+                    self._pos += 1
+                    self._ultima = self.desde
+                    self._ultimo_id = ID_INICIAL
+        finally:
+            cursor.close()
+            if self.connect is not None:
+                conn.close()  # De vuelta al pool hasta la próxima página
+
+        if not filas:
+            return None
+        self.paginas += 1
+        self.filas += len(filas)
+        fechas, corrientes, potencias = zip(*filas)
+        return (np.array(ids, dtype=np.int64),
+                np.array(fechas, dtype="datetime64[ms]"),
+                np.array(corrientes, dtype=np.float64),
+                np.array(potencias, dtype=np.float64))
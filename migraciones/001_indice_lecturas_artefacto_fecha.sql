@@ -0,0 +1,38 @@
+-- Índice de apoyo para el historial paginado (historial.py) y las exportaciones.
+--
+-- Las consultas filtran por artefacto_id y un rango semiabierto de fecha_hora y
+-- ordenan por (fecha_hora, id); con este índice cada página es una sola
+-- búsqueda y, al incluir corriente y potencia, no hace falta volver a la tabla.
+-- El id desempata las lecturas con la misma marca de tiempo entre páginas.
+--
+-- Ejecutar una vez sobre la base restaurada desde DataBaseProject.bak. Es
+-- idempotente: si el índice ya existe con el id en la clave no hace nada; si
+-- existe sin él (versión anterior de este script), lo reemplaza.
+
+IF EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_Lecturas_artefacto_fecha' AND object_id = OBJECT_ID('dbo.Lecturas')
+) AND NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes i
+    JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+    JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+    WHERE i.name = 'IX_Lecturas_artefacto_fecha' AND i.object_id = OBJECT_ID('dbo.Lecturas')
+      AND c.name = 'id' AND ic.is_included_column = 0
+)
+BEGIN
+    DROP INDEX IX_Lecturas_artefacto_fecha ON dbo.Lecturas;
+END
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_Lecturas_artefacto_fecha' AND object_id = OBJECT_ID('dbo.Lecturas')
+)
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_Lecturas_artefacto_fecha
+        ON dbo.Lecturas (artefacto_id, fecha_hora, id)
+        INCLUDE (corriente, potencia)
+        WITH (ONLINE = OFF, SORT_IN_TEMPDB = ON);
+END
+GO
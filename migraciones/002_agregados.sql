@@ -0,0 +1,59 @@
+-- Tablas de agregados por minuto, hora y día (agregados.py).
+--
+-- Cada fila resume las lecturas de un artefacto en el periodo que empieza en
+-- `periodo`: cantidad, potencia mínima, máxima, media y suma, y energía
+-- integrada en Wh. Agregados_Estado guarda la marca de agua (última lectura
+-- agregada) de cada artefacto para la actualización incremental.
+--
+-- Después de crearlas, cargar el historial con:
+--     python agregados.py --backfill
+-- y programar `python agregados.py` cada pocos minutos.
+
+IF OBJECT_ID('dbo.Agregados_Minuto') IS NULL
+    CREATE TABLE dbo.Agregados_Minuto (
+        artefacto_id   INT          NOT NULL,
+        periodo        DATETIME2(0) NOT NULL,
+        lecturas       INT          NOT NULL,
+        potencia_min   FLOAT        NOT NULL,
+        potencia_max   FLOAT        NOT NULL,
+        potencia_media FLOAT        NOT NULL,
+        potencia_suma  FLOAT        NOT NULL,
+        energia_wh     FLOAT        NOT NULL,
+        CONSTRAINT PK_Agregados_Minuto PRIMARY KEY CLUSTERED (artefacto_id, periodo)
+    );
+GO
+
+IF OBJECT_ID('dbo.Agregados_Hora') IS NULL
+    CREATE TABLE dbo.Agregados_Hora (
+        artefacto_id   INT          NOT NULL,
+        periodo        DATETIME2(0) NOT NULL,
+        lecturas       INT          NOT NULL,
+        potencia_min   FLOAT        NOT NULL,
+        potencia_max   FLOAT        NOT NULL,
+        potencia_media FLOAT        NOT NULL,
+        potencia_suma  FLOAT        NOT NULL,
+        energia_wh     FLOAT        NOT NULL,
+        CONSTRAINT PK_Agregados_Hora PRIMARY KEY CLUSTERED (artefacto_id, periodo)
+    );
+GO
+
+IF OBJECT_ID('dbo.Agregados_Dia') IS NULL
+    CREATE TABLE dbo.Agregados_Dia (
+        artefacto_id   INT          NOT NULL,
+        periodo        DATETIME2(0) NOT NULL,
+        lecturas       INT          NOT NULL,
+        potencia_min   FLOAT        NOT NULL,
+        potencia_max   FLOAT        NOT NULL,
+        potencia_media FLOAT        NOT NULL,
+        potencia_suma  FLOAT        NOT NULL,
+        energia_wh     FLOAT        NOT NULL,
+        CONSTRAINT PK_Agregados_Dia PRIMARY KEY CLUSTERED (artefacto_id, periodo)
+    );
+GO
+
+IF OBJECT_ID('dbo.Agregados_Estado') IS NULL
+    CREATE TABLE dbo.Agregados_Estado (
+        artefacto_id INT          NOT NULL CONSTRAINT PK_Agregados_Estado PRIMARY KEY,
+        marca        DATETIME2(7) NOT NULL
+    );
+GO
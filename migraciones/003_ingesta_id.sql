@@ -0,0 +1,27 @@
+-- Clave de idempotencia de la bitácora local de lecturas (bitacora.py).
+--
+-- Cada lectura que pasa por la bitácora llega con un ingesta_id único; los bits
+-- altos son el número aleatorio del equipo que la leyó, así que tampoco se
+-- repite entre equipos que escriben en la misma base. Si un
+-- lote se reenvía (por ejemplo, la aplicación se cerró después del INSERT y
+-- antes de confirmarlo en la bitácora), las filas cuyo ingesta_id ya existe se
+-- omiten. Las lecturas anteriores a esta migración quedan con ingesta_id NULL,
+-- por eso el índice único es filtrado.
+--
+-- Ejecutar una vez sobre la base restaurada; es idempotente.
+
+IF COL_LENGTH('dbo.Lecturas', 'ingesta_id') IS NULL
+    ALTER TABLE dbo.Lecturas ADD ingesta_id BIGINT NULL;
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'UX_Lecturas_ingesta' AND object_id = OBJECT_ID('dbo.Lecturas')
+)
+BEGIN
+    CREATE UNIQUE NONCLUSTERED INDEX UX_Lecturas_ingesta
+        ON dbo.Lecturas (ingesta_id)
+        WHERE ingesta_id IS NOT NULL
+        WITH (ONLINE = OFF, SORT_IN_TEMPDB = ON);
+END
+GO
@@ -0,0 +1,14 @@
+-- Último id de Lecturas que ya reflejan los agregados (agregados.py).
+--
+-- La bitácora local (bitacora.py) puede cargar lecturas tarde, con su
+-- fecha_hora original, después de que la marca de agua de Agregados_Estado ya
+-- pasó esa hora. Con el último id visto, `python agregados.py` encuentra las
+-- lecturas insertadas desde la vez anterior con fecha anterior a la marca y
+-- recalcula sus periodos. Las filas existentes quedan con NULL hasta la
+-- siguiente actualización.
+--
+-- Ejecutar una vez después de 002_agregados.sql; es idempotente.
+
+IF COL_LENGTH('dbo.Agregados_Estado', 'ultimo_id') IS NULL
+    ALTER TABLE dbo.Agregados_Estado ADD ultimo_id BIGINT NULL;
+GO
@@ -0,0 +1,311 @@
+"""Registro de modelos de detección de anomalías.
+
+El modelo entrenado por ModeloEntrenamiento.py se deserializa una sola vez, en
+segundo plano, y queda en caché identificado por el hash del archivo. Cada
+consulta solo hace un `stat` del archivo; si cambió, se vuelve a cargar.
+
+Se usa el más reciente (por fecha de modificación) entre el paquete de modelos
+por artefacto (`modelos_artefactos.pkl`, ver `ModeloEntrenamiento.py
+--por-artefacto`) y el modelo global `modelo.pkl`; así, volver a entrenar en
+cualquiera de los modos reemplaza al modelo en uso. El paquete es un
+diccionario:
+
+    {"version": 1, "generado": "<fecha ISO>", "modelos": {artefacto_id: modelo}, "global": modelo}
+"""
+import collections
+import hashlib
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+RUTA_MODELO = "modelo.pkl"
+RUTA_MODELOS_ARTEFACTOS = "modelos_artefactos.pkl"
+VERSION_PAQUETE = 1
+
+
+def file_hash(ruta):
+    """SHA-256 del contenido del archivo."""
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def predict_by_device(model, artefacto_ids, X):
+    """Predice cada fila con el modelo de su artefacto (1 normal, -1 anomalía).
+
+    `model` puede ser un modelo único o un paquete de modelos por artefacto; en
+    ese caso los artefactos sin modelo propio usan el modelo global.
+    """
+    if not isinstance(model, dict):
+        return model.predict(X)
+    predicciones = np.empty(len(X), dtype=np.int8)
+    ids, grupos = np.unique(artefacto_ids, return_inverse=True)
+    for i, artefacto_id in enumerate(ids):
+        filas = grupos == i
+        modelo = model["modelos"].get(int(artefacto_id), model["global"])
+        predicciones[filas] = modelo.predict(X[filas])
+    return predicciones
+
+
+def score_history(conn, model, chunk_size=20000, progress=None, cancelled=None):
+    """Puntúa todas las lecturas de Lecturas, bloque por bloque.
+
+    Las filas se copian a arreglos float64 contiguos reservados con el total de
+    antemano y cada bloque se predice apenas llega, así la memoria no depende de
+    listas de Python. `progress(procesadas, total)` se llama tras cada bloque y
+    si `cancelled()` devuelve True se abandona el análisis y se devuelve None.
+
+    Devuelve (artefacto_ids, datos (n, 2), anomalas (bool)).
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM Lecturas WHERE artefacto_id IS NOT NULL")
+    total = cursor.fetchone()[0]
+    artefacto_ids = np.empty(total, dtype=np.int64)
+    datos = np.empty((total, 2), dtype=np.float64)
+    anomalas = np.empty(total, dtype=bool)
+    if progress:
+        progress(0, total)
+
+    cursor.execute("SELECT artefacto_id, corriente, potencia FROM Lecturas WHERE artefacto_id IS NOT NULL")
+    n = 0
+    try:
+        while True:
+            if cancelled and cancelled():
+                return None
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            bloque = np.array([tuple(row) for row in rows], dtype=np.float64).reshape(-1, 3)
+            m = len(bloque)
+            if n + m > len(datos):
+                # Llegaron filas nuevas después del COUNT: se amplían los arreglos
+                nuevo = max(2 * len(datos), n + m)
+                artefacto_ids = np.resize(artefacto_ids, nuevo)
+                datos = np.resize(datos, (nuevo, 2))
+                anomalas = np.resize(anomalas, nuevo)
+            artefacto_ids[n:n + m] = bloque[:, 0]
+            datos[n:n + m] = bloque[:, 1:]
+            anomalas[n:n + m] = predict_by_device(model, artefacto_ids[n:n + m], datos[n:n + m]) == -1
+            n += m
+            if progress:
+                progress(n, max(total, n))
+    finally:
+        cursor.close()
+    return artefacto_ids[:n], datos[:n], anomalas[:n]
+
+
+class ModelRegistry:
+    """Caché del modelo entrenado con carga en segundo plano y recarga automática.
+
+    De los archivos de `rutas` que existan se usa el modificado más
+    recientemente; si dos tienen la misma fecha, el primero de `rutas`.
+    """
+
+    def __init__(self, rutas=(RUTA_MODELOS_ARTEFACTOS, RUTA_MODELO)):
+        self.rutas = (rutas,) if isinstance(rutas, str) else tuple(rutas)
+        self.ruta = self.rutas[-1]
+        self.model = None
+        self.hash = None
+        self.load_seconds = None  # Duración de la última carga
+        self.loads = 0
+        self.error = None
+        self._firma = None  # (ruta, mtime, tamaño) del archivo ya revisado
+        self._lock = threading.Lock()
+        self._hilo = None
+
+    def _signature(self):
+        firmas = []
+        for i, ruta in enumerate(self.rutas):
+            try:
+                st = os.stat(ruta)
+            except FileNotFoundError:
+                continue
+            firmas.append((st.st_mtime_ns, -i, ruta, st.st_size))
+        if not firmas:
+            raise FileNotFoundError(f"No existe ningún modelo entrenado: {', '.join(self.rutas)}")
+        mtime, _, ruta, tamano = max(firmas)
+        return ruta, mtime, tamano
+
+    def _load(self):
+        """Carga el modelo si el archivo cambió desde la última vez."""
+        with self._lock:
+            try:
+                firma = self._signature()
+                if firma == self._firma:
+                    return
+                ruta = firma[0]
+                inicio = time.perf_counter()
+                digest = file_hash(ruta)
+                if digest != self.hash:
+                    import joblib  # Importa sklearn al deserializar; se paga solo aquí
+                    model = joblib.load(ruta)
+                    if isinstance(model, dict) and model.get("version") != VERSION_PAQUETE:
+                        raise ValueError(f"Versión de paquete de modelos no soportada: {model.get('version')}")
+                    self.model = model
+                    self.ruta = ruta
+                    self.hash = digest
+                    self.loads += 1
+                    self.load_seconds = time.perf_counter() - inicio
+                    print(f"Modelo '{self.ruta}' cargado en {1000 * self.load_seconds:.0f} ms.")
+                self._firma = firma
+                self.error = None
+            except Exception as e:
+                # Se conserva el modelo anterior (por ejemplo, si el archivo se está reescribiendo)
+                self.error = e
+                print(f"Error al cargar el modelo: {e}")
+
+    def preload(self):
+        """Carga (o recarga) el modelo en un hilo de fondo sin bloquear a quien llama."""
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._hilo = threading.Thread(target=self._load, daemon=True)
+        self._hilo.start()
+
+    def is_stale(self):
+        try:
+            return self._signature() != self._firma
+        except OSError:
+            return False
+
+    def get(self):
+        """Devuelve el modelo en caché.
+
+        Si todavía no hay uno, espera la carga; si el archivo cambió, se recarga
+        en segundo plano y mientras tanto se sigue usando el anterior.
+        """
+        if self.model is None:
+            self._load()  # Espera a la carga en curso (el lock la serializa) o la hace aquí
+            if self.model is None:
+                raise FileNotFoundError(f"No se pudo cargar el modelo '{self.ruta}': {self.error}")
+        elif self.is_stale():
+            self.preload()
+        return self.model
+
+    def get_for(self, artefacto_id):
+        """Devuelve el modelo que corresponde al artefacto (o el global)."""
+        model = self.get()
+        if isinstance(model, dict):
+            return model["modelos"].get(artefacto_id, model["global"])
+        return model
+
+    def predict(self, artefacto_ids, X):
+        """Predice cada fila con el modelo de su artefacto."""
+        return predict_by_device(self.get(), artefacto_ids, X)
+
+
+class StreamingScorer(threading.Thread):
+    """Hilo que puntúa con el modelo las lecturas en vivo, en micro-lotes.
+
+    `submit()` nunca bloquea: si el hilo se atrasa, los lotes más viejos se
+    descartan y se cuentan. Los bloques que se acumulan mientras se puntúa el
+    anterior se unen en un solo lote, así la inferencia sigue el ritmo del puerto.
+    Los resultados se recogen con `drain_results()`.
+    """
+
+    def __init__(self, registry, artefacto_id=None, max_lote=512, max_cola=64):
+        super().__init__(daemon=True)
+        self.registry = registry
+        self.artefacto_id = artefacto_id  # Se usa el modelo propio del artefacto si existe
+        self.max_lote = max_lote
+        self._entrada = queue.Queue(max_cola)
+        self._salida = collections.deque()
+        self._detener = threading.Event()
+
+        # Métricas
+        self.puntuadas = 0
+        self.anomalias = 0
+        self.lotes = 0
+        self.descartadas = 0
+        self.ultimo_lote_ms = 0.0
+        self._latencia_total = 0.0
+        self.error = None
+
+    def submit(self, tiempos, corrientes, potencias):
+        """Encola un bloque de lecturas para puntuar."""
+        bloque = (np.asarray(tiempos), np.asarray(corrientes), np.asarray(potencias))
+        while True:
+            try:
+                self._entrada.put_nowait(bloque)
+                return
+            except queue.Full:
+                try:
+                    viejo = self._entrada.get_nowait()
+                    self.descartadas += len(viejo[0])
+                except queue.Empty:
+                    pass
+
+    def run(self):
+        while not self._detener.is_set():
+            try:
+                bloques = [self._entrada.get(timeout=0.2)]
+            except queue.Empty:
+                continue
+            # Unir lo que haya llegado mientras tanto, hasta max_lote lecturas
+            n = len(bloques[0][0])
+            while n < self.max_lote:
+                try:
+                    bloque = self._entrada.get_nowait()
+                except queue.Empty:
+                    break
+                bloques.append(bloque)
+                n += len(bloque[0])
+            tiempos, corrientes, potencias = (np.concatenate(c) for c in zip(*bloques))
+            self._score(tiempos, corrientes, potencias)
+
+    def _score(self, tiempos, corrientes, potencias):
+        try:
+            model = self.registry.get_for(self.artefacto_id)
+        except Exception as e:
+            self.error = e
+            self.descartadas += len(tiempos)
+            return
+        inicio = time.perf_counter()
+        anomalas = model.predict(np.column_stack((corrientes, potencias))) == -1
+        latencia = time.perf_counter() - inicio
+
+        self.ultimo_lote_ms = 1000 * latencia
+        self._latencia_total += latencia
+        self.lotes += 1
+        self.puntuadas += len(tiempos)
+        self.anomalias += int(anomalas.sum())
+        self._salida.append((tiempos, corrientes, potencias, anomalas))
+
+    def drain_results(self):
+        """Devuelve los lotes puntuados desde la última llamada: (tiempos, corrientes, potencias, anómalas)."""
+        resultados = []
+        while self._salida:
+            resultados.append(self._salida.popleft())
+        return resultados
+
+    def stop(self):
+        self._detener.set()
+        if self.is_alive():
+            self.join(timeout=2)
+
+    def estadisticas(self):
+        """Tasa de anomalías y latencia de inferencia por lote."""
+        return {
+            "puntuadas": self.puntuadas,
+            "anomalias": self.anomalias,
+            "tasa_anomalias": self.anomalias / self.puntuadas if self.puntuadas else 0.0,
+            "lotes": self.lotes,
+            "descartadas": self.descartadas,
+            "ultimo_lote_ms": self.ultimo_lote_ms,
+            "promedio_lote_ms": 1000 * self._latencia_total / self.lotes if self.lotes else 0.0,
+        }
+
+
+_registry = None
+
+
+def get_model_registry():
+    """Devuelve el registro de modelos compartido por la aplicación."""
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry()
+    return _registry
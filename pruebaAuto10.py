@@ -0,0 +1,130 @@
+import sqlite3
+import unittest
+from datetime import date, datetime, timedelta
+import numpy as np
+from historial import HistoryQuery, day_range
+
+SQL_PAGINA_SQLITE = """
+    SELECT fecha_hora, corriente, potencia, id
+    FROM Lecturas
+    WHERE artefacto_id = ? AND fecha_hora >= ? AND (fecha_hora > ? OR id > ?) AND fecha_hora < ?
+    ORDER BY fecha_hora, id
+    LIMIT ?
+"""
+
+
+class TestHistoryQuery(unittest.TestCase):
+    def setUp(self):
+        """Tres artefactos; el 2 tiene grupos de lecturas con la misma marca de tiempo."""
+        self.db = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+        self.db.execute("CREATE TABLE Lecturas (id INTEGER PRIMARY KEY, fecha_hora TIMESTAMP, corriente REAL, "
+                        "potencia REAL, artefacto_id INTEGER)")
+        self.db.execute("CREATE INDEX IX_Lecturas_artefacto_fecha ON Lecturas (artefacto_id, fecha_hora, id)")
+        inicio = datetime(2024, 3, 1)
+        filas = [(inicio + timedelta(minutes=i), 0.1, float(i), 1) for i in range(3 * 1440)]
+        filas += [(inicio + timedelta(minutes=i // 7), 0.2, float(i), 2) for i in range(1000)]
+        filas += [(inicio + timedelta(minutes=i), 0.3, float(i), 3) for i in range(10)]
+        self.db.executemany("INSERT INTO Lecturas (fecha_hora, corriente, potencia, artefacto_id) VALUES (?, ?, ?, ?)",
+                            filas)
+
+    def recorrer(self, query):
+        paginas = []
+        while True:
+            pagina = query.next_page()
+            if pagina is None:
+                return paginas
+            paginas.append(pagina)
+
+    def test_rango_semiabierto_de_un_dia(self):
+        """Verifica que un día incluya la medianoche inicial y excluya la final."""
+        desde, hasta = day_range(date(2024, 3, 2))
+        paginas = self.recorrer(HistoryQuery(self.db, [1], desde, hasta, page_size=500, sql=SQL_PAGINA_SQLITE))
+        fechas = np.concatenate([p[1] for p in paginas])
+        self.assertEqual(len(fechas), 1440)
+        self.assertEqual(fechas[0], np.datetime64("2024-03-02T00:00"))
+        self.assertEqual(fechas[-1], np.datetime64("2024-03-02T23:59"))
+        self.assertEqual([len(p[0]) for p in paginas], [500, 500, 440])
+
+    def test_marcas_repetidas_entre_paginas(self):
+        """Verifica que las lecturas con la misma marca de tiempo no se pierdan ni se repitan."""
+        query = HistoryQuery(self.db, [2], datetime(2024, 3, 1), datetime(2024, 3, 2), page_size=10,
+                             sql=SQL_PAGINA_SQLITE)
+        potencias = np.concatenate([p[3] for p in self.recorrer(query)])
+        self.assertEqual(sorted(potencias.tolist()), [float(i) for i in range(1000)])
+        self.assertTrue(query.exhausted)
+
+    def test_mas_de_una_pagina_con_la_misma_marca(self):
+        """Un bloque de lecturas con la misma marca, más largo que una página, se recorre por id."""
+        marca = datetime(2024, 3, 5, 12, 0, 0)
+        ids = np.random.default_rng(7).permutation(np.arange(100000, 100035))  # Ids fuera del orden de inserción
+        self.db.executemany("INSERT INTO Lecturas VALUES (?, ?, ?, ?, ?)",
+                            [(int(i), marca, 0.4, float(i), 4) for i in ids])
+        consultas = []
+        conn = self.db
+
+        class Espia:
+            def cursor(self):
+                cursor = conn.cursor()
+                ejecutar = cursor.execute
+
+                class Cursor:
+                    def execute(self, sql, params):
+                        consultas.append(params[-1])
+                        return ejecutar(sql, params)
+
+                    def __getattr__(self, nombre):
+                        return getattr(cursor, nombre)
+
+                return Cursor()
+
+        query = HistoryQuery(Espia(), [4], marca, marca + timedelta(seconds=1), page_size=10, sql=SQL_PAGINA_SQLITE)
+        potencias = np.concatenate([p[3] for p in self.recorrer(query)])
+        self.assertEqual(potencias.tolist(), [float(i) for i in range(100000, 100035)])
+        self.assertTrue(all(pedidas <= 10 for pedidas in consultas))  # Nunca se vuelven a pedir filas ya entregadas
+
+    def test_varios_artefactos_en_orden(self):
+        """Verifica el orden por (artefacto, fecha) y que una página cruce de un artefacto al siguiente."""
+        query = HistoryQuery(self.db, [3, 2], datetime(2024, 3, 1), datetime(2024, 3, 1, 0, 30), page_size=100,
+                             sql=SQL_PAGINA_SQLITE)
+        paginas = self.recorrer(query)
+        ids = np.concatenate([p[0] for p in paginas])
+        self.assertEqual(len(ids), 210 + 10)
+        self.assertTrue(np.all(np.diff(ids) >= 0))
+        self.assertEqual(set(paginas[-1][0].tolist()), {2, 3})
+
+    def test_una_conexion_por_pagina(self):
+        """Con `connect`, cada página toma una conexión y la devuelve antes de entregar las filas."""
+        prestadas = []
+        db = self.db
+
+        class Prestada:
+            abierta = True
+
+            def cursor(self):
+                return db.cursor()
+
+            def close(self):
+                self.abierta = False
+
+        def connect():
+            prestadas.append(Prestada())
+            return prestadas[-1]
+
+        query = HistoryQuery(None, [1, 3], datetime(2024, 3, 1), datetime(2024, 3, 2), page_size=500,
+                             sql=SQL_PAGINA_SQLITE, connect=connect)
+        paginas = 0
+        while query.next_page() is not None:
+            paginas += 1
+            self.assertFalse(any(conn.abierta for conn in prestadas))
+        self.assertEqual((paginas, query.filas), (3, 1450))
+        self.assertEqual(len(prestadas), 3)  # Agotada la consulta, no se pide otra conexión
+
+    def test_rango_invalido(self):
+        with self.assertRaises(ValueError):
+            HistoryQuery(self.db, [1], datetime(2024, 3, 2), datetime(2024, 3, 1))
+        with self.assertRaises(ValueError):
+            HistoryQuery(None, [1], datetime(2024, 3, 1), datetime(2024, 3, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
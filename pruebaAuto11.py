@@ -0,0 +1,93 @@
+import sqlite3
+import unittest
+from datetime import datetime, timedelta
+import numpy as np
+import agregados
+from agregados import DIA, HORA, MINUTO, backfill, choose_level, query_rollup, rollup_readings, update, watermark
+
+
+def crear_base():
+    """Base SQLite en memoria con el esquema de Lecturas y de las tablas de agregados."""
+    db = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+    db.execute("CREATE TABLE artefactos (id INTEGER, nombre TEXT)")
+    db.execute("INSERT INTO artefactos VALUES (1, 'Hervidor'), (2, 'Router')")
+    db.execute("CREATE TABLE Lecturas (id INTEGER PRIMARY KEY, fecha_hora TIMESTAMP, corriente REAL, potencia REAL, "
+               "artefacto_id INTEGER)")
+    for nivel in agregados.NIVELES:
+        db.execute(f"""CREATE TABLE {nivel.tabla} (artefacto_id INTEGER, periodo TIMESTAMP, lecturas INTEGER,
+                       potencia_min REAL, potencia_max REAL, potencia_media REAL, potencia_suma REAL,
+                       energia_wh REAL, PRIMARY KEY (artefacto_id, periodo))""")
+    db.execute("CREATE TABLE Agregados_Estado (artefacto_id INTEGER PRIMARY KEY, marca TIMESTAMP, ultimo_id INTEGER)")
+    return db
+
+
+class TestRollupReadings(unittest.TestCase):
+    def test_energia_por_trapecio(self):
+        """Una carga constante de 600 W durante una hora, leída cada 10 s, suma 600 Wh."""
+        tiempos = np.arange(0, 3600 + 10, 10.0)
+        filas = rollup_readings(tiempos, np.full(len(tiempos), 600.0), 60)
+        self.assertEqual(len(filas), 61)
+        self.assertAlmostEqual(filas[:, 6].sum(), 600.0)
+        self.assertEqual(filas[0, 1], 6)
+        self.assertEqual(filas[0, 4], 600.0)
+
+    def test_hueco_no_suma_energia(self):
+        """Verifica que un corte mayor al máximo no se integre."""
+        filas = rollup_readings([0.0, 10.0, 1000.0, 1010.0], [360.0] * 4, 60, max_hueco=60)
+        self.assertAlmostEqual(filas[:, 6].sum(), 2 * 360.0 * 10 / 3600)
+
+
+class TestAgregadosIncrementales(unittest.TestCase):
+    def setUp(self):
+        """Dos días y medio de lecturas cada 15 s con potencia que sube y baja."""
+        self.db = crear_base()
+        self.inicio = datetime(2024, 5, 1, 0, 0, 0)
+        n = int(2.5 * 86400 / 15)
+        self.potencias = 100.0 + 50.0 * np.sin(np.arange(n) / 500)
+        self.db.executemany("INSERT INTO Lecturas (fecha_hora, corriente, potencia, artefacto_id) VALUES (?, ?, ?, ?)", [
+            (self.inicio + timedelta(seconds=15 * i), p / 220, float(p), 1) for i, p in enumerate(self.potencias)
+        ])
+
+    def tabla(self, nivel):
+        return self.db.execute(f"SELECT periodo, lecturas, potencia_max, energia_wh FROM {nivel.tabla} "
+                               "WHERE artefacto_id = 1 ORDER BY periodo").fetchall()
+
+    def test_incremental_igual_a_backfill(self):
+        """Actualizar en varias tandas da lo mismo que recalcular todo, y repetir no duplica."""
+        corte = self.inicio + timedelta(days=1, hours=7, seconds=7)
+        backfill(self.db, hasta=corte)
+        # El último minuto se completa: la marca queda en la última lectura de ese minuto
+        self.assertEqual(watermark(self.db, 1), corte.replace(second=45))
+        update(self.db, margen=timedelta(0))
+        update(self.db, margen=timedelta(0))
+        incremental = {nivel.nombre: self.tabla(nivel) for nivel in agregados.NIVELES}
+
+        backfill(self.db)
+        for nivel in agregados.NIVELES:
+            self.assertEqual(self.tabla(nivel), incremental[nivel.nombre])
+
+        dias = self.tabla(DIA)
+        self.assertEqual(len(dias), 3)
+        self.assertEqual(sum(d[1] for d in dias), len(self.potencias))
+        self.assertEqual(len(self.tabla(HORA)), 60)
+        self.assertAlmostEqual(max(d[2] for d in dias), self.potencias.max())
+        esperada = ((self.potencias[1:] + self.potencias[:-1]) / 2 * 15).sum() / 3600
+        self.assertAlmostEqual(sum(d[3] for d in dias), esperada, places=6)
+
+    def test_consulta_con_el_nivel_adecuado(self):
+        """Verifica la elección del nivel y la consulta de agregados por rango."""
+        backfill(self.db)
+        self.assertIsNone(choose_level(30))
+        self.assertIs(choose_level(60), MINUTO)
+        self.assertIs(choose_level(2 * 3600), HORA)
+        self.assertIs(choose_level(30 * 86400), DIA)
+        ids, periodos, lecturas, pmin, pmax, pmedia, energia = query_rollup(
+            self.db, HORA, [1, 2], self.inicio + timedelta(hours=1, minutes=30), self.inicio + timedelta(hours=5))
+        self.assertEqual(len(periodos), 4)  # Desde la hora que contiene el inicio
+        self.assertEqual(periodos[0], np.datetime64("2024-05-01T01:00:00"))
+        self.assertTrue(np.all(lecturas == 240))
+        self.assertTrue(np.all(pmin <= pmedia) and np.all(pmedia <= pmax))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+import numpy as np
+from agregados import backfill, update
+from energia import EnergyLedger, TariffSchedule, build_report, interval_energy, update_ledger
+from pruebaAuto11 import crear_base
+
+FRANJAS = [
+    {"nombre": "Punta", "desde": "18:00", "hasta": "23:00", "precio_kwh": 1.0},
+    {"nombre": "Fuera de punta", "desde": "23:00", "hasta": "18:00", "precio_kwh": 0.5},
+]
+
+
+class TestIntegracion(unittest.TestCase):
+    def test_trapecio_y_huecos(self):
+        """Verifica la integración por trapecio y que los cortes no sumen energía."""
+        energia = interval_energy([0.0, 30.0, 60.0, 600.0, 630.0], [100.0, 200.0, 200.0, 200.0, 200.0])
+        self.assertEqual(energia[0], 0.0)
+        self.assertAlmostEqual(energia[1], 150.0 * 30 / 3600)
+        self.assertEqual(energia[3], 0.0)  # 540 s sin lecturas
+        self.assertAlmostEqual(energia.sum(), (150.0 * 30 + 200.0 * 60) / 3600)
+
+    def test_franjas_que_cruzan_medianoche(self):
+        tarifa = TariffSchedule(FRANJAS)
+        segundos = np.array([17 * 3600 + 3599, 18 * 3600, 22 * 3600 + 3599, 23 * 3600, 86400 + 3600])
+        self.assertEqual(list(tarifa.band_of(segundos)), [1, 0, 0, 1, 1])
+        with self.assertRaises(ValueError):
+            TariffSchedule(FRANJAS[:1])  # No cubre el día completo
+
+
+class TestReporteIncremental(unittest.TestCase):
+    def setUp(self):
+        """Cuarenta días de un equipo de 1 kW leído cada 30 s, con un corte de dos horas por día."""
+        self.db = crear_base()
+        self.directorio = tempfile.mkdtemp()
+        self.ruta = os.path.join(self.directorio, "energia_estado.npz")
+        self.tarifa = TariffSchedule(FRANJAS)
+        inicio = datetime(2024, 1, 1)
+        filas = []
+        for i in range(40 * 2880):
+            momento = inicio + timedelta(seconds=30 * i)
+            if 2 <= momento.hour < 4:
+                continue  # Sin lecturas: no debe sumar energía
+            filas.append((momento, 4.5, 1000.0, 1))
+        self.db.executemany("INSERT INTO Lecturas (fecha_hora, corriente, potencia, artefacto_id) VALUES (?, ?, ?, ?)",
+                            filas)
+
+    def tearDown(self):
+        shutil.rmtree(self.directorio)
+
+    def test_reporte_diario_semanal_y_mensual(self):
+        """Cada día suma 22 h a 1 kW, repartidas entre punta (5 h) y fuera de punta (17 h)."""
+        backfill(self.db, hasta=datetime(2024, 1, 20))
+        ledger = EnergyLedger.load(self.tarifa, self.ruta)
+        update_ledger(self.db, ledger, self.tarifa, [1, 2])
+        ledger.save(self.ruta)
+
+        # Segunda tanda: solo los días nuevos, sobre el acumulado guardado
+        update(self.db, margen=timedelta(0))
+        ledger = EnergyLedger.load(self.tarifa, self.ruta)
+        update_ledger(self.db, ledger, self.tarifa, [1, 2])
+
+        diario = build_report(ledger, self.tarifa, [1], date(2024, 1, 2), date(2024, 2, 9), "dia")
+        self.assertEqual(len(diario.kwh), 38)
+        # El corte termina a las 4:00 y la primera lectura no tiene anterior: 30 s menos por día
+        esperado = 22 - 30 / 3600
+        self.assertTrue(np.allclose(diario.kwh, esperado))
+        self.assertTrue(np.allclose(diario.kwh_franjas[:, 0], 5.0))
+        self.assertTrue(np.allclose(diario.costo, 5.0 * 1.0 + (esperado - 5.0) * 0.5))
+
+        semanal = build_report(ledger, self.tarifa, [1], date(2024, 1, 1), date(2024, 2, 10), "semana")
+        self.assertEqual(str(semanal.periodos[0]), "2024-01-01")  # Lunes
+        self.assertEqual(str(semanal.periodos[1]), "2024-01-08")
+
+        mensual = build_report(ledger, self.tarifa, [1], date(2024, 1, 1), date(2024, 3, 1), "mes")
+        self.assertEqual([str(p) for p in mensual.periodos], ["2024-01-01", "2024-02-01"])
+        todos = build_report(ledger, self.tarifa, [1], date(2024, 1, 1), date(2024, 3, 1), "dia")
+        self.assertAlmostEqual(mensual.total_kwh(), todos.total_kwh(), places=6)
+        self.assertAlmostEqual(mensual.kwh[0], todos.kwh[:31].sum(), places=6)
+        self.assertAlmostEqual(mensual.total_cost(), todos.total_cost(), places=6)
+
+    def test_cambio_de_franjas_reinicia_el_acumulado(self):
+        backfill(self.db, hasta=datetime(2024, 1, 5))
+        ledger = EnergyLedger.load(self.tarifa, self.ruta)
+        update_ledger(self.db, ledger, self.tarifa, [1])
+        ledger.save(self.ruta)
+        otra = TariffSchedule([{"nombre": "Única", "desde": "00:00", "hasta": "00:00", "precio_kwh": 0.7}])
+        self.assertEqual(EnergyLedger.load(otra, self.ruta).dias, {})
+        self.assertIn(1, EnergyLedger.load(self.tarifa, self.ruta).dias)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+import numpy as np
+import agregados
+from almacenamiento import SqliteBackend, SqlServerBackend, create_backend
+from basedatos import ConnectionPool
+from escritura import BatchWriter
+from historial import HistoryQuery
+
+
+class TestSqliteBackend(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.backend = SqliteBackend(os.path.join(self.dir, "monitoreo.db"))
+        self.conn = self.backend.connect()
+        self.inicio = datetime(2024, 5, 1, 8, 0, 0)
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.dir)
+
+    def insertar(self, n, artefacto_id=1):
+        filas = [(self.inicio + timedelta(seconds=i), 0.5, 100.0 + i, artefacto_id) for i in range(n)]
+        self.backend.insert_readings(self.conn, filas)
+        self.conn.commit()
+
+    def test_modo_wal_e_indices(self):
+        """La base queda en WAL y con el índice (artefacto_id, fecha_hora) que usa el historial."""
+        self.assertEqual(self.conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        indices = [row[1] for row in self.conn.execute("PRAGMA index_list(Lecturas)")]
+        self.assertIn("IX_Lecturas_artefacto_fecha", indices)
+        plan = " ".join(str(row) for row in self.conn.execute(
+            "EXPLAIN QUERY PLAN " + self.backend.sql_pagina, (1, self.inicio, self.inicio, -1, self.inicio, 10)))
+        self.assertIn("IX_Lecturas_artefacto_fecha", plan)
+
+    def test_usuarios_y_artefactos(self):
+        self.backend.add_user(self.conn, "ana", "clave", "usuario", "SECRETO", "Ana", "Pérez")
+        self.backend.add_artefacto(self.conn, "Hervidor")
+        self.backend.add_artefacto(self.conn, "Router")
+        role, password_hash, totp, nombres, apellidos = self.backend.get_user(self.conn, "ana")
+        self.assertEqual(password_hash, hashlib.sha256(b"clave").hexdigest())
+        self.assertEqual((role, totp, nombres, apellidos), ("usuario", "SECRETO", "Ana", "Pérez"))
+        self.assertIsNone(self.backend.get_user(self.conn, "nadie"))
+        self.assertEqual(self.backend.list_artefactos(self.conn), [(1, "Hervidor"), (2, "Router")])
+
+    def test_rango_y_resumen(self):
+        """El rango es semiabierto y las fechas vuelven como datetime."""
+        self.insertar(100)
+        fechas, corrientes, potencias = self.backend.read_range(
+            self.conn, 1, self.inicio + timedelta(seconds=10), self.inicio + timedelta(seconds=20))
+        self.assertEqual(len(fechas), 10)
+        self.assertEqual(fechas[0], np.datetime64(self.inicio + timedelta(seconds=10), "ms"))
+        np.testing.assert_array_equal(potencias, 110.0 + np.arange(10))
+        resumen = self.backend.aggregate(self.conn, 1, self.inicio, self.inicio + timedelta(hours=1))
+        self.assertEqual(resumen["lecturas"], 100)
+        self.assertEqual((resumen["potencia_min"], resumen["potencia_max"]), (100.0, 199.0))
+        self.assertAlmostEqual(resumen["potencia_media"], 149.5)
+
+    def test_historial_y_agregados(self):
+        """Las páginas del historial y los agregados funcionan sobre el mismo esquema."""
+        self.insertar(250)
+        query = HistoryQuery(self.conn, [1], self.inicio, self.inicio + timedelta(hours=1),
+                             page_size=100, sql=self.backend.sql_pagina)
+        self.assertEqual(sum(len(p[0]) for p in iter(query.next_page, None)), 250)
+        agregados.recompute(self.conn, 1, self.inicio, self.inicio + timedelta(hours=1))
+        self.conn.commit()
+        filas = agregados.query_rollup(self.conn, agregados.MINUTO, [1], self.inicio, self.inicio + timedelta(hours=1))
+        self.assertEqual(int(filas[2].sum()), 250)
+
+    def test_escritor_por_lotes_con_pool(self):
+        """El escritor por lotes inserta por el backend con conexiones del pool."""
+        pool = ConnectionPool(self.backend.connect, health_query=self.backend.health_query)
+        writer = BatchWriter(pool.connection, batch_size=50, max_latencia=0.05, backend=self.backend)
+        writer.start()
+        for i in range(120):
+            writer.put(1.0, float(i), 2, self.inicio + timedelta(milliseconds=100 * i))
+        writer.stop()
+        pool.close_all()
+        self.assertEqual(writer.filas_escritas, 120)
+        self.assertEqual(self.backend.aggregate(self.conn, 2, self.inicio, self.inicio + timedelta(hours=1))["lecturas"], 120)
+
+
+class TestSeleccionBackend(unittest.TestCase):
+    def test_variable_de_entorno(self):
+        self.assertIsInstance(create_backend("sqlserver"), SqlServerBackend)
+        self.assertIsInstance(create_backend("SQLite"), SqliteBackend)
+        with self.assertRaises(ValueError):
+            create_backend("oracle")
+
+
+if __name__ == "__main__":
+    unittest.main()
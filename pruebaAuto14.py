@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import arranque
+from arranque import ImportTimer, LazyModule, lazy_import, preload
+
+
+class TestImportacionesDiferidas(unittest.TestCase):
+    def setUp(self):
+        """Un módulo propio en un directorio temporal, para saber cuándo se importa."""
+        self.dir = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.dir.name, "modulo_diferido.py"), "w") as f:
+            f.write("VALOR = 42\n")
+        sys.path.insert(0, self.dir.name)
+
+    def tearDown(self):
+        sys.path.remove(self.dir.name)
+        sys.modules.pop("modulo_diferido", None)
+        arranque.tiempos_diferidos.pop("modulo_diferido", None)
+        self.dir.cleanup()
+
+    def test_se_importa_al_usarse(self):
+        modulo = lazy_import("modulo_diferido")
+        self.assertIsInstance(modulo, LazyModule)
+        self.assertNotIn("modulo_diferido", sys.modules)
+        self.assertEqual(modulo.VALOR, 42)
+        self.assertIn("modulo_diferido", sys.modules)
+        self.assertIn("modulo_diferido", arranque.tiempos_diferidos)
+        # Si ya está importado se devuelve el módulo real
+        self.assertIs(lazy_import("modulo_diferido"), sys.modules["modulo_diferido"])
+
+    def test_precarga_en_segundo_plano(self):
+        modulo = lazy_import("modulo_diferido")
+        hilo = preload([modulo, "modulo_inexistente_xyz", unittest])
+        hilo.join(timeout=10)
+        self.assertIn("modulo_diferido", sys.modules)
+        self.assertEqual(modulo.VALOR, 42)
+
+    def test_tiempos_de_importacion(self):
+        timer = ImportTimer()
+        timer.start()
+        try:
+            import modulo_diferido  # noqa: F401
+        finally:
+            timer.stop()
+        self.assertIn("modulo_diferido", timer.tiempos)
+        self.assertIn("presupuesto", timer.report(0.1))
+
+
+class TestArranqueInterfaz(unittest.TestCase):
+    def test_interfaz_no_importa_modulos_pesados(self):
+        """Importar Interfaz no carga matplotlib, pyqtgraph, NumPy ni sklearn."""
+        codigo = ("import sys, Interfaz; "
+                  "print(sorted(m for m in ('matplotlib', 'pyqtgraph', 'numpy', 'sklearn') if m in sys.modules))")
+        entorno = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+        try:
+            salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, timeout=60,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)), env=entorno)
+        except subprocess.TimeoutExpired:
+            self.skipTest("La interfaz no terminó de importarse")
+        if salida.returncode != 0:
+            self.skipTest(f"No se pudo importar la interfaz: {salida.stderr.strip()[-200:]}")
+        self.assertEqual(salida.stdout.strip().splitlines()[-1], "[]")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+from dispositivos import PUERTO_POR_DEFECTO, DeviceConfig, DeviceManager
+from escritura import BatchWriter
+
+
+class FakeReader:
+    ocupados = set()  # Puertos que fallan al abrirse
+
+    def __init__(self, puerto, baudrate, protocolo="texto"):
+        if puerto in self.ocupados:
+            raise OSError(f"no se pudo abrir {puerto}")
+        self.puerto = puerto
+        self.baudrate = baudrate
+        self.protocolo = protocolo
+        self.iniciado = False
+        self.detenido = False
+
+    def start(self):
+        self.iniciado = True
+
+    def stop(self):
+        self.detenido = True
+
+
+class TestDeviceConfig(unittest.TestCase):
+    def test_lee_asignacion_y_puerto_por_defecto(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, "dispositivos.json")
+            with open(ruta, "w", encoding="utf-8") as f:
+                json.dump({"dispositivos": [{"artefacto_id": 1, "puerto": "COM8", "baudrate": 115200}]}, f)
+            config = DeviceConfig.load(ruta)
+        self.assertEqual(config.port_of(1), ("COM8", 115200))
+        self.assertEqual(config.port_of(2), (PUERTO_POR_DEFECTO, 9600))
+        self.assertEqual(DeviceConfig.load(os.path.join("no", "existe.json")).port_of(1)[0], PUERTO_POR_DEFECTO)
+
+
+class TestDeviceManager(unittest.TestCase):
+    def setUp(self):
+        config = DeviceConfig([{"artefacto_id": 1, "puerto": "COM7"}, {"artefacto_id": 2, "puerto": "COM8"},
+                               {"artefacto_id": 3, "puerto": "COM7"}])
+        self.abiertos = []
+
+        def abrir(puerto, baudrate, protocolo):
+            lector = FakeReader(puerto, baudrate, protocolo)
+            self.abiertos.append(lector)
+            return lector
+
+        self.manager = DeviceManager(config, abrir)
+        self.addCleanup(FakeReader.ocupados.clear)
+
+    def test_puertos_distintos_a_la_vez(self):
+        """Artefactos en puertos distintos se leen a la vez, cada uno con su lector."""
+        self.assertIsNone(self.manager.start(1))
+        self.assertIsNone(self.manager.start(2))
+        self.assertEqual(list(self.manager.active()), [1, 2])
+        self.assertEqual([l.puerto for l in self.abiertos], ["COM7", "COM8"])
+        self.assertTrue(all(l.iniciado for l in self.abiertos))
+        self.manager.start(1)  # Encender de nuevo no reabre el puerto
+        self.assertEqual(len(self.abiertos), 2)
+
+    def test_mismo_puerto_apaga_al_anterior(self):
+        self.manager.start(1)
+        self.manager.start(2)
+        self.assertEqual(self.manager.start(3), 1)
+        self.assertTrue(self.abiertos[0].detenido)
+        self.assertEqual(list(self.manager.active()), [2, 3])
+
+    def test_falla_al_abrir_un_puerto_compartido(self):
+        """Si el puerto no se abre, la excepción indica qué artefacto quedó apagado."""
+        self.manager.start(1)
+        FakeReader.ocupados.add("COM7")
+        with self.assertRaises(OSError) as error:
+            self.manager.start(3)
+        self.assertEqual(error.exception.desplazado, 1)
+        self.assertTrue(self.abiertos[0].detenido)
+        self.assertEqual(self.manager.active(), {})
+        with self.assertRaises(OSError) as error:
+            self.manager.start(1)
+        self.assertIsNone(error.exception.desplazado)
+
+    def test_apagar_cierra_el_puerto(self):
+        self.manager.start(1)
+        self.manager.start(2)
+        self.manager.stop(1)
+        self.assertTrue(self.abiertos[0].detenido)
+        self.assertFalse(self.manager.is_active(1))
+        self.manager.stop_all()
+        self.assertTrue(self.abiertos[1].detenido)
+        self.assertEqual(self.manager.active(), {})
+
+
+class TestEscrituraPorBloques(unittest.TestCase):
+    def test_bloques_de_varios_artefactos_en_un_escritor(self):
+        conn = MagicMock()
+        writer = BatchWriter(lambda: conn, batch_size=100, max_latencia=0.05)
+        writer.start()
+        inicio = datetime(2024, 5, 1)
+        for artefacto_id in (1, 2, 3):
+            fechas = [inicio + timedelta(seconds=i) for i in range(50)]
+            writer.put_many(fechas, [0.5] * 50, [110.0] * 50, artefacto_id)
+        writer.stop()
+        filas = [fila for llamada in conn.cursor.return_value.executemany.call_args_list for fila in llamada[0][1]]
+        self.assertEqual(len(filas), 150)
+        self.assertEqual(sorted({fila[3] for fila in filas}), [1, 2, 3])
+
+    def test_bloque_respeta_maximo_pendiente(self):
+        writer = BatchWriter(MagicMock, batch_size=1000, max_pendientes=10)
+        writer.put_many([datetime(2024, 5, 1)] * 25, range(25), range(25), 1)
+        self.assertEqual(writer.estadisticas()["pendientes"], 10)
+        self.assertEqual(writer.filas_descartadas, 15)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import time
+import unittest
+from unittest.mock import MagicMock
+import numpy as np
+from adquisicion import TAMANO_TRAMA, FrameDecoder, SampleRingBuffer, SerialReader, encode_frame
+from dispositivos import BAUDRATE_BINARIO, DeviceConfig
+
+
+def tramas(secuencias):
+    return b"".join(encode_frame(s, 10 * s, s / 220, float(s)) for s in secuencias)
+
+
+class TestFrameDecoder(unittest.TestCase):
+    def test_ida_y_vuelta_en_pedazos(self):
+        """Las tramas se recuperan igual aunque lleguen partidas en pedazos arbitrarios."""
+        datos = tramas(range(100))
+        decoder = FrameDecoder()
+        secuencias = []
+        for i in range(0, len(datos), 7):
+            s, millis, corrientes, potencias = decoder.feed(datos[i:i + 7])
+            secuencias.extend(s)
+            np.testing.assert_array_equal(millis, 10 * s)
+            np.testing.assert_allclose(corrientes, s / 220, rtol=1e-6)
+            np.testing.assert_array_equal(potencias, s)
+        self.assertEqual(secuencias, list(range(100)))
+        self.assertEqual((decoder.tramas, decoder.corruptas, decoder.perdidas), (100, 0, 0))
+
+    def test_crc_invalido_y_basura(self):
+        """Una trama corrupta se descarta y tras la basura se resincroniza con la siguiente marca."""
+        corrupta = bytearray(tramas([1]))
+        corrupta[10] ^= 0xFF
+        datos = tramas([0]) + bytes(corrupta) + b"\x00\xa5\x13basura" + tramas([2, 3])
+        decoder = FrameDecoder()
+        secuencias = decoder.feed(datos)[0]
+        self.assertEqual(list(secuencias), [0, 2, 3])
+        self.assertEqual(decoder.corruptas, 1)
+        self.assertEqual(decoder.bytes_descartados, 9)
+        self.assertEqual(decoder.perdidas, 0)  # El hueco de la 1 ya cuenta como corrupta
+
+    def test_corrupta_no_se_cuenta_como_perdida(self):
+        """Solo los huecos que no explica una trama corrupta cuentan como pérdidas."""
+        corrupta = bytearray(tramas([5]))
+        corrupta[10] ^= 0xFF
+        decoder = FrameDecoder()
+        decoder.feed(tramas([0, 1]) + tramas([4]) + bytes(corrupta))
+        self.assertEqual((decoder.corruptas, decoder.perdidas), (1, 2))
+        decoder.feed(tramas([6, 7]))  # El hueco de la 5 aparece en la siguiente lectura
+        self.assertEqual((decoder.corruptas, decoder.perdidas), (1, 2))
+
+    def test_saltos_de_secuencia(self):
+        decoder = FrameDecoder()
+        decoder.feed(tramas([0, 1, 5]))
+        decoder.feed(tramas([6, 10]))
+        self.assertEqual(decoder.perdidas, 3 + 3)
+        decoder = FrameDecoder()
+        decoder.feed(tramas([2 ** 32 - 2, 2 ** 32 - 1, 1]))  # El contador da la vuelta y falta la 0
+        self.assertEqual(decoder.perdidas, 1)
+        decoder = FrameDecoder()
+        decoder.feed(tramas([500, 501]) + tramas([3]))  # Secuencia hacia atrás: reinicio, no pérdida
+        self.assertEqual(decoder.perdidas, 0)
+
+    def test_trama_incompleta_queda_pendiente(self):
+        decoder = FrameDecoder()
+        datos = tramas([7])
+        self.assertEqual(len(decoder.feed(datos[:TAMANO_TRAMA - 1])[0]), 0)
+        self.assertEqual(list(decoder.feed(datos[TAMANO_TRAMA - 1:])[0]), [7])
+        self.assertEqual(decoder.bytes_descartados, 0)
+
+
+class TestLectorBinario(unittest.TestCase):
+    def test_marcas_de_tiempo_desde_millis(self):
+        """Cada muestra se ubica según el reloj del Arduino relativo a la última trama."""
+        arduino = MagicMock()
+        arduino.in_waiting = 3 * TAMANO_TRAMA
+        arduino.read.return_value = tramas([1, 2, 3])
+        reader = SerialReader(arduino, capacidad=8, protocolo="binario")
+        antes = time.time()
+        reader._read_frames()
+        tiempos, corrientes, potencias = reader.buffer.drain()
+        self.assertEqual(list(potencias), [1.0, 2.0, 3.0])
+        np.testing.assert_allclose(np.diff(tiempos), [0.01, 0.01], atol=1e-6)
+        self.assertGreaterEqual(tiempos[-1], antes)
+        self.assertEqual(reader.estadisticas()["lineas"], 3)
+        with self.assertRaises(ValueError):
+            SerialReader(arduino, protocolo="morse")
+
+    def test_bloque_en_bufer_circular(self):
+        buffer = SampleRingBuffer(4)
+        buffer.push(0.0, 0.0, 0.0)
+        buffer.drain()
+        self.assertEqual(buffer.push_many(np.arange(6.0), np.arange(6.0), np.arange(6.0)), 4)
+        self.assertEqual(buffer.descartadas, 2)
+        self.assertEqual(list(buffer.drain()[0]), [0.0, 1.0, 2.0, 3.0])
+
+    def test_configuracion_por_artefacto(self):
+        config = DeviceConfig([{"artefacto_id": 1, "puerto": "COM8", "protocolo": "binario"},
+                               {"artefacto_id": 2, "puerto": "COM9"}])
+        self.assertEqual(config.port_of(1), ("COM8", BAUDRATE_BINARIO))
+        self.assertEqual(config.protocol_of(1), "binario")
+        self.assertEqual(config.protocol_of(2), "texto")
+        self.assertEqual(config.protocol_of(3), "texto")
+
+
+if __name__ == "__main__":
+    unittest.main()
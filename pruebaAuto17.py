@@ -0,0 +1,273 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+import numpy as np
+import agregados
+from almacenamiento import SqliteBackend
+from archivo import ReadingArchive
+from bitacora import ARCHIVO_ESTADO, BITS_CONTADOR, INTERVALO_FSYNC, Spool, SpoolWriter
+from energia import EnergyLedger, TariffSchedule, update_ledger
+from ModeloEntrenamiento import cargar_incremental
+
+
+def fechas(n, inicio=datetime(2024, 5, 1, 8, 0, 0)):
+    return [inicio + timedelta(milliseconds=100 * i) for i in range(n)]
+
+
+class TestSpool(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def segmentos(self):
+        return sorted(n for n in os.listdir(self.dir) if n.endswith(".seg"))
+
+    def test_leer_confirmar_y_reabrir(self):
+        """Lo no confirmado se vuelve a leer al reabrir y los ids siguen creciendo."""
+        spool = Spool(self.dir)
+        ultimo = spool.append(fechas(10), [0.5] * 10, range(10), 1)
+        spool.append(fechas(5), [0.7] * 5, range(5), 2)
+        registros, posicion = spool.read(8)
+        self.assertEqual(len(registros), 10)  # Registros completos: el primer bloque entero
+        self.assertEqual(registros["fecha_us"][1] - registros["fecha_us"][0], 100000)
+        spool.ack(registros, posicion)
+        self.assertEqual((spool.confirmado, spool.pendientes), (ultimo, 5))
+        spool.close()
+
+        spool = Spool(self.dir)
+        self.assertEqual(spool.pendientes, 5)
+        registros, _ = spool.read(100)
+        self.assertEqual(list(registros["artefacto_id"]), [2] * 5)
+        self.assertGreater(spool.append(fechas(1), [1.0], [1.0], 1), registros["ingesta_id"].max())
+        spool.close()
+
+    def test_ids_distintos_entre_equipos(self):
+        """Cada bitácora usa su número de equipo en los bits altos y lo conserva al reabrir."""
+        otro = os.path.join(self.dir, "otro_equipo")
+        a, b = Spool(os.path.join(self.dir, "equipo")), Spool(otro)
+        self.assertNotEqual(a.equipo, b.equipo)
+        ids_a = [a.append(fechas(1), [0.5], [1.0], 1) for _ in range(1000)]
+        ids_b = [b.append(fechas(1), [0.5], [1.0], 1) for _ in range(1000)]
+        self.assertFalse(set(ids_a) & set(ids_b))
+        self.assertEqual({i >> BITS_CONTADOR for i in ids_b}, {b.equipo})
+        a.close()
+        b.close()
+        os.remove(os.path.join(otro, ARCHIVO_ESTADO))  # Sin estado, el equipo sale de los segmentos
+        reabierta = Spool(otro)
+        self.assertEqual(reabierta.equipo, b.equipo)
+        self.assertEqual(reabierta.append(fechas(1), [0.5], [1.0], 1), ids_b[-1] + 1)
+        reabierta.close()
+
+    def test_final_cortado_se_descarta(self):
+        spool = Spool(self.dir)
+        spool.append(fechas(3), [0.5] * 3, [1.0] * 3, 1)
+        spool.close()
+        ruta = os.path.join(self.dir, self.segmentos()[0])
+        tamano = os.path.getsize(ruta)
+        with open(ruta, "ab") as f:
+            f.write(b"\x40\x00\x00\x00\x01\x02")  # Cabecera de un registro que no llegó a escribirse
+        spool = Spool(self.dir)
+        self.assertEqual(os.path.getsize(ruta), tamano)
+        self.assertEqual(len(spool.read(100)[0]), 3)
+        spool.close()
+
+    def test_rotacion_y_borrado_de_confirmados(self):
+        spool = Spool(self.dir, tamano_segmento=500)
+        for _ in range(5):
+            spool.append(fechas(20), [0.5] * 20, [1.0] * 20, 1)  # 728 bytes: un segmento por bloque
+        self.assertEqual(len(self.segmentos()), 5)
+        while spool.pendientes:
+            spool.ack(*spool.read(30))
+        spool.ack(*spool.read(30))
+        self.assertEqual(self.segmentos(), [])
+        self.assertTrue(os.path.exists(os.path.join(self.dir, ARCHIVO_ESTADO)))
+        spool.append(fechas(1), [0.5], [1.0], 1)
+        self.assertEqual(len(spool.read(10)[0]), 1)
+        spool.close()
+
+
+class FailingBackend(SqliteBackend):
+    """Backend SQLite que falla mientras `caido` sea verdadero."""
+
+    caido = True
+
+    def insert_spooled(self, conn, filas):
+        if self.caido:
+            raise sqlite3.OperationalError("servidor no disponible")
+        super().insert_spooled(conn, filas)
+
+
+class SlowBackend(SqliteBackend):
+    """Backend SQLite que tarda `demora` segundos en cada lote."""
+
+    demora = 0.05
+
+    def insert_spooled(self, conn, filas):
+        time.sleep(self.demora)
+        super().insert_spooled(conn, filas)
+
+
+class TestSpoolWriter(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.ruta_bitacora = os.path.join(self.dir, "bitacora")
+        self.backend = FailingBackend(os.path.join(self.dir, "monitoreo.db"))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def contar(self):
+        conn = self.backend.connect()
+        try:
+            return conn.execute("SELECT COUNT(*), COUNT(DISTINCT ingesta_id) FROM Lecturas").fetchone()
+        finally:
+            conn.close()
+
+    def test_base_caida_no_pierde_lecturas(self):
+        """Con la base caída las lecturas quedan en la bitácora y se cargan al reiniciar."""
+        writer = SpoolWriter(self.backend.connect, Spool(self.ruta_bitacora), batch_size=50,
+                             max_latencia=0.05, backend=self.backend)
+        writer.start()
+        writer.put_many(fechas(120), [0.5] * 120, range(120), 1)
+        writer.put(0.5, 120.0, 1)
+        self.assertFalse(writer.flush(timeout=0.3))
+        writer.stop()
+        self.assertGreater(writer.errores, 0)
+        self.assertEqual(self.contar(), (0, 0))
+
+        self.backend.caido = False
+        writer = SpoolWriter(self.backend.connect, Spool(self.ruta_bitacora), batch_size=50,
+                             max_latencia=0.05, backend=self.backend)
+        writer.start()
+        self.assertTrue(writer.flush(timeout=5))
+        writer.stop()
+        self.assertEqual(self.contar(), (121, 121))
+        self.assertEqual(writer.estadisticas()["pendientes"], 0)
+
+    def test_base_lenta_con_lecturas_continuas(self):
+        """Aunque las lecturas lleguen tan rápido como se cargan, se hace fsync a tiempo y el hilo se detiene."""
+        backend = SlowBackend(os.path.join(self.dir, "lenta.db"))
+        spool = Spool(self.ruta_bitacora)
+        syncs = []
+        sync = spool.sync
+        spool.sync = lambda: syncs.append(time.monotonic()) or sync()
+        writer = SpoolWriter(backend.connect, spool, batch_size=20, max_latencia=0.05, backend=backend)
+        writer.start()
+        detener = threading.Event()
+        enviadas = []
+
+        def producir():
+            while not detener.is_set():
+                writer.put_many(fechas(20), [0.5] * 20, range(20), 1)
+                enviadas.append(20)
+                time.sleep(0.01)  # Más rápido de lo que la base carga un lote
+
+        productor = threading.Thread(target=producir)
+        productor.start()
+        try:
+            time.sleep(1.0)
+            inicio = time.monotonic()
+            writer.stop(timeout=1.0)
+            self.assertFalse(writer.is_alive())
+            self.assertLess(time.monotonic() - inicio, 1.0)
+        finally:
+            detener.set()
+            productor.join()
+        self.assertGreater(writer.filas_escritas, 0)
+        intervalos = np.diff([t for t in syncs if t < inicio])
+        self.assertLess(intervalos.max(), INTERVALO_FSYNC + 4 * backend.demora)
+        conn = backend.connect()
+        guardadas = conn.execute("SELECT COUNT(*) FROM Lecturas").fetchone()[0]
+        conn.close()
+        self.assertEqual(guardadas, writer.filas_escritas)
+        self.assertEqual(guardadas + Spool(self.ruta_bitacora).pendientes, sum(enviadas))
+
+    def test_reenvio_sin_confirmar_no_duplica(self):
+        """Si se cierra tras el INSERT y antes de confirmar, el reenvío no duplica filas."""
+        self.backend.caido = False
+        spool = Spool(self.ruta_bitacora)
+        spool.append(fechas(40), [0.5] * 40, range(40), 1)
+        registros, _ = spool.read(100)
+        conn = self.backend.connect()
+        filas = [(datetime(2024, 5, 1), 0.5, 1.0, 1, int(i)) for i in registros["ingesta_id"][:25]]
+        self.backend.insert_spooled(conn, filas)
+        conn.commit()
+        conn.close()
+        spool.close()
+
+        writer = SpoolWriter(self.backend.connect, Spool(self.ruta_bitacora), backend=self.backend)
+        writer.start()
+        self.assertTrue(writer.flush(timeout=5))
+        writer.stop()
+        self.assertEqual(self.contar(), (40, 40))
+
+
+class TestLecturasTardias(unittest.TestCase):
+    """Lecturas que la bitácora carga después de que las marcas de agua ya pasaron su hora."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.backend = SqliteBackend(os.path.join(self.dir, "monitoreo.db"))
+        self.conn = self.backend.connect()
+        self.backend.add_artefacto(self.conn, "Hervidor")
+        self.archivo = ReadingArchive(os.path.join(self.dir, "archivo"))
+        self.ruta_estado = os.path.join(self.dir, "entrenamiento_estado.npz")
+        self.tarifa = TariffSchedule([{"nombre": "Única", "desde": "00:00", "hasta": "00:00", "precio_kwh": 1.0}])
+        self.ledger = EnergyLedger(self.tarifa.firma)
+        self.ahora = datetime.now().replace(microsecond=0)
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.dir)
+
+    def lecturas(self, desde, n):
+        """n lecturas de 600 W cada 10 s."""
+        return [desde + timedelta(seconds=10 * i) for i in range(n)]
+
+    def procesar(self):
+        """Una pasada de cada proceso incremental; devuelve las lecturas nuevas del reservorio."""
+        agregados.update(self.conn, margen=timedelta(0))
+        self.archivo.sync(self.conn, margen=timedelta(0))
+        update_ledger(self.conn, self.ledger, self.tarifa, [1])
+        muestra, guardar = cargar_incremental(timedelta(0), connect=self.backend.connect, ruta=self.ruta_estado)
+        guardar()
+        return len(muestra)
+
+    def test_segmento_antiguo_despues_de_la_marca(self):
+        recientes = self.lecturas(self.ahora - timedelta(hours=2), 360)
+        self.backend.insert_readings(self.conn, [(f, 600 / 220, 600.0, 1) for f in recientes])
+        self.conn.commit()
+        self.assertEqual(self.procesar(), 360)
+        self.assertEqual(agregados.watermark(self.conn, 1), recientes[-1])
+
+        # La base estuvo caída: la bitácora carga ahora lecturas de hace cinco horas
+        antiguas = self.lecturas(self.ahora - timedelta(hours=5), 180)
+        spool = Spool(os.path.join(self.dir, "bitacora"))
+        spool.append(antiguas, [600 / 220] * 180, [600.0] * 180, 1)
+        writer = SpoolWriter(self.backend.connect, spool, backend=self.backend)
+        writer.start()
+        self.assertTrue(writer.flush(timeout=5))
+        writer.stop()
+        self.assertEqual(self.procesar(), 540)
+
+        total = self.conn.execute("SELECT SUM(lecturas), SUM(energia_wh) FROM Agregados_Minuto").fetchone()
+        self.assertEqual(total[0], 540)
+        # 179 + 359 intervalos de 10 s a 600 W; el hueco entre los dos bloques no suma
+        self.assertAlmostEqual(total[1], (179 + 359) * 10 * 600 / 3600)
+        tiempos = self.archivo.read_range(1)[0]
+        self.assertEqual(len(tiempos), 540)
+        self.assertTrue(np.all(np.diff(tiempos) > 0))
+        self.assertAlmostEqual(self.ledger.kwh[1].sum(), total[1] / 1000)
+
+        self.assertEqual(self.procesar(), 540)  # Sin lecturas nuevas no cambia nada
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from almacenamiento import SqliteBackend
+from sesion import Session, authenticate, check_password
+
+
+class CountingConnection:
+    """Envuelve una conexión y cuenta las consultas hechas con sus cursores."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.consultas = 0
+        self.cerrada = False
+
+    def cursor(self):
+        conexion = self
+        cursor = self.conn.cursor()
+
+        class Cursor:
+            def execute(self, *args):
+                conexion.consultas += 1
+                return cursor.execute(*args)
+
+            def __getattr__(self, nombre):
+                return getattr(cursor, nombre)
+
+        return Cursor()
+
+    def close(self):
+        self.cerrada = True
+        self.conn.close()
+
+
+class TestSesion(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.backend = SqliteBackend(os.path.join(self.dir, "monitoreo.db"))
+        conn = self.backend.connect()
+        self.backend.add_user(conn, "ana", "clave", "usuario", "JBSWY3DPEHPK3PXP", "Ana", "Pérez")
+        self.backend.add_user(conn, "luis", "otra", "admin")
+        conn.close()
+        self.conexiones = []
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def connect(self):
+        conn = CountingConnection(self.backend.connect())
+        self.conexiones.append(conn)
+        return conn
+
+    def test_una_consulta_trae_todo_el_perfil(self):
+        """Rol, secreto TOTP y nombre completo salen de la misma consulta que valida la contraseña."""
+        session = authenticate("ana", "clave", self.connect, self.backend)
+        self.assertEqual((session.username, session.role, session.totp_secret), ("ana", "usuario", "JBSWY3DPEHPK3PXP"))
+        self.assertEqual(session.full_name, "Ana Pérez")
+        self.assertEqual([c.consultas for c in self.conexiones], [1])
+        self.assertTrue(self.conexiones[0].cerrada)
+
+    def test_credenciales_incorrectas(self):
+        self.assertIsNone(authenticate("ana", "mal", self.connect, self.backend))
+        self.assertIsNone(authenticate("nadie", "clave", self.connect, self.backend))
+        self.assertTrue(all(c.cerrada for c in self.conexiones))
+
+    def test_nombre_por_defecto_y_hash_en_mayusculas(self):
+        self.assertEqual(authenticate("luis", "otra", self.connect, self.backend).full_name, "luis")
+        self.assertEqual(Session("eva", "usuario", nombres="Eva").full_name, "eva")
+        # Hashes guardados en mayúsculas (como los del respaldo) también valen
+        self.assertTrue(check_password("clave", hashlib.sha256(b"clave").hexdigest().upper()))
+        self.assertFalse(check_password("clave", None))
+
+
+if __name__ == "__main__":
+    unittest.main()
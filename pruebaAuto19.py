@@ -0,0 +1,79 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from almacenamiento import SqliteBackend
+from catalogo import SQL_ARTEFACTOS, ArtefactoCatalog
+
+
+class VersionedSqliteBackend(SqliteBackend):
+    """SQLite con una consulta de versión, como la de SQL Server."""
+
+    sql_version_artefactos = "SELECT COUNT(*), group_concat(id || ':' || nombre) FROM artefactos"
+
+
+class TestCatalogoArtefactos(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.backend = VersionedSqliteBackend(os.path.join(self.dir, "monitoreo.db"))
+        self.conn = self.backend.connect()
+        for nombre in ("Refrigeradora", "Lavadora"):
+            self.backend.add_artefacto(self.conn, nombre)
+        self.abiertas = 0
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.dir)
+
+    def connect(self):
+        self.abiertas += 1
+        return self.backend.connect()
+
+    def test_una_carga_compartida(self):
+        """Dentro del TTL todos los usos salen de memoria, sin abrir conexiones."""
+        catalogo = ArtefactoCatalog(self.backend, self.connect, ttl=3600)
+        self.assertEqual(catalogo.all(), [(1, "Refrigeradora"), (2, "Lavadora")])
+        self.assertEqual(catalogo.name_of(2), "Lavadora")
+        self.assertEqual(catalogo.id_of("Refrigeradora"), 1)
+        self.assertIsNone(catalogo.name_of(99))
+        self.backend.add_artefacto(self.conn, "Horno")
+        self.assertEqual(len(catalogo.all()), 2)  # Aún dentro del TTL
+        self.assertEqual((self.abiertas, catalogo.cargas), (1, 1))
+        catalogo.invalidate()
+        self.assertEqual(catalogo.name_of(3), "Horno")
+        self.assertEqual(catalogo.cargas, 2)
+
+    def test_version_evita_recargas(self):
+        """Vencido el TTL se consulta la versión y la lista solo se recarga si cambió."""
+        catalogo = ArtefactoCatalog(self.backend, self.connect, ttl=0)
+        catalogo.all()
+        catalogo.all()
+        self.assertEqual((catalogo.cargas, catalogo.verificaciones), (1, 2))
+        self.conn.execute("UPDATE artefactos SET nombre = 'Secadora' WHERE id = 2")
+        self.conn.commit()
+        self.assertEqual(catalogo.name_of(2), "Secadora")
+        self.assertEqual(catalogo.cargas, 2)
+
+    def test_base_caida_usa_la_ultima_lista(self):
+        catalogo = ArtefactoCatalog(self.backend, self.connect, ttl=0)
+        catalogo.all()
+        catalogo.connect = MagicMock(side_effect=sqlite3.OperationalError("sin conexión"))
+        self.assertEqual(catalogo.name_of(1), "Refrigeradora")
+        with self.assertRaises(sqlite3.OperationalError):
+            ArtefactoCatalog(self.backend, catalogo.connect).all()
+
+    def test_conexion_del_panel(self):
+        """Con la conexión de un panel se usa la consulta de siempre y la conexión no se cierra."""
+        conn = MagicMock()
+        conn.cursor.return_value.fetchall.return_value = [(2, "Artefacto 2"), (1, "Artefacto 1")]
+        catalogo = ArtefactoCatalog(SqliteBackend(":memory:"), self.connect)
+        self.assertEqual(catalogo.all(conn), [(1, "Artefacto 1"), (2, "Artefacto 2")])
+        conn.cursor.return_value.execute.assert_called_with(SQL_ARTEFACTOS)
+        conn.close.assert_not_called()
+        self.assertEqual(self.abiertas, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import csv
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+import Interfaz
+
+
+class TestExportacionCSV(unittest.TestCase):
+    def setUp(self):
+        """Lecturas de dos artefactos en una base SQLite; la exportación toma sus conexiones de ahí."""
+        self.dir = tempfile.mkdtemp()
+        self.ruta_db = os.path.join(self.dir, "monitoreo.db")
+        conn = self.connect()
+        conn.execute("CREATE TABLE Lecturas (id INTEGER PRIMARY KEY, fecha_hora TIMESTAMP, corriente REAL, "
+                     "potencia REAL, artefacto_id INTEGER)")
+        self.inicio = datetime(2024, 5, 1, 8, 0, 0)
+        conn.executemany("INSERT INTO Lecturas (fecha_hora, corriente, potencia, artefacto_id) VALUES (?, ?, ?, ?)",
+                         [(self.inicio + timedelta(seconds=i), 0.5, float(i), 1 + i % 2) for i in range(50)])
+        conn.commit()
+        conn.close()
+        self.mensajes = []
+        self.avances = []
+        parche = patch.object(Interfaz, "get_connection", self.connect)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def connect(self):
+        return sqlite3.connect(self.ruta_db, detect_types=sqlite3.PARSE_DECLTYPES)
+
+    def exportar(self, nombre, **kwargs):
+        ruta = os.path.join(self.dir, nombre)
+        worker = Interfaz.CSVExportWorker(ruta, 1, **kwargs)
+        worker.finished.connect(self.mensajes.append)
+        worker.progress.connect(lambda n, total: self.avances.append((n, total)))
+        return ruta, worker
+
+    def test_por_bloques(self):
+        """El archivo tiene el encabezado y todas las lecturas del artefacto en orden."""
+        ruta, worker = self.exportar("lecturas.csv", chunk_size=7)
+        worker.run()
+        with open(ruta, newline="", encoding="utf-8") as f:
+            filas = list(csv.reader(f))
+        self.assertEqual(filas[0], ["Fecha y Hora", "Corriente (A)", "Potencia (W)"])
+        self.assertEqual([float(fila[2]) for fila in filas[1:]], [float(i) for i in range(0, 50, 2)])
+        self.assertEqual(filas[1][0], str(self.inicio))
+        self.assertEqual(self.avances[0], (0, 25))
+        self.assertEqual(self.avances[-1], (25, 25))
+        self.assertEqual(len(self.avances), 1 + 4)  # 25 filas en bloques de 7
+        self.assertEqual(self.mensajes, ["Exportación completada con éxito (25 lecturas)."])
+
+    def test_rango_comprimido(self):
+        """Con rango y compresión se escribe un gzip solo con las lecturas del rango semiabierto."""
+        ruta, worker = self.exportar("lecturas.csv.gz", comprimir=True, desde=self.inicio + timedelta(seconds=10),
+                                     hasta=self.inicio + timedelta(seconds=20))
+        worker.run()
+        with gzip.open(ruta, mode="rt", newline="", encoding="utf-8") as f:
+            filas = list(csv.reader(f))
+        self.assertEqual([float(fila[2]) for fila in filas[1:]], [10.0, 12.0, 14.0, 16.0, 18.0])
+        self.assertEqual(self.mensajes, ["Exportación completada con éxito (5 lecturas)."])
+
+    def test_cancelacion_borra_el_archivo(self):
+        """Cancelar a mitad de la exportación no deja un archivo a medias."""
+        ruta, worker = self.exportar("lecturas.csv", chunk_size=5)
+        with patch.object(worker, "isInterruptionRequested", side_effect=[False, False, True]):
+            worker.run()
+        self.assertFalse(os.path.exists(ruta))
+        self.assertEqual(self.avances[-1], (10, 25))
+        self.assertEqual(self.mensajes, ["Exportación cancelada."])
+
+    def test_error_se_informa(self):
+        ruta, worker = self.exportar(os.path.join("no_existe", "lecturas.csv"))
+        worker.run()
+        self.assertEqual(len(self.mensajes), 1)
+        self.assertTrue(self.mensajes[0].startswith("Error durante la exportación:"))
+
+
+if __name__ == "__main__":
+    unittest.main()
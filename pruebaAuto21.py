@@ -0,0 +1,181 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+import joblib
+import numpy as np
+from sklearn.ensemble import IsolationForest
+from modelos import VERSION_PAQUETE, ModelRegistry, StreamingScorer, file_hash
+
+
+class Umbral:
+    """Modelo de reglas fijas que se puede guardar con joblib: anómala si la potencia llega al límite."""
+
+    def __init__(self, limite):
+        self.limite = limite
+
+    def predict(self, X):
+        return np.where(X[:, 1] >= self.limite, -1, 1)
+
+
+class TestRegistroDeModelos(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.ruta = os.path.join(self.dir, "modelo.pkl")
+        self.guardar(Umbral(900.0), mtime=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def guardar(self, model, mtime):
+        """Guarda el modelo con una fecha de modificación fija, para no depender de la resolución del reloj."""
+        joblib.dump(model, self.ruta)
+        self.tocar(mtime)
+
+    def tocar(self, mtime):
+        os.utime(self.ruta, ns=(mtime * 10 ** 9, mtime * 10 ** 9))
+
+    def esperar_recarga(self, registry):
+        if registry._hilo is not None:
+            registry._hilo.join(timeout=10)
+
+    def test_una_sola_carga(self):
+        """Mientras el archivo no cambie, todas las consultas usan el modelo en caché."""
+        registry = ModelRegistry(self.ruta)
+        model = registry.get()
+        self.assertEqual(model.limite, 900.0)
+        self.assertIs(registry.get(), model)
+        self.assertIs(registry.get_for(3), model)
+        self.assertFalse(registry.is_stale())
+        self.assertEqual((registry.loads, registry.hash), (1, file_hash(self.ruta)))
+
+    def test_recarga_al_cambiar_el_archivo(self):
+        """Un archivo nuevo se carga en segundo plano; mientras tanto se sigue usando el anterior."""
+        registry = ModelRegistry(self.ruta)
+        anterior = registry.get()
+        self.guardar(Umbral(500.0), mtime=2)
+        self.assertTrue(registry.is_stale())
+        liberar = threading.Event()
+        cargar = joblib.load
+
+        def carga_lenta(ruta):
+            liberar.wait(10)  # La carga de fondo no termina hasta que la prueba lo decide
+            return cargar(ruta)
+
+        with patch("joblib.load", side_effect=carga_lenta):
+            self.assertIs(registry.get(), anterior)  # Lanza la recarga en segundo plano
+            self.assertTrue(registry._hilo.is_alive())
+            self.assertIs(registry.get(), anterior)
+            self.assertEqual(registry.loads, 1)
+            liberar.set()
+            self.esperar_recarga(registry)
+        self.assertEqual(registry.get().limite, 500.0)
+        self.assertEqual((registry.loads, registry.hash), (2, file_hash(self.ruta)))
+        self.assertEqual(list(registry.predict(np.array([1, 1]), np.array([[1.0, 600.0], [1.0, 100.0]]))), [-1, 1])
+
+    def test_mismo_contenido_no_recarga(self):
+        """Si solo cambia la fecha de modificación se revisa el hash y se conserva el modelo."""
+        registry = ModelRegistry(self.ruta)
+        model = registry.get()
+        self.tocar(5)
+        self.assertTrue(registry.is_stale())
+        registry.get()
+        self.esperar_recarga(registry)
+        self.assertIs(registry.get(), model)
+        self.assertFalse(registry.is_stale())
+        self.assertEqual(registry.loads, 1)
+
+    def test_archivo_danado_conserva_el_anterior(self):
+        registry = ModelRegistry(self.ruta)
+        model = registry.get()
+        with open(self.ruta, "wb") as f:
+            f.write(b"no es un modelo")
+        self.tocar(3)
+        registry.get()
+        self.esperar_recarga(registry)
+        self.assertIs(registry.get(), model)
+        self.assertIsNotNone(registry.error)
+        self.assertEqual(registry.loads, 1)
+
+    def test_sin_modelo(self):
+        registry = ModelRegistry(os.path.join(self.dir, "no_existe.pkl"))
+        with self.assertRaises(FileNotFoundError):
+            registry.get()
+
+
+class TestPuntuacionEnVivo(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Un modelo entrenado de verdad y lecturas en vivo con algunos picos."""
+        rng = np.random.default_rng(0)
+        entrenamiento = np.column_stack((rng.normal(0.5, 0.05, 2000), rng.normal(110.0, 5.0, 2000)))
+        cls.model = IsolationForest(n_estimators=50, random_state=0).fit(entrenamiento)
+        cls.corrientes = rng.normal(0.5, 0.05, 1000)
+        cls.potencias = rng.normal(110.0, 5.0, 1000)
+        cls.potencias[::50] = 400.0
+        cls.tiempos = np.arange(1000) * 0.1
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def registro(self, model):
+        ruta = os.path.join(self.dir, "modelo.pkl")
+        joblib.dump(model, ruta)
+        return ModelRegistry(ruta)
+
+    def puntuar(self, scorer, bloque=37):
+        """Envía las lecturas en bloques y espera a que estén todas puntuadas."""
+        scorer.start()
+        try:
+            for i in range(0, len(self.tiempos), bloque):
+                scorer.submit(self.tiempos[i:i + bloque], self.corrientes[i:i + bloque], self.potencias[i:i + bloque])
+            limite = time.monotonic() + 10
+            while scorer.puntuadas < len(self.tiempos) and time.monotonic() < limite:
+                time.sleep(0.01)
+        finally:
+            scorer.stop()
+        return [np.concatenate(c) for c in zip(*scorer.drain_results())]
+
+    def test_igual_que_predecir_todo_junto(self):
+        """Los micro-lotes dan las mismas anomalías que `model.predict` sobre todas las lecturas."""
+        scorer = StreamingScorer(self.registro(self.model), max_lote=128)
+        tiempos, corrientes, potencias, anomalas = self.puntuar(scorer)
+        np.testing.assert_array_equal(tiempos, self.tiempos)
+        np.testing.assert_array_equal(potencias, self.potencias)
+        esperadas = self.model.predict(np.column_stack((self.corrientes, self.potencias))) == -1
+        np.testing.assert_array_equal(anomalas, esperadas)
+        self.assertTrue(anomalas[::50].all())
+        estadisticas = scorer.estadisticas()
+        self.assertEqual((estadisticas["puntuadas"], estadisticas["descartadas"]), (1000, 0))
+        self.assertEqual(estadisticas["anomalias"], int(esperadas.sum()))
+        self.assertIsNone(scorer.error)
+
+    def test_modelo_del_artefacto(self):
+        """Con un paquete por artefacto se usa el modelo propio del artefacto monitoreado."""
+        paquete = {"version": VERSION_PAQUETE, "modelos": {2: Umbral(300.0)}, "global": Umbral(0.0)}
+        scorer = StreamingScorer(self.registro(paquete), artefacto_id=2)
+        anomalas = self.puntuar(scorer)[3]
+        np.testing.assert_array_equal(anomalas, self.potencias >= 300.0)
+
+    def test_cola_llena_descarta_lo_mas_viejo(self):
+        scorer = StreamingScorer(self.registro(self.model), max_cola=2)
+        for i in range(3):
+            scorer.submit(self.tiempos[10 * i:10 * i + 10], self.corrientes[:10], self.potencias[:10])
+        self.assertEqual(scorer.descartadas, 10)
+        scorer.start()
+        limite = time.monotonic() + 10
+        while scorer.puntuadas < 20 and time.monotonic() < limite:
+            time.sleep(0.01)
+        scorer.stop()
+        tiempos = np.concatenate([r[0] for r in scorer.drain_results()])
+        np.testing.assert_array_equal(tiempos, self.tiempos[10:30])
+
+
+if __name__ == "__main__":
+    unittest.main()
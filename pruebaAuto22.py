@@ -0,0 +1,137 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+import numpy as np
+import ModeloEntrenamiento
+from almacenamiento import SqliteBackend
+from ModeloEntrenamiento import actualizar_reservorio, cargar_estado, cargar_incremental, guardar_estado
+
+
+class TestReservorio(unittest.TestCase):
+    def test_bloques_menores_que_la_capacidad(self):
+        """Hasta llenarse, el reservorio guarda las lecturas tal cual y en orden."""
+        reservorio = np.empty((10, 2))
+        rng = np.random.default_rng(0)
+        vistos = actualizar_reservorio(reservorio, 0, np.full((4, 2), 1.0), rng)
+        vistos = actualizar_reservorio(reservorio, vistos, np.full((4, 2), 2.0), rng)
+        self.assertEqual(vistos, 8)
+        np.testing.assert_array_equal(reservorio[:8, 0], [1.0] * 4 + [2.0] * 4)
+
+    def test_muestra_uniforme(self):
+        """Cada lectura termina en el reservorio con probabilidad k/N, sin importar el bloque en que llegó."""
+        rng = np.random.default_rng(1)
+        apariciones = np.zeros(100)
+        for _ in range(2000):
+            reservorio = np.empty((10, 2))
+            vistos = 0
+            for inicio in range(0, 100, 30):  # Bloques mayores que la capacidad
+                bloque = np.arange(inicio, min(inicio + 30, 100), dtype=np.float64)
+                vistos = actualizar_reservorio(reservorio, vistos, np.column_stack((bloque, bloque)), rng)
+            self.assertEqual(len(np.unique(reservorio[:, 0])), 10)
+            apariciones[reservorio[:, 0].astype(int)] += 1
+        self.assertEqual(vistos, 100)
+        frecuencias = apariciones / 2000
+        self.assertLess(np.abs(frecuencias - 0.1).max(), 0.03)
+        self.assertLess(abs(frecuencias[:50].mean() - frecuencias[50:].mean()), 0.01)
+
+
+class TestEntrenamientoIncremental(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.backend = SqliteBackend(os.path.join(self.dir, "monitoreo.db"))
+        self.conn = self.backend.connect()
+        self.ruta = os.path.join(self.dir, "entrenamiento_estado.npz")
+        self.inicio = datetime.now().replace(microsecond=0) - timedelta(hours=3)
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.dir)
+
+    def insertar(self, desde, n, artefacto_id=1):
+        """n lecturas cada 10 s desde el segundo `desde`; la potencia es el segundo, para reconocerlas."""
+        self.backend.insert_readings(self.conn, [(self.inicio + timedelta(seconds=10 * s), 0.5, float(s), artefacto_id)
+                                                 for s in range(desde, desde + n)])
+        self.conn.commit()
+
+    def cargar(self, margen=timedelta(0)):
+        return cargar_incremental(margen, connect=self.backend.connect, ruta=self.ruta)
+
+    def test_ida_y_vuelta_del_estado(self):
+        """La marca de agua, el último id y el reservorio guardados son el punto de partida de la siguiente pasada."""
+        self.insertar(0, 30)
+        self.insertar(30, 5, artefacto_id=None)  # Sin artefacto: no se entrena con ellas
+        with patch.object(ModeloEntrenamiento, "TAMANO_BLOQUE", 7):
+            muestra, guardar = self.cargar()
+        self.assertEqual(sorted(muestra[:, 1]), [float(s) for s in range(30)])
+        self.assertFalse(os.path.exists(self.ruta))  # Nada se guarda hasta que el modelo quedó escrito
+        guardar()
+        marca, ultimo_id, reservorio, vistos = cargar_estado(self.ruta)
+        self.assertEqual(marca, self.inicio + timedelta(seconds=290))
+        self.assertEqual((ultimo_id, vistos), (35, 30))
+        np.testing.assert_array_equal(reservorio[:30], muestra)
+
+        # Sin lecturas nuevas se entrena con el mismo reservorio
+        muestra, guardar = self.cargar()
+        self.assertEqual(sorted(muestra[:, 1]), [float(s) for s in range(30)])
+        guardar()
+        self.insertar(40, 10)
+        muestra, guardar = self.cargar()
+        self.assertEqual(sorted(muestra[:, 1]), [float(s) for s in range(30)] + [float(s) for s in range(40, 50)])
+        guardar()
+        self.assertEqual(cargar_estado(self.ruta)[3], 40)
+
+    def test_sin_guardar_se_vuelve_a_leer(self):
+        """Si el entrenamiento falla antes de guardar, las mismas lecturas entran en la siguiente pasada."""
+        self.insertar(0, 10)
+        self.cargar()[1]()
+        self.insertar(10, 10)
+        self.cargar()  # No se llega a guardar
+        muestra, guardar = self.cargar()
+        self.assertEqual(len(muestra), 20)
+        guardar()
+        self.assertEqual(cargar_estado(self.ruta)[3], 20)
+
+    def test_margen_deja_las_recientes_para_despues(self):
+        self.insertar(0, 10)
+        reciente = datetime.now().replace(microsecond=0)
+        self.backend.insert_readings(self.conn, [(reciente, 0.5, 999.0, 1)])
+        self.conn.commit()
+        muestra, guardar = self.cargar(margen=timedelta(minutes=5))
+        self.assertNotIn(999.0, muestra[:, 1])
+        guardar()
+        self.assertIn(999.0, self.cargar()[0][:, 1])
+
+    def test_reservorio_lleno_conserva_su_capacidad(self):
+        """Un reservorio guardado ya lleno se sigue muestreando con la misma capacidad."""
+        self.insertar(0, 25)
+        muestra, _ = self.cargar()
+        guardar_estado(self.inicio + timedelta(seconds=240), 25, muestra[:20].copy(), 25, self.ruta)
+        self.insertar(25, 30)
+        muestra, guardar = self.cargar()
+        self.assertEqual(len(muestra), 20)
+        self.assertTrue(set(muestra[:, 1]) <= {float(s) for s in range(55)})
+        guardar()
+        reservorio, vistos = cargar_estado(self.ruta)[2:]
+        self.assertEqual((len(reservorio), vistos), (20, 55))
+
+    def test_guardado_atomico(self):
+        """Un guardado que falla deja intacto el estado anterior; uno completo no deja temporales."""
+        reservorio = np.arange(20, dtype=np.float64).reshape(10, 2)
+        marca = datetime(2024, 5, 1, 8, 0, 0)
+        guardar_estado(marca, 7, reservorio, 10, self.ruta)
+        self.assertTrue(os.path.exists(self.ruta))
+        self.assertEqual([f for f in os.listdir(self.dir) if ".tmp" in f], [])
+
+        with patch.object(ModeloEntrenamiento.os, "replace", side_effect=OSError("disco lleno")):
+            with self.assertRaises(OSError):
+                guardar_estado(marca + timedelta(days=1), 99, np.zeros((10, 2)), 50, self.ruta)
+        guardado, ultimo_id, leido, vistos = cargar_estado(self.ruta)
+        self.assertEqual((guardado, ultimo_id, vistos), (marca, 7, 10))
+        np.testing.assert_array_equal(leido[:10], reservorio)
+
+
+if __name__ == "__main__":
+    unittest.main()
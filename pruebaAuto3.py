@@ -0,0 +1,103 @@
+import time
+import unittest
+from unittest.mock import patch
+from adquisicion import LineDecoder, SampleRingBuffer, SerialReader
+
+
+class FakeSerial:
+    """Puerto serie simulado que entrega líneas predefinidas, de a pedazos de `bloque` bytes."""
+
+    def __init__(self, lineas, bloque=16):
+        self.datos = b"".join(lineas)
+        self.bloque = bloque
+        self.cerrado = False
+
+    @property
+    def in_waiting(self):
+        return min(self.bloque, len(self.datos))
+
+    def read(self, n):
+        if self.datos:
+            bloque, self.datos = self.datos[:n], self.datos[n:]
+            return bloque
+        time.sleep(0.01)
+        return b""
+
+    def close(self):
+        self.cerrado = True
+
+
+class TestAdquisicion(unittest.TestCase):
+    def test_decodificador_por_bloques(self):
+        """Verifica que las líneas partidas entre bloques se unan y las malformadas se cuenten."""
+        decoder = LineDecoder()
+        corrientes, potencias = decoder.feed(b"Irms: 0.50 A, Potencia: 110.0 W\r\nIrms: 0.7")
+        self.assertEqual((list(corrientes), list(potencias)), ([0.5], [110.0]))
+        corrientes, _ = decoder.feed(b"5 A, Potencia: 165 W\r\nIniciando sensor...\r\n\r\nIrms: abc A, Potencia: W\r\n"
+                                     b"Irms:1.5A,Potencia:3.3e2W\n")
+        self.assertEqual(list(corrientes), [0.75, 1.5])
+        self.assertEqual((decoder.lineas, decoder.invalidas), (6, 3))
+        decoder.feed(b"\xff" * 1000)  # Sin saltos de línea: se descarta en lugar de acumularse
+        self.assertEqual(decoder.invalidas, 4)
+        # Un atraso de miles de líneas se interpreta en una sola pasada
+        corrientes, _ = decoder.feed(b"Irms: 1.00 A, Potencia: 220.00 W\r\n" * 5000)
+        self.assertEqual(len(corrientes), 5000)
+
+    def test_ring_buffer_drain(self):
+        """Verifica que las muestras salgan en orden y el búfer quede vacío."""
+        buffer = SampleRingBuffer(capacidad=4)
+        for i in range(3):
+            buffer.push(float(i), i * 0.5, i * 100.0)
+        tiempos, corrientes, potencias = buffer.drain()
+        self.assertEqual(list(tiempos), [0.0, 1.0, 2.0])
+        self.assertEqual(list(potencias), [0.0, 100.0, 200.0])
+        self.assertEqual(len(buffer), 0)
+
+    def test_ring_buffer_overrun(self):
+        """Verifica que al llenarse el búfer se cuenten las muestras descartadas."""
+        buffer = SampleRingBuffer(capacidad=2)
+        self.assertTrue(buffer.push(0.0, 1.0, 1.0))
+        self.assertTrue(buffer.push(1.0, 1.0, 1.0))
+        self.assertFalse(buffer.push(2.0, 1.0, 1.0))
+        self.assertEqual(buffer.descartadas, 1)
+
+        # Tras vaciarlo, las ranuras se reutilizan de forma circular
+        buffer.drain()
+        buffer.push(3.0, 2.0, 2.0)
+        tiempos, _, _ = buffer.drain()
+        self.assertEqual(list(tiempos), [3.0])
+
+    def test_serial_reader(self):
+        """Verifica que el hilo lector llene el búfer y cuente las líneas inválidas."""
+        puerto = FakeSerial([b"Irms: 0.50 A, Potencia: 110.0 W\r\n", b"basura\r\n",
+                             b"Irms: 0.75 A, Potencia: 165.0 W\r\n"])
+        reader = SerialReader(puerto)
+        reader.start()
+        limite = time.time() + 2
+        while len(reader.buffer) < 2 and time.time() < limite:
+            time.sleep(0.01)
+        reader.stop()
+
+        _, corrientes, _ = reader.buffer.drain()
+        self.assertEqual(list(corrientes), [0.5, 0.75])
+        self.assertEqual(reader.estadisticas()["invalidas"], 1)
+        self.assertTrue(puerto.cerrado)
+
+    def test_marcas_de_tiempo_repartidas(self):
+        """Las líneas de un bloque se reparten entre la llegada anterior y la actual."""
+        linea = b"Irms: 0.50 A, Potencia: 110.0 W\r\n"
+        puerto = FakeSerial([linea * 2], bloque=1024)
+        reader = SerialReader(puerto)
+        with patch("time.time", side_effect=[100.0, 101.0, 102.0]):
+            reader._read_lines()  # Primer bloque: sin llegada anterior, ambas líneas llevan la llegada
+            puerto.datos = linea * 4
+            reader._read_lines()
+            reader._read_lines()  # El puerto se queda callado
+            puerto.datos = linea
+            reader._read_lines()
+        tiempos, _, _ = reader.buffer.drain()
+        self.assertEqual(list(tiempos), [100.0, 100.0, 100.25, 100.5, 100.75, 101.0, 102.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from unittest.mock import MagicMock
+from escritura import BatchWriter
+
+
+class TestBatchWriter(unittest.TestCase):
+    def setUp(self):
+        """Conexión simulada que registra cada executemany."""
+        self.lotes = []
+        self.mock_db_connection = MagicMock()
+        self.mock_cursor = MagicMock()
+        self.mock_cursor.executemany.side_effect = lambda sql, filas: self.lotes.append(list(filas))
+        self.mock_db_connection.cursor.return_value = self.mock_cursor
+
+    def test_lote_por_tamano(self):
+        """Verifica que las lecturas se escriban en lotes del tamaño configurado."""
+        writer = BatchWriter(lambda: self.mock_db_connection, batch_size=3, max_latencia=10)
+        writer.start()
+        for i in range(6):
+            writer.put(i * 0.1, i * 10.0, 1)
+        self.assertTrue(writer.flush(timeout=2))
+        writer.stop()
+
+        self.assertEqual([len(lote) for lote in self.lotes], [3, 3])
+        self.assertTrue(self.mock_cursor.fast_executemany)
+        self.assertEqual(writer.estadisticas()["filas"], 6)
+
+    def test_vaciado_al_detener(self):
+        """Verifica que al detener el escritor se guarden las lecturas pendientes."""
+        writer = BatchWriter(lambda: self.mock_db_connection, batch_size=100, max_latencia=10)
+        writer.start()
+        writer.put(1.0, 220.0, 2)
+        writer.stop()
+
+        self.assertEqual(len(self.lotes), 1)
+        self.assertEqual(self.lotes[0][0][1:], (1.0, 220.0, 2))
+
+    def test_reintento_tras_error(self):
+        """Verifica que un lote fallido se reintente en lugar de perderse."""
+        fallos = [Exception("Servidor no disponible")]
+
+        def executemany(sql, filas):
+            if fallos:
+                raise fallos.pop()
+            self.lotes.append(list(filas))
+
+        self.mock_cursor.executemany.side_effect = executemany
+        writer = BatchWriter(lambda: self.mock_db_connection, batch_size=1, max_latencia=0.05)
+        writer.start()
+        writer.put(0.5, 110.0, 1)
+        self.assertTrue(writer.flush(timeout=2))
+        writer.stop()
+
+        self.assertEqual(len(self.lotes), 1)
+        self.assertEqual(writer.estadisticas()["errores"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
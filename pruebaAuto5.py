@@ -0,0 +1,80 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from basedatos import ConnectionPool, PoolTimeoutError
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        """Fábrica de conexiones simuladas que cuenta cuántas se abren."""
+        self.abiertas = []
+
+        def connect():
+            conn = MagicMock()
+            self.abiertas.append(conn)
+            return conn
+
+        self.connect = connect
+
+    def test_reutiliza_conexiones(self):
+        """Verifica que una conexión devuelta se vuelva a prestar sin abrir otra."""
+        pool = ConnectionPool(self.connect, max_size=2)
+        conn = pool.connection()
+        conn.close()
+        with pool.connection() as conn2:
+            conn2.cursor()
+
+        self.assertEqual(len(self.abiertas), 1)
+        self.assertEqual(pool.stats()["checkouts"], 2)
+        self.assertEqual(pool.stats()["open"], 1)
+
+    def test_espera_al_llegar_al_maximo(self):
+        """Verifica que al agotarse el pool se espere a que se libere una conexión."""
+        pool = ConnectionPool(self.connect, max_size=1)
+        conn = pool.connection()
+        threading.Timer(0.05, conn.close).start()
+        with pool.connection(timeout=2):
+            pass
+
+        self.assertEqual(pool.stats()["waits"], 1)
+        self.assertEqual(len(self.abiertas), 1)
+
+    def test_timeout(self):
+        """Verifica que se lance PoolTimeoutError si nunca se libera una conexión."""
+        pool = ConnectionPool(self.connect, max_size=1)
+        conn = pool.connection()
+        with self.assertRaises(PoolTimeoutError):
+            pool.connection(timeout=0.05)
+        conn.close()
+
+    def test_health_check(self):
+        """Verifica que una conexión ociosa que falla la verificación se reemplace."""
+        pool = ConnectionPool(self.connect, max_size=2, health_check_after=0)
+        conn = pool.connection()
+        self.abiertas[0].cursor.side_effect = Exception("Conexión caída")
+        conn.close()
+        time.sleep(0.01)
+        with pool.connection():
+            pass
+
+        self.assertEqual(len(self.abiertas), 2)
+        self.assertEqual(pool.stats()["failed_health_checks"], 1)
+        self.assertTrue(self.abiertas[0].close.called)
+
+    def test_desalojo_de_ociosas(self):
+        """Verifica que las conexiones ociosas sobrantes se cierren tras idle_timeout."""
+        pool = ConnectionPool(self.connect, min_size=1, max_size=3, idle_timeout=0)
+        a, b = pool.connection(), pool.connection()
+        a.close()
+        b.close()
+        time.sleep(0.01)
+        with pool.connection():
+            pass
+
+        self.assertEqual(pool.stats()["evicted"], 1)
+        self.assertEqual(pool.stats()["open"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import numpy as np
+from series import DecimationPyramid, RingSeries
+
+
+class TestRingSeries(unittest.TestCase):
+    def test_vista_en_orden(self):
+        """Verifica que la vista devuelva las muestras en orden cronológico."""
+        series = RingSeries(capacidad=5)
+        series.extend(np.arange(3.0), np.arange(3.0) * 0.1, np.arange(3.0) * 10)
+        times, corrientes, potencias = series.view()
+        self.assertEqual(list(times), [0.0, 1.0, 2.0])
+        self.assertEqual(list(potencias), [0.0, 10.0, 20.0])
+
+    def test_capacidad_fija(self):
+        """Verifica que solo se conserven las últimas `capacidad` muestras al dar la vuelta."""
+        series = RingSeries(capacidad=4)
+        for inicio in range(0, 10, 3):
+            t = np.arange(inicio, min(inicio + 3, 10), dtype=float)
+            series.extend(t, t, t)
+        times, _, _ = series.view()
+        self.assertEqual(list(times), [6.0, 7.0, 8.0, 9.0])
+        self.assertEqual(series.total, 10)
+
+    def test_vista_sin_copia(self):
+        """Verifica que la vista sea contigua y no una copia de los datos."""
+        series = RingSeries(capacidad=4)
+        t = np.arange(6.0)
+        series.extend(t, t, t)
+        times, _, _ = series.view()
+        self.assertTrue(times.flags['C_CONTIGUOUS'])
+        self.assertTrue(np.shares_memory(times, series._datos))
+
+    def test_bloque_mayor_que_capacidad(self):
+        """Verifica que un bloque más grande que la ventana conserve solo su final."""
+        series = RingSeries(capacidad=3)
+        t = np.arange(8.0)
+        series.extend(t, t, t)
+        times, _, _ = series.view()
+        self.assertEqual(list(times), [5.0, 6.0, 7.0])
+
+
+class TestDecimationPyramid(unittest.TestCase):
+    def setUp(self):
+        """Sesión de 100 000 muestras con un pico aislado, en una ventana cruda pequeña."""
+        self.tiempos = np.arange(100000) * 0.1
+        self.potencias = np.full(100000, 100.0)
+        self.potencias[12345] = 5000.0
+        self.pyramid = DecimationPyramid(capacidad_cruda=1000, factor=8, niveles=4)
+        for inicio in range(0, 100000, 777):  # Bloques irregulares, como llegan del lector
+            fin = inicio + 777
+            self.pyramid.extend(self.tiempos[inicio:fin], self.potencias[inicio:fin] / 220,
+                                self.potencias[inicio:fin])
+
+    def test_vista_reciente_cruda(self):
+        """Verifica que un rango dentro de la ventana cruda devuelva las muestras originales."""
+        times, _, potencias = self.pyramid.view(9950.0, 9960.0, max_puntos=500)
+        self.assertTrue(np.all(np.diff(times) > 0))
+        self.assertLessEqual(len(times), 103)
+        self.assertTrue(np.all(potencias == 100.0))
+
+    def test_vista_completa_conserva_picos(self):
+        """Verifica que la vista de toda la sesión respete el presupuesto y no pierda el pico."""
+        x0, x1 = self.pyramid.bounds()
+        times, _, potencias = self.pyramid.view(x0, x1, max_puntos=2000)
+        self.assertLessEqual(len(times), 2000 + 2 * 8 * 4)
+        self.assertEqual(potencias.max(), 5000.0)
+        self.assertEqual(times[0], 0.0)
+        self.assertGreater(times[-1], self.tiempos[-1] - 8 * 0.1)  # Última cubeta: inicio de las 8 finales
+
+    def test_niveles_coinciden_con_calculo_directo(self):
+        """Verifica que el nivel 1 sea igual a agrupar las muestras de a 8."""
+        nivel = self.pyramid.niveles[0]
+        esperado = self.potencias[:nivel.n * 8].reshape(-1, 8).max(axis=1)
+        self.assertTrue(np.array_equal(nivel.datos()[4], esperado))
+
+    def test_punto_mas_cercano(self):
+        """Verifica la búsqueda dentro y fuera de la ventana cruda."""
+        tiempo, corriente, potencia = self.pyramid.nearest(9999.94)
+        self.assertAlmostEqual(tiempo, 9999.9)
+        self.assertEqual(potencia, (100.0, 100.0))
+
+        tiempo, _, potencia = self.pyramid.nearest(1234.5)
+        self.assertEqual(tiempo, 1234.4)  # Inicio de la cubeta que contiene el pico
+        self.assertEqual(potencia, (100.0, 5000.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+import numpy as np
+from archivo import ReadingArchive
+
+
+class TestReadingArchive(unittest.TestCase):
+    def setUp(self):
+        """Base de datos SQLite en memoria con lecturas de dos artefactos a lo largo de cuatro días."""
+        self.directorio = tempfile.mkdtemp()
+        self.archivo = ReadingArchive(self.directorio)
+        self.db = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+        self.db.execute("CREATE TABLE artefactos (id INTEGER, nombre TEXT)")
+        self.db.execute("INSERT INTO artefactos VALUES (1, 'Hervidor'), (2, 'Router')")
+        self.db.execute("CREATE TABLE Lecturas (id INTEGER PRIMARY KEY, fecha_hora TIMESTAMP, corriente REAL, "
+                        "potencia REAL, artefacto_id INTEGER)")
+        inicio = datetime(2024, 1, 1, 22, 0, 0)
+        self.db.executemany("INSERT INTO Lecturas (fecha_hora, corriente, potencia, artefacto_id) VALUES (?, ?, ?, ?)", [
+            (inicio + timedelta(seconds=10 * i), i * 0.01, float(i), 1 + i % 2) for i in range(20000)
+        ])
+
+    def tearDown(self):
+        shutil.rmtree(self.directorio)
+
+    def test_sincronizacion_incremental(self):
+        """Verifica que una segunda sincronización no duplique lecturas."""
+        self.assertEqual(self.archivo.sync(self.db, chunk_size=3000), 20000)
+        self.assertEqual(self.archivo.sync(self.db), 0)
+        self.assertEqual(self.archivo.artefactos(), [1, 2])
+        self.assertEqual(len(self.archivo.partitions(1)), 4)
+
+    def test_lectura_por_rango_sin_copia(self):
+        """Verifica que un rango dentro de un día devuelva vistas mapeadas de la partición."""
+        self.archivo.sync(self.db)
+        tiempos, corrientes, potencias = self.archivo.read_range(
+            1, datetime(2024, 1, 2, 0, 0), datetime(2024, 1, 2, 1, 0))
+        self.assertEqual(len(tiempos), 180)  # Una lectura cada 20 s durante una hora
+        self.assertIsInstance(tiempos, np.memmap)
+        self.assertEqual(potencias[0], 720.0)
+
+    def test_lectura_completa_ordenada(self):
+        """Verifica que la lectura de todas las particiones conserve el orden y la cantidad."""
+        self.archivo.sync(self.db)
+        tiempos, _, _ = self.archivo.read_range(2)
+        self.assertEqual(len(tiempos), 10000)
+        self.assertTrue(np.all(np.diff(tiempos) > 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
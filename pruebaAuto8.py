@@ -0,0 +1,112 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import numpy as np
+from ModeloEntrenamiento import entrenar_por_artefacto, guardar_modelo, MIN_LECTURAS_ARTEFACTO
+from modelos import ModelRegistry, predict_by_device, score_history
+
+
+class TestModelosPorArtefacto(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Dos artefactos con consumos muy distintos y uno con muy pocas lecturas."""
+        rng = np.random.default_rng(0)
+        hervidor = np.column_stack((rng.normal(8.0, 0.2, 2000), rng.normal(1800.0, 30.0, 2000)))
+        router = np.column_stack((rng.normal(0.05, 0.005, 2000), rng.normal(10.0, 0.5, 2000)))
+        lampara = np.column_stack((rng.normal(0.3, 0.01, 10), rng.normal(60.0, 1.0, 10)))
+        cls.ids = np.r_[np.full(2000, 1), np.full(2000, 2), np.full(10, 3)]
+        cls.datos = np.ascontiguousarray(np.vstack((hervidor, router, lampara)))
+        cls.paquete, cls.resumen = entrenar_por_artefacto(cls.ids, cls.datos, procesos=2)
+
+    def test_un_modelo_por_artefacto(self):
+        """Verifica que solo los artefactos con suficientes lecturas tengan modelo propio."""
+        self.assertEqual(sorted(self.paquete["modelos"]), [1, 2])
+        self.assertGreater(MIN_LECTURAS_ARTEFACTO, 10)
+        self.assertIsNotNone(self.paquete["global"])
+        self.assertEqual(self.resumen["artefactos"], 2)
+        self.assertGreater(self.resumen["aceleracion"], 0)
+
+    def test_prediccion_con_el_modelo_de_cada_artefacto(self):
+        """Un consumo normal para el hervidor es anómalo para el router."""
+        X = np.array([[8.0, 1800.0], [8.0, 1800.0]])
+        predicciones = predict_by_device(self.paquete, np.array([1, 2]), X)
+        self.assertEqual(list(predicciones), [1, -1])
+
+    def test_registro_prefiere_el_paquete(self):
+        """Verifica que el registro cargue el paquete y use el global para artefactos desconocidos."""
+        directorio = tempfile.mkdtemp()
+        try:
+            ruta = os.path.join(directorio, "modelos_artefactos.pkl")
+            guardar_modelo(self.paquete, ruta)
+            registry = ModelRegistry((ruta, os.path.join(directorio, "modelo.pkl")))
+            self.assertIs(registry.get_for(99), registry.get()["global"])
+            self.assertIsNot(registry.get_for(1), registry.get_for(2))
+            self.assertEqual(registry.ruta, ruta)
+        finally:
+            shutil.rmtree(directorio)
+
+    def test_registro_usa_el_mas_reciente(self):
+        """Verifica que el registro use el último modelo entrenado, sea el paquete o el global."""
+        directorio = tempfile.mkdtemp()
+        try:
+            paquete = os.path.join(directorio, "modelos_artefactos.pkl")
+            global_ = os.path.join(directorio, "modelo.pkl")
+            guardar_modelo(self.paquete, paquete)
+            guardar_modelo(self.paquete["global"], global_)
+            os.utime(paquete, ns=(10 ** 9, 10 ** 9))
+            os.utime(global_, ns=(2 * 10 ** 9, 2 * 10 ** 9))
+            registry = ModelRegistry((paquete, global_))
+            self.assertNotIsInstance(registry.get(), dict)
+            self.assertEqual(registry.ruta, global_)
+
+            os.utime(paquete, ns=(3 * 10 ** 9, 3 * 10 ** 9))  # Se volvió a entrenar por artefacto
+            self.assertTrue(registry.is_stale())
+            registry._load()
+            self.assertIsInstance(registry.get(), dict)
+            self.assertEqual(registry.ruta, paquete)
+
+            os.utime(global_, ns=(3 * 10 ** 9, 3 * 10 ** 9))  # Empate: gana el primero de las rutas
+            self.assertFalse(registry.is_stale())
+        finally:
+            shutil.rmtree(directorio)
+
+
+class TestAnalisisHistorico(unittest.TestCase):
+    def setUp(self):
+        """Lecturas de dos artefactos en una base SQLite en memoria y un modelo de reglas fijas."""
+        self.db = sqlite3.connect(":memory:")
+        self.db.execute("CREATE TABLE Lecturas (artefacto_id INTEGER, corriente REAL, potencia REAL)")
+        self.db.executemany("INSERT INTO Lecturas VALUES (?, ?, ?)",
+                            [(1 + i % 2, i * 0.01, float(i)) for i in range(1000)] + [(None, 0.0, 0.0)])
+
+        class Umbral:
+            def predict(self, X):
+                return np.where(X[:, 1] >= 900, -1, 1)
+        self.model = Umbral()
+
+    def test_analisis_por_bloques(self):
+        """Verifica que el resultado por bloques coincida con predecir todo junto."""
+        avances = []
+        ids, datos, anomalas = score_history(self.db, self.model, chunk_size=64,
+                                             progress=lambda n, total: avances.append((n, total)))
+        self.assertEqual(len(datos), 1000)
+        self.assertEqual(datos.dtype, np.float64)
+        self.assertEqual(int(anomalas.sum()), 100)
+        self.assertTrue(np.array_equal(anomalas, datos[:, 1] >= 900))
+        self.assertEqual(set(ids.tolist()), {1, 2})
+        self.assertEqual(avances[0], (0, 1000))
+        self.assertEqual(avances[-1], (1000, 1000))
+
+    def test_cancelacion(self):
+        """Verifica que cancelar devuelva None sin terminar la lectura."""
+        llamadas = []
+        resultado = score_history(self.db, self.model, chunk_size=64,
+                                  cancelled=lambda: llamadas.append(1) or len(llamadas) > 3)
+        self.assertIsNone(resultado)
+        self.assertEqual(len(llamadas), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
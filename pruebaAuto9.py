@@ -0,0 +1,54 @@
+import unittest
+import numpy as np
+from PyQt5 import QtCore
+from tablas import Column, ColumnTableModel, format_datetime
+
+
+class TestColumnTableModel(unittest.TestCase):
+    def setUp(self):
+        """Un millón de filas en columnas de NumPy, entregadas de a 1000."""
+        n = 1000000
+        self.potencias = (np.arange(n) * 7919 % 1000).astype(np.float64)
+        self.anomalas = self.potencias > 990
+        self.model = ColumnTableModel([
+            Column("Potencia (W)", self.potencias, lambda v: f"{v:.1f}"),
+            Column("Estado", self.anomalas, lambda v: "Anomalía" if v else "Normal"),
+        ], lote=1000)
+
+    def celda(self, fila, columna):
+        return self.model.data(self.model.index(fila, columna))
+
+    def test_carga_por_tandas(self):
+        """Verifica que la vista reciba las filas de a un lote a medida que se desplaza."""
+        self.assertEqual(self.model.rowCount(), 1000)
+        self.assertTrue(self.model.canFetchMore())
+        self.model.fetchMore()
+        self.assertEqual(self.model.rowCount(), 2000)
+        self.assertEqual(self.model.visible_rows(), 1000000)
+        self.assertEqual(self.celda(1, 0), "919.0")
+
+    def test_orden_descendente(self):
+        """Verifica que ordenar use los valores y vuelva a la primera tanda."""
+        self.model.fetchMore()
+        self.model.sort(0, QtCore.Qt.DescendingOrder)
+        self.assertEqual(self.model.rowCount(), 1000)
+        self.assertEqual(self.celda(0, 0), "999.0")
+        self.assertEqual(self.potencias[self.model.source_row(0)], 999.0)
+
+    def test_filtro_conserva_el_orden(self):
+        """Verifica que el filtro y el orden se combinen sin copiar las columnas."""
+        self.model.sort(0, QtCore.Qt.AscendingOrder)
+        self.model.set_filter(self.anomalas)
+        self.assertEqual(self.model.visible_rows(), int(self.anomalas.sum()))
+        self.assertEqual(self.celda(0, 0), "991.0")
+        self.assertEqual(self.celda(0, 1), "Anomalía")
+        self.model.set_filter(None)
+        self.assertEqual(self.model.visible_rows(), 1000000)
+
+    def test_formato_de_fecha(self):
+        """Verifica el formato de las fechas de la tabla de historial."""
+        self.assertEqual(format_datetime(np.datetime64("2024-01-02T03:04:05.678")), "2024-01-02 03:04:05")
+
+
+if __name__ == '__main__':
+    unittest.main()
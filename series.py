@@ -0,0 +1,209 @@
+"""Almacenamiento de series de tiempo para las gráficas en vivo."""
+import numpy as np
+
+
+class RingSeries:
+    """Ventana de capacidad fija de muestras (tiempo, corriente, potencia).
+
+    Cada muestra se escribe dos veces (en `i` y en `i + capacidad`), de modo que
+    las últimas `capacidad` muestras siempre forman un tramo contiguo del arreglo
+    y `view()` las devuelve en orden cronológico sin copiar. La memoria y el costo
+    de redibujar quedan acotados sin importar cuánto dure la sesión.
+    """
+
+    def __init__(self, capacidad=36000):
+        self.capacidad = int(capacidad)
+        self._datos = np.zeros((3, 2 * self.capacidad), dtype=np.float64)
+        self._total = 0  # Muestras agregadas desde el inicio
+
+    def __len__(self):
+        return min(self._total, self.capacidad)
+
+    @property
+    def total(self):
+        return self._total
+
+    def extend(self, tiempos, corrientes, potencias):
+        """Agrega un bloque de muestras en orden cronológico."""
+        bloque = np.vstack((tiempos, corrientes, potencias)).astype(np.float64, copy=False)
+        n = bloque.shape[1]
+        if n == 0:
+            return
+        if n > self.capacidad:  # Solo sobreviven las más recientes
+            self._total += n - self.capacidad
+            bloque = bloque[:, -self.capacidad:]
+            n = self.capacidad
+
+        inicio = self._total % self.capacidad
+        primero = min(n, self.capacidad - inicio)
+        for desplazamiento in (0, self.capacidad):
+            self._datos[:, desplazamiento + inicio:desplazamiento + inicio + primero] = bloque[:, :primero]
+            self._datos[:, desplazamiento:desplazamiento + n - primero] = bloque[:, primero:]
+        self._total += n
+
+    def view(self):
+        """Devuelve (tiempos, corrientes, potencias) como vistas contiguas, de la más antigua a la más reciente."""
+        n = len(self)
+        inicio = (self._total - n) % self.capacidad
+        tramo = self._datos[:, inicio:inicio + n]
+        return tramo[0], tramo[1], tramo[2]
+
+    def clear(self):
+        self._total = 0
+
+
+class _DecimationLevel:
+    """Nivel de la pirámide: cubetas (tiempo inicial, mín/máx de corriente, mín/máx de potencia).
+
+    Las entradas que todavía no completan una cubeta quedan en `pendientes`.
+    """
+
+    def __init__(self, factor):
+        self.factor = factor
+        self._datos = np.empty((5, 1024), dtype=np.float64)
+        self.n = 0
+        self.pendientes = np.empty((5, 0), dtype=np.float64)
+
+    @property
+    def tiempos(self):
+        return self._datos[0, :self.n]
+
+    def datos(self, inicio=0, fin=None):
+        return self._datos[:, inicio:self.n if fin is None else fin]
+
+    def agregar(self, entradas):
+        """Agrupa las entradas del nivel inferior y devuelve las cubetas completadas."""
+        combinadas = np.concatenate((self.pendientes, entradas), axis=1)
+        completas = combinadas.shape[1] // self.factor
+        self.pendientes = combinadas[:, completas * self.factor:].copy()
+        if completas == 0:
+            return combinadas[:, :0]
+
+        grupos = combinadas[:, :completas * self.factor].reshape(5, completas, self.factor)
+        cubetas = np.empty((5, completas), dtype=np.float64)
+        cubetas[0] = grupos[0, :, 0]
+        cubetas[1] = grupos[1].min(axis=1)
+        cubetas[2] = grupos[2].max(axis=1)
+        cubetas[3] = grupos[3].min(axis=1)
+        cubetas[4] = grupos[4].max(axis=1)
+
+        if self.n + completas > self._datos.shape[1]:
+            nueva = max(2 * self._datos.shape[1], self.n + completas)
+            datos = np.empty((5, nueva), dtype=np.float64)
+            datos[:, :self.n] = self._datos[:, :self.n]
+            self._datos = datos
+        self._datos[:, self.n:self.n + completas] = cubetas
+        self.n += completas
+        return cubetas
+
+
+class DecimationPyramid:
+    """Serie de toda la sesión con niveles de decimación mín/máx.
+
+    Las muestras recientes se guardan completas en un RingSeries; además, cada
+    nivel resume `factor` entradas del nivel inferior en una cubeta con sus
+    valores mínimo y máximo, de modo que los picos nunca desaparecen al alejar
+    la vista. Los niveles se actualizan de forma incremental y vectorizada a
+    medida que llegan las muestras. `view()` elige el nivel más fino cuya
+    cantidad de puntos en el rango visible cabe en el presupuesto, y `nearest()`
+    busca por bisección sobre los tiempos ordenados.
+    """
+
+    def __init__(self, capacidad_cruda=36000, factor=16, niveles=5):
+        self.raw = RingSeries(capacidad_cruda)
+        self.factor = factor
+        self.niveles = [_DecimationLevel(factor) for _ in range(niveles)]
+
+    def __len__(self):
+        return self.raw.total
+
+    def extend(self, tiempos, corrientes, potencias):
+        """Agrega un bloque de muestras en orden cronológico y actualiza los niveles."""
+        tiempos = np.asarray(tiempos, dtype=np.float64)
+        if len(tiempos) == 0:
+            return
+        corrientes = np.asarray(corrientes, dtype=np.float64)
+        potencias = np.asarray(potencias, dtype=np.float64)
+        self.raw.extend(tiempos, corrientes, potencias)
+
+        entradas = np.vstack((tiempos, corrientes, corrientes, potencias, potencias))
+        for nivel in self.niveles:
+            entradas = nivel.agregar(entradas)
+            if entradas.shape[1] == 0:
+                break
+
+    def bounds(self):
+        """Devuelve (primer tiempo, último tiempo) de la sesión, o None si está vacía."""
+        times, _, _ = self.raw.view()
+        if len(times) == 0:
+            return None
+        primero = times[0]
+        if self.niveles[0].n:
+            primero = self.niveles[0].tiempos[0]
+        return primero, times[-1]
+
+    def _tail(self, nivel):
+        """Entradas más recientes que la última cubeta completa del nivel indicado."""
+        partes = [self.niveles[i].pendientes for i in range(nivel, -1, -1)]
+        return np.concatenate(partes, axis=1)
+
+    def view(self, x0, x1, max_puntos=2000):
+        """Devuelve (tiempos, corrientes, potencias) listos para graficar el rango [x0, x1].
+
+        Si el rango cabe en la ventana cruda se devuelven vistas de las muestras
+        originales; si no, cada cubeta aporta dos puntos (mínimo y máximo).
+        """
+        times, corrientes, potencias = self.raw.view()
+        if len(times) == 0:
+            return times, corrientes, potencias
+
+        if x0 >= times[0]:
+            i0, i1 = np.searchsorted(times, (x0, x1))
+            i0, i1 = max(0, i0 - 1), min(len(times), i1 + 1)  # Un punto extra para no cortar la línea
+            if i1 - i0 <= max_puntos:
+                return times[i0:i1], corrientes[i0:i1], potencias[i0:i1]
+
+        for indice, nivel in enumerate(self.niveles):
+            i0, i1 = np.searchsorted(nivel.tiempos, (x0, x1))
+            i0, i1 = max(0, i0 - 1), min(nivel.n, i1 + 1)
+            if 2 * (i1 - i0) <= max_puntos or indice == len(self.niveles) - 1:
+                cubetas = np.concatenate((nivel.datos(i0, i1), self._tail(indice)), axis=1)
+                cubetas = cubetas[:, cubetas[0] <= x1]
+                return self._interleave(cubetas)
+
+    @staticmethod
+    def _interleave(cubetas):
+        n = cubetas.shape[1]
+        x = np.repeat(cubetas[0], 2)
+        corrientes = np.empty(2 * n)
+        potencias = np.empty(2 * n)
+        corrientes[0::2], corrientes[1::2] = cubetas[1], cubetas[2]
+        potencias[0::2], potencias[1::2] = cubetas[3], cubetas[4]
+        return x, corrientes, potencias
+
+    def nearest(self, x):
+        """Busca el punto más cercano a `x`.
+
+        Devuelve (tiempo, (corriente mín, máx), (potencia mín, máx)); dentro de la
+        ventana cruda el mínimo y el máximo coinciden. Devuelve None si no hay datos.
+        """
+        times, corrientes, potencias = self.raw.view()
+        if len(times) == 0:
+            return None
+        nivel = self.niveles[0]
+        if x < times[0] and nivel.n:
+            # Fuera de la ventana cruda: se usa la cubeta más cercana del nivel más fino
+            i = self._closest(nivel.tiempos, x)
+            _, cmin, cmax, pmin, pmax = nivel.datos(i, i + 1)[:, 0]
+            return nivel.tiempos[i], (cmin, cmax), (pmin, pmax)
+        i = self._closest(times, x)
+        return times[i], (corrientes[i], corrientes[i]), (potencias[i], potencias[i])
+
+    @staticmethod
+    def _closest(tiempos, x):
+        i = int(np.searchsorted(tiempos, x))
+        if i == 0:
+            return 0
+        if i == len(tiempos):
+            return i - 1
+        return i if tiempos[i] - x < x - tiempos[i - 1] else i - 1
@@ -0,0 +1,55 @@
+"""Inicio de sesión y perfil del usuario conectado.
+
+`authenticate` valida la contraseña con una sola consulta que trae también el
+rol, el secreto TOTP y el nombre completo, y devuelve una `Session`. La
+ventana principal recibe esa sesión, así que no vuelve a consultar la base
+para mostrar el nombre del usuario.
+"""
+import hashlib
+import hmac
+
+
+class Session:
+    """Datos del usuario que inició sesión."""
+
+    def __init__(self, username, role, totp_secret=None, nombres=None, apellidos=None):
+        self.username = username
+        self.role = role
+        self.totp_secret = totp_secret
+        self.nombres = nombres
+        self.apellidos = apellidos
+
+    @property
+    def full_name(self):
+        """Nombres y apellidos; si falta alguno, el nombre de usuario."""
+        if self.nombres and self.apellidos:
+            return f"{self.nombres} {self.apellidos}"
+        return self.username
+
+    def __repr__(self):
+        return f"Session({self.username!r}, role={self.role!r})"
+
+
+def check_password(password, stored_hash):
+    """Compara el SHA-256 de `password` con el hash guardado, sin distinguir mayúsculas."""
+    calculado = hashlib.sha256(password.encode()).hexdigest()
+    return hmac.compare_digest(calculado, (stored_hash or "").strip().lower())
+
+
+def authenticate(username, password, connect, backend):
+    """Devuelve la `Session` del usuario o None si el usuario o la contraseña no coinciden.
+
+    `connect` devuelve una conexión (por lo general del pool); los errores de
+    conexión se propagan.
+    """
+    conn = connect()
+    try:
+        user = backend.get_user(conn, username)
+    finally:
+        conn.close()
+    if not user:
+        return None
+    role, stored_hash, totp_secret, nombres, apellidos = user
+    if not check_password(password, stored_hash):
+        return None
+    return Session(username, role, totp_secret, nombres, apellidos)
@@ -0,0 +1,191 @@
+"""Modelos de tabla virtualizados sobre arreglos de NumPy.
+
+En vez de crear un `QTableWidgetItem` por celda, la vista le pide a
+`ColumnTableModel` solo las celdas visibles y estas se formatean en `data()`.
+Las filas se entregan de a `lote` a medida que se desplaza la vista
+(`canFetchMore`/`fetchMore`), y el orden y el filtro son un arreglo de índices
+calculado con NumPy, así que nunca se copian ni reordenan las columnas.
+"""
+import numpy as np
+from PyQt5 import QtCore
+
+
+class Column:
+    """Una columna de la tabla: título, valores y cómo mostrarlos."""
+
+    def __init__(self, titulo, valores, formato=str, alineacion=QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter):
+        self.titulo = titulo
+        self.valores = np.asarray(valores)
+        self.formato = formato
+        self.alineacion = alineacion
+
+
+def format_datetime(valor):
+    """Formatea un numpy.datetime64 como 'AAAA-MM-DD HH:MM:SS'."""
+    return str(valor.astype("datetime64[s]")).replace("T", " ")
+
+
+class ColumnTableModel(QtCore.QAbstractTableModel):
+    """Modelo de solo lectura sobre columnas de igual largo."""
+
+    def __init__(self, columnas=(), lote=1000, parent=None):
+        super().__init__(parent)
+        self.lote = lote
+        self._columnas = []
+        self._indices = np.empty(0, dtype=np.int64)  # Filas visibles, ya filtradas y ordenadas
+        self._cargadas = 0
+        self._mascara = None
+        self._orden = None  # (columna, Qt.SortOrder)
+        self.set_columns(columnas)
+
+    # Datos
+
+    def set_columns(self, columnas):
+        """Reemplaza todos los datos; conserva el orden elegido pero no el filtro."""
+        self.beginResetModel()
+        self._columnas = list(columnas)
+        self._mascara = None
+        self._recalcular()
+        self.endResetModel()
+
+    def total_rows(self):
+        """Cantidad de filas sin filtrar."""
+        return len(self._columnas[0].valores) if self._columnas else 0
+
+    def visible_rows(self):
+        """Cantidad de filas que pasan el filtro (cargadas o no)."""
+        return len(self._indices)
+
+    def source_row(self, fila):
+        """Índice en los arreglos originales de una fila de la vista."""
+        return int(self._indices[fila])
+
+    def set_filter(self, mascara):
+        """Muestra solo las filas donde `mascara` es verdadera (None quita el filtro)."""
+        self.beginResetModel()
+        self._mascara = None if mascara is None else np.asarray(mascara, dtype=bool)
+        self._recalcular()
+        self.endResetModel()
+
+    def _recalcular(self):
+        n = self.total_rows()
+        indices = np.arange(n) if self._mascara is None else np.flatnonzero(self._mascara[:n])
+        if self._orden is not None and len(indices):
+            columna, orden = self._orden
+            claves = self._columnas[columna].valores[indices]
+            indices = indices[np.argsort(claves, kind="stable")]
+            if orden == QtCore.Qt.DescendingOrder:
+                indices = indices[::-1]
+        self._indices = indices
+        self._cargadas = min(self.lote, len(indices))
+
+    # Interfaz de QAbstractTableModel
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self._cargadas
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self._columnas)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        columna = self._columnas[index.column()]
+        if role == QtCore.Qt.DisplayRole:
+            return columna.formato(columna.valores[self._indices[index.row()]])
+        if role == QtCore.Qt.TextAlignmentRole:
+            return int(columna.alineacion)
+        return None
+
+    def headerData(self, seccion, orientacion, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientacion == QtCore.Qt.Horizontal:
+            return self._columnas[seccion].titulo if seccion < len(self._columnas) else None
+        return str(seccion + 1)
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and self._cargadas < len(self._indices)
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return
+        nuevas = min(self.lote, len(self._indices) - self._cargadas)
+        if nuevas <= 0:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), self._cargadas, self._cargadas + nuevas - 1)
+        self._cargadas += nuevas
+        self.endInsertRows()
+
+    def sort(self, columna, orden=QtCore.Qt.AscendingOrder):
+        """Ordena con NumPy sobre los índices visibles, sin tocar las columnas."""
+        if not 0 <= columna < len(self._columnas):
+            return
+        self.beginResetModel()  # Se vuelve a la primera tanda de filas del nuevo orden
+        self._orden = (columna, orden)
+        self._recalcular()
+        self.endResetModel()
+
+
+class PagedTableModel(ColumnTableModel):
+    """Modelo que pide más filas a una fuente paginada a medida que se desplaza la vista.
+
+    `fuente()` devuelve la siguiente página como una tupla de columnas (en el
+    orden de `columnas`) o None cuando no quedan datos. Las columnas crecen
+    duplicando su capacidad, así que anexar páginas no copia todo cada vez.
+    Las filas se muestran en el orden de la fuente: no se ordena ni se filtra.
+    """
+
+    def __init__(self, columnas=(), fuente=None, parent=None):
+        self._fuente = None
+        self._buffers = []
+        self._n = 0
+        super().__init__(columnas, parent=parent)
+        self.set_source(columnas, fuente)
+
+    def set_source(self, columnas, fuente):
+        """Empieza de nuevo con otra fuente; `columnas` define títulos, tipos y formato."""
+        self.beginResetModel()
+        self._fuente = fuente
+        self._columnas = list(columnas)
+        self._buffers = [np.empty(0, dtype=c.valores.dtype) for c in self._columnas]
+        self._n = 0
+        self._indices = np.empty(0, dtype=np.int64)
+        self._cargadas = 0
+        self.endResetModel()
+
+    def _append(self, pagina):
+        m = len(pagina[0])
+        if self._n + m > len(self._buffers[0]):
+            capacidad = max(2 * len(self._buffers[0]), self._n + m, 1024)
+            self._buffers = [np.resize(b, capacidad) for b in self._buffers]
+        for buffer, columna, valores in zip(self._buffers, self._columnas, pagina):
+            buffer[self._n:self._n + m] = valores
+            columna.valores = buffer[:self._n + m]
+        self._n += m
+        self._indices = np.arange(self._n)
+
+    def total_rows(self):
+        return self._n
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and self._fuente is not None
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self._fuente is None:
+            return
+        pagina = self._fuente()
+        if pagina is None or len(pagina[0]) == 0:
+            self._fuente = None  # Fuente agotada
+            return
+        m = len(pagina[0])
+        self.beginInsertRows(QtCore.QModelIndex(), self._n, self._n + m - 1)
+        self._append(pagina)
+        self._cargadas = self._n
+        self.endInsertRows()
+
+    def set_filter(self, mascara):
+        pass
+
+    def sort(self, columna, orden=QtCore.Qt.AscendingOrder):
+        pass